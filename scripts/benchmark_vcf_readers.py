@@ -0,0 +1,199 @@
+""" benchmark reading the variant lines of VCFs
+
+Compares the readers which give VCF lines as bytes (MappedVCF for uncompressed
+VCFs, and GzipVCF for gzipped and BGZF VCFs) against reading the same VCFs
+through text file objects, as LoadVCFs did previously (io.open for uncompressed
+VCFs, and gzip.open in text mode for gzipped VCFs).
+
+Either give the paths to VCFs to read, or leave these out to write synthetic
+exome VCFs (uncompressed, gzipped, and BGZF) to a temporary directory.
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import gzip
+import time
+import random
+import shutil
+import struct
+import tempfile
+import argparse
+import zlib
+from multiprocessing.pool import ThreadPool
+
+# use the clinicalfilter package from this repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "..", "src", "main", "python"))
+from clinicalfilter.vcf_reader import MappedVCF, GzipVCF
+
+CONSEQUENCES = ["missense_variant", "synonymous_variant", "intron_variant",
+    "stop_gained", "splice_region_variant", "3_prime_UTR_variant"]
+
+def get_options():
+    """ gets the options from the command line
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark reading VCF lines.")
+    parser.add_argument("vcfs", nargs="*", help="paths to VCFs to read " \
+        "(.vcf, .txt or .gz). Synthetic exome VCFs are used if none are given.")
+    parser.add_argument("--lines", type=int, default=100000, help="number of " \
+        "variant lines in the synthetic VCFs (default 100000)")
+    parser.add_argument("--repeats", type=int, default=3, help="number of " \
+        "times to read each VCF, the fastest time is reported (default 3)")
+    parser.add_argument("--threads", type=int, default=1, help="number of " \
+        "threads for decompressing BGZF VCFs with GzipVCF (default 1)")
+
+    return parser.parse_args()
+
+def make_bgzf_block(data):
+    """ compress bytes into a single BGZF block
+    """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    block_size = 18 + len(compressed) + 8
+    header = struct.pack("<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67,
+        2, block_size - 1)
+    trailer = struct.pack("<II", zlib.crc32(data) & 0xFFFFFFFF, len(data))
+
+    return header + compressed + trailer
+
+def make_exome_vcf(total):
+    """ make the text of a synthetic single sample exome VCF
+
+    Args:
+        total: number of variant lines
+
+    Returns:
+        VCF text, as bytes
+    """
+
+    rng = random.Random(1)
+    lines = ["##fileformat=VCFv4.1\n", "##fileDate=2014-01-01\n",
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"]
+
+    position = 0
+    for i in range(total):
+        position += rng.randint(1, 30000)
+        info = "CQ={0};HGNC=GENE{1};ENST=ENST{1};DP={2};MAX_AF={3:.4f};" \
+            "EUR_AF={3:.4f};AFR_AF=.".format(rng.choice(CONSEQUENCES),
+            rng.randint(1, 20000), rng.randint(10, 200), rng.random() / 10)
+        lines.append("1\t{0}\t.\tA\tG\t{1}\tPASS\t{2}\tGT:AD:DP\t0/1:{3},{3}:{4}\n".format(
+            position, rng.randint(20, 1000), info, rng.randint(5, 50),
+            rng.randint(10, 100)))
+
+    return "".join(lines).encode("latin_1")
+
+def write_synthetic_vcfs(folder, total):
+    """ write synthetic exome VCFs, uncompressed, gzipped, and as BGZF
+
+    Returns:
+        list of paths to the VCFs
+    """
+
+    data = make_exome_vcf(total)
+
+    paths = [os.path.join(folder, x) for x in ["exome.vcf", "exome.vcf.gz",
+        "exome.bgzf.vcf.gz"]]
+    with open(paths[0], "wb") as handle:
+        handle.write(data)
+    with gzip.open(paths[1], "wb") as handle:
+        handle.write(data)
+    with open(paths[2], "wb") as handle:
+        for i in range(0, len(data), 65280):
+            handle.write(make_bgzf_block(data[i:i + 65280]))
+        handle.write(make_bgzf_block(b""))
+
+    return paths
+
+def read_text(path):
+    """ read the variant lines through a text file object, skipping the header
+    """
+
+    if path.endswith(".gz"):
+        handle = gzip.open(path, "rt")
+    else:
+        handle = io.open(path, "r", encoding="latin_1")
+
+    count = 0
+    for line in handle:
+        if line.startswith("#"):
+            continue
+        line.split("\t", 2)
+        count += 1
+    handle.close()
+
+    return count
+
+def read_bytes(path, pool=None, threads=1):
+    """ read the variant lines as bytes, with MappedVCF or GzipVCF
+    """
+
+    if path.endswith(".gz"):
+        vcf = GzipVCF(path, pool=pool, threads=threads)
+    else:
+        vcf = MappedVCF(path)
+
+    count = 0
+    for line in vcf:
+        line.split(b"\t", 2)
+        count += 1
+    vcf.close()
+
+    return count
+
+def time_reader(reader, path, repeats, *args):
+    """ find the fastest time to read a VCF
+
+    Returns:
+        tuple of (seconds, number of variant lines)
+    """
+
+    times = []
+    for i in range(repeats):
+        start = time.time()
+        count = reader(path, *args)
+        times.append(time.time() - start)
+
+    return min(times), count
+
+def main():
+    """ times reading the VCFs with each reader
+    """
+
+    options = get_options()
+
+    pool = None
+    if options.threads > 1:
+        pool = ThreadPool(options.threads)
+
+    folder = None
+    paths = options.vcfs
+    if len(paths) == 0:
+        folder = tempfile.mkdtemp()
+        paths = write_synthetic_vcfs(folder, options.lines)
+
+    try:
+        print("vcf\tlines\ttext_seconds\tbytes_seconds\tspeedup")
+        for path in paths:
+            text_time, text_count = time_reader(read_text, path, options.repeats)
+            bytes_time, bytes_count = time_reader(read_bytes, path,
+                options.repeats, pool, options.threads)
+
+            if text_count != bytes_count:
+                raise ValueError("readers found different numbers of lines " \
+                    "in " + path)
+
+            print("{0}\t{1}\t{2:.3f}\t{3:.3f}\t{4:.2f}".format(os.path.basename(path),
+                text_count, text_time, bytes_time, text_time / bytes_time))
+    finally:
+        if folder is not None:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
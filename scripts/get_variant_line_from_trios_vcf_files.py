@@ -1,188 +1,291 @@
+""" get the VCF lines at sites of interest for probands and their parents
+
+Queries are (proband, chrom, position) tuples, either a single query from the
+command line, or a batch from a file with one tab-separated query per line. The
+queries are grouped by VCF, so each family member's VCF is only read once. VCFs
+bgzipped with a tabix index are read at just the queried positions, other VCFs
+are read in a single pass, which stops once every queried position has passed
+(VCFs are sorted by position within each chromosome).
+
+The output has a line for each family member at each query, with the proband,
+chrom, position, member (proband, mother or father), and sample ID, followed by
+the VCF line, or NA if the member lacks a variant at the site.
+"""
 
 from __future__ import print_function
 
 import gzip
 import os
+import sys
 import argparse
 
+# use the clinicalfilter package from this repository, for the tabix indexes
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "..", "src", "main", "python"))
+from clinicalfilter.vcf_index import TabixIndex
+
 USER_FOLDER = "/nfs/users/nfs_j/jm33/"
 PED_FILE = os.path.join(USER_FOLDER, "exome_reporting.ped")
 
 def get_options():
     """ gets the options from the command line
     """
-    
+
     parser = argparse.ArgumentParser()
     parser.add_argument('-i', '--individual', dest='proband_ID', \
-        required=True, help='ID of proband to be analysed')
+        help='ID of proband to be analysed')
     parser.add_argument('--chrom', help='chrom of variant')
     parser.add_argument('--position', help='position')
+    parser.add_argument('--queries', help='path to file of queries, one per ' \
+        'line, with tab-separated proband ID, chrom and position')
     parser.add_argument('--ped', help='path to ped file')
-    
+    parser.add_argument('--output', help='path to write the VCF lines to ' \
+        '(defaults to standard output)')
+
     args = parser.parse_args()
-    
+
+    single = [args.proband_ID, args.chrom, args.position]
+    if args.queries is None and any(x is None for x in single):
+        parser.error("either --queries, or --individual, --chrom and " \
+            "--position are required")
+    if args.queries is not None and any(x is not None for x in single):
+        parser.error("--queries can't be used with --individual, --chrom " \
+            "or --position")
+
     return args
 
-def load_ped(ped_path, proband_ID):
-    """ loads the pedigree details for a prband
+def load_ped(ped_path):
+    """ loads the pedigree details for every individual
+
+    Args:
+        ped_path: path to ped file
+
+    Returns:
+        dictionary of (paternal ID, maternal ID, VCF path) tuples, indexed by
+        individual ID
     """
-    
-    ped = open(ped_path, "r")
-    ped_read = ped.readlines()
-    ped.close()
-    
-    # find the maternal and paternal IDs for the individual
-    for line in ped_read:
-        line = line.split()
-        individual_ID = line[1]
-        
-        if individual_ID == proband_ID:
-            family_ID = line[0]
-            paternal_ID = line[2]
-            maternal_ID = line[3]
-            break
-    
-    # extract all the lines for the individual
-    new_ped_lines = []
-    for line in ped_read:
-        split_line = line.strip().split()
-        individual_ID = split_line[1]
-        
-        if individual_ID == proband_ID or individual_ID == paternal_ID or individual_ID == maternal_ID:
-            new_ped_lines.append(line)
-    
-    return new_ped_lines
-
-def load_single_position(vcf_path, chrom_name, position):
-    """ loads records from a VCF file for a single chromosome
-    
+
+    individuals = {}
+    with open(ped_path, "r") as ped:
+        for line in ped:
+            line = line.split()
+            if len(line) < 7:
+                continue
+            individuals[line[1]] = (line[2], line[3], line[6])
+
+    return individuals
+
+def load_queries(path):
+    """ loads the queries from a file
+
     Args:
-        vcf_path: path to vcf file
-        chrom_name: chromosome to select
-    
+        path: path to file of tab-separated proband ID, chrom and position
+
     Returns:
-        returns a list of VCF lines that are for a single chromosome
+        list of (proband ID, chrom, position) tuples
     """
-    
-    # open the VCF file
-    f =  gzip.open(vcf_path,'r')
-    
-    # remove the header
-    for line in f:
-        if not line.startswith("#"):
-            break
-        if line.startswith("##fileformat"):
-            continue
-    
-    # select the lines for a single chromosome, at a single position
-    for line in f:
-        if line[:7].split("\t")[0] == chrom_name and line[:30].split("\t")[1] == position:
-            return line
-    
-    return []
-
-def parse_vcf_lines(vcf_records):
-    """ organises the information in VCF lines into a dictionary format, indexed by chr position.
-    
+
+    queries = []
+    with open(path, "r") as handle:
+        for line in handle:
+            line = line.strip().split("\t")
+            if line == [""] or line[0].startswith("#"):
+                continue
+            queries.append((line[0], line[1], line[2]))
+
+    return queries
+
+def get_family_members(proband_ID, individuals):
+    """ gets the family members with VCFs for a proband
+
     Args:
-        vcf_records: a list of VCF lines for a single individual.
-    
+        proband_ID: ID of proband
+        individuals: dictionary of pedigree details, from load_ped()
+
     Returns:
-        a dictionary of VCF records, indexed by nucleotide position
+        list of (member, sample ID, VCF path) tuples for the proband and any
+        parents in the ped file
     """
-    
-    variants = {}
-    for record in vcf_records:
-        line = record.strip().split("\t")
-        
-        pos = line[1]
-        variants[pos] = {}
-        variants[pos]["position"] = pos
-        variants[pos]["chrom"] = line[0]
-        variants[pos]["ID"] = line[2]
-        variants[pos]["ref_allele"] = line[3]
-        variants[pos]["alt_allele"] = line[4]
-        variants[pos]["qual"] = line[5]
-        variants[pos]["filter"] = line[6]
-        
-        # split the info line into key value pairs that can be placed in the dictionary
-        info = line[7]
-        for item in info.split(";"):
-            if "=" in item:
-                key, value = item.split("=")
-            else:
-                key, value = item, "1"
-            variants[pos][key] = value
-        
-        # split the format and genotype fields into key value pairs
-        tag_labels = line[8].split(":") # the first item in formats are the tags DP:FP:ETC
-        tag_values = line[9].split(":") # the second item are the corresponding values.
-        variants[pos].update(dict(zip(tag_labels, tag_values)))
-        
-    return variants
-
-def find_single_position(proband_ID, vcf_path, chromosome, position):
-    """finds variants on single chromosome at a single position
-    
+
+    if proband_ID not in individuals:
+        raise ValueError("proband isn't in the ped file: " + proband_ID)
+
+    paternal_ID, maternal_ID, vcf_path = individuals[proband_ID]
+
+    members = [("proband", proband_ID, vcf_path)]
+    for member, sample_ID in [("mother", maternal_ID), ("father", paternal_ID)]:
+        if sample_ID in individuals:
+            members.append((member, sample_ID, individuals[sample_ID][2]))
+
+    return members
+
+def group_sites_by_vcf(queries, individuals):
+    """ groups the queried sites by the VCF files to look them up in
+
     Args:
-        proband_ID: individual ID string
-        vcf_path: path to vcf file for the individual
-        output: output file object to write data to
-    
+        queries: list of (proband ID, chrom, position) tuples
+        individuals: dictionary of pedigree details, from load_ped()
+
     Returns:
-        parsed vcf record for the variant
+        dictionary of sets of (chrom, position) tuples, indexed by VCF path
     """
-    
-    vcf_records = load_single_position(vcf_path, chromosome, position)
-    vcf = parse_vcf_lines(vcf_records)
-    
-    return vcf
-        
 
-def main():
+    sites = {}
+    for proband_ID, chrom, position in queries:
+        for member, sample_ID, vcf_path in get_family_members(proband_ID, individuals):
+            if vcf_path not in sites:
+                sites[vcf_path] = set()
+            sites[vcf_path].add((chrom, int(position)))
+
+    return sites
+
+def open_vcf(vcf_path):
+    """ opens a VCF file, which can be gzipped, or uncompressed
+    """
+
+    if vcf_path.endswith(".gz"):
+        return gzip.open(vcf_path, "rt")
+
+    return open(vcf_path, "r")
+
+def sweep_vcf(vcf_path, sites):
+    """ finds the lines at a set of sites with a single pass through a VCF
+
+    Args:
+        vcf_path: path to VCF file
+        sites: set of (chrom, position) tuples
+
+    Returns:
+        dictionary of lists of VCF lines, indexed by (chrom, position) tuple
+    """
+
+    # find the last queried position on each chromosome, so we can stop once
+    # we have passed the queried sites on every chromosome
+    last_positions = {}
+    for chrom, position in sites:
+        last_positions[chrom] = max(position, last_positions.get(chrom, 0))
+
+    found = {}
+    with open_vcf(vcf_path) as vcf:
+        for line in vcf:
+            if line.startswith("#"):
+                continue
+
+            fields = line.split("\t", 2)
+            chrom = fields[0]
+            if chrom not in last_positions:
+                continue
+
+            position = int(fields[1])
+            if (chrom, position) in sites:
+                key = (chrom, position)
+                if key not in found:
+                    found[key] = []
+                found[key].append(line)
+            elif position > last_positions[chrom]:
+                del last_positions[chrom]
+                if len(last_positions) == 0:
+                    break
+
+    return found
+
+def fetch_vcf(index, sites):
+    """ finds the lines at a set of sites, using a tabix index
+
+    Args:
+        index: TabixIndex for the VCF
+        sites: set of (chrom, position) tuples
+
+    Returns:
+        dictionary of lists of VCF lines, indexed by (chrom, position) tuple
+    """
+
+    found = {}
+    for chrom, position in sorted(sites):
+        for line in index.fetch(chrom, position, position):
+            # the index also gives records which span the site, such as
+            # deletions and CNVs, but we only want records at the site
+            if int(line.split("\t", 2)[1]) == position:
+                key = (chrom, position)
+                if key not in found:
+                    found[key] = []
+                found[key].append(line)
+
+    return found
+
+def find_sites(vcf_path, sites):
+    """ finds the lines at a set of sites in a VCF
+
+    Args:
+        vcf_path: path to VCF file
+        sites: set of (chrom, position) tuples
+
+    Returns:
+        dictionary of lists of VCF lines, indexed by (chrom, position) tuple
+    """
+
+    if vcf_path.endswith(".gz") and os.path.exists(vcf_path + ".tbi"):
+        index = TabixIndex(vcf_path)
+        if index.is_valid():
+            return fetch_vcf(index, sites)
+
+    return sweep_vcf(vcf_path, sites)
+
+def get_variant_lines(queries, individuals):
+    """ gets the VCF lines at each query for the proband and parents
+
+    Args:
+        queries: list of (proband ID, chrom, position) tuples
+        individuals: dictionary of pedigree details, from load_ped()
+
+    Returns:
+        list of output lines, with the VCF lines for each family member at
+        each query, in the order of the queries
     """
+
+    sites = group_sites_by_vcf(queries, individuals)
+
+    found = {}
+    for vcf_path in sorted(sites):
+        found[vcf_path] = find_sites(vcf_path, sites[vcf_path])
+
+    output = []
+    for proband_ID, chrom, position in queries:
+        key = (chrom, int(position))
+        for member, sample_ID, vcf_path in get_family_members(proband_ID, individuals):
+            prefix = [proband_ID, chrom, position, member, sample_ID]
+            lines = found[vcf_path].get(key, ["NA\n"])
+            for line in lines:
+                output.append("\t".join(prefix) + "\t" + line.rstrip("\n") + "\n")
+
+    return output
+
+def main():
+    """ gets the VCF lines at each query for the proband and parents
     """
-    
+
     options = get_options()
-    proband_ID = options.proband_ID
-    chromosome = options.chrom
-    position = options.position
-    
+
     ped_path = options.ped
     if options.ped is None:
         ped_path = PED_FILE
-    
-    new_ped = load_ped(ped_path, proband_ID)
-    
-    for line in new_ped:
-        line = line.split()
-        individual_ID = line[1]
-        
-        if individual_ID == proband_ID:
-            family_ID = line[0]
-            paternal_ID = line[2]
-            maternal_ID = line[3]
-            proband_vcf_path = line[6]
-    
-    for line in new_ped:
-        line = line.split()
-        individual_ID = line[1]
-        
-        if individual_ID == paternal_ID:
-            paternal_vcf_path = line[6]
-        if individual_ID == maternal_ID:
-            maternal_vcf_path = line[6]
-            maternal_vcf_path = line[6]
-    
-    proband_vcf = find_single_position(proband_ID, proband_vcf_path, chromosome, position)
-    maternal_vcf = find_single_position(proband_ID, maternal_vcf_path, chromosome, position)
-    paternal_vcf = find_single_position(proband_ID, paternal_vcf_path, chromosome, position)
-    
-    print(proband_vcf)
-    print(maternal_vcf)
-    print(paternal_vcf)
+
+    individuals = load_ped(ped_path)
+
+    if options.queries is not None:
+        queries = load_queries(options.queries)
+    else:
+        queries = [(options.proband_ID, options.chrom, options.position)]
+
+    output = sys.stdout
+    if options.output is not None:
+        output = open(options.output, "w")
+
+    output.writelines(get_variant_lines(queries, individuals))
+
+    if options.output is not None:
+        output.close()
 
 
 if __name__ == '__main__':
     main()
-
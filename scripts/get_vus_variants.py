@@ -15,6 +15,12 @@ This script also:
         (see http://compbio.charite.de/hudson/job/hpo.annotations.monthly/lastSuccessfulBuild/artifact/annotation/genes_to_diseases.txt)
     - filters out variants in genes with multiple (>1) common (MAF >= 0.05) LOF
       variants (as determined from 1000 Genomes datasets).
+
+The VUS and DDG2P variant lists can be in any order, such as the family order
+from the clinical filtering script, or the proband order from merge-results. We
+index each list by the byte offset of each proband's lines, sort the indexes
+by proband ID, and step through both lists one proband at a time, so memory use
+doesn't grow with the size of the cohort (beyond the small indexes).
 """
 
 from __future__ import division
@@ -47,31 +53,125 @@ def get_options():
     return args.vus_variants, args.ddg2p_variants, args.de_novos, \
         args.omim_morbid, args.common_lof, args.output
 
-def open_variants(filename):
-    """ open variants from a file, indexed by (ID, chrom, pos) tuples
+def index_probands(filename):
+    """ find the byte offsets of the runs of lines for each proband
+    
+    Args:
+        filename: path to clinical filtering output
+    
+    Returns:
+        list of (proband ID, byte offset) tuples for the start of each run of
+        lines for a proband, sorted by proband ID, then by position in the file.
     """
     
-    f = open(filename, "r")
+    runs = []
+    current_id = None
+    offset = 0
+    with open(filename, "rb") as f:
+        for line in f:
+            # header and blank lines end the current run
+            if line.strip() == b"" or line.startswith(b"proband"):
+                current_id = None
+            else:
+                individual_id = line.split(b"\t")[0].decode("utf-8")
+                if individual_id != current_id:
+                    runs.append((individual_id, offset))
+                    current_id = individual_id
+            offset += len(line)
+    
+    return sorted(runs)
+
+def read_run(f, individual_id, offset):
+    """ read the lines in a run of lines for a proband
+    
+    Args:
+        f: binary file handle for the clinical filtering output
+        individual_id: ID of the proband for the run
+        offset: byte offset of the start of the run
+    
+    Returns:
+        list of lines, each split into a list of fields
+    """
     
+    f.seek(offset)
+    
+    lines = []
+    for line in iter(f.readline, b""):
+        line = line.decode("utf-8").strip().split("\t")
+        if line[0] != individual_id:
+            break
+        lines.append(line)
+    
+    return lines
+
+def iterate_probands(filename):
+    """ iterate through the variants for each proband, in proband ID order
+    
+    The clinical filtering output lists each proband's variants together, but
+    not in proband ID order, so we index where each proband's lines start, and
+    read one proband at a time in ID order.
+    
+    Args:
+        filename: path to clinical filtering output
+    
+    Returns:
+        iterator of (proband ID, variants) tuples, where the variants are a
+        dictionary of variant lines, indexed by (ID, chrom, pos) tuples.
+    """
+    
+    runs = index_probands(filename)
+    
+    current_id = None
     variants = {}
-    for line in f:
-        # ignore header and blank lines
-        if line == "\n" or line.startswith("proband"):
-            continue
-        
-        # get the info for a unique key to identify the variant
-        line = line.strip().split("\t")
-        individual_id = line[0]
-        chrom = line[3]
-        position = line[4]
+    with open(filename, "rb") as f:
+        for individual_id, offset in runs:
+            # a proband's lines can be split across several runs (eg in
+            # concatenated outputs), which are adjacent in the sorted index
+            if individual_id != current_id:
+                if current_id is not None:
+                    yield current_id, variants
+                current_id = individual_id
+                variants = {}
+            
+            for line in read_run(f, individual_id, offset):
+                # get the info for a unique key to identify the variant
+                chrom = line[3]
+                position = line[4]
+                key = (individual_id, chrom, position)
+                variants[key] = line
+    
+    if current_id is not None:
+        yield current_id, variants
+
+def join_probands(vus_file, ddg2p_file):
+    """ join the VUS and DDG2P variants for each proband
+    
+    Both outputs are read in proband ID order, so we step through them together,
+    holding a single proband from each at a time.
+    
+    Args:
+        vus_file: path to the VUS variants
+        ddg2p_file: path to the DDG2P variants
+    
+    Returns:
+        iterator of (VUS variants, DDG2P variants) tuples for each proband with
+        VUS variants, each a dictionary with the variants for the proband,
+        indexed by proband ID, as used by the filtering functions.
+    """
+    
+    ddg2p = iterate_probands(ddg2p_file)
+    ddg2p_id, ddg2p_vars = next(ddg2p, (None, None))
+    
+    for person_id, variants in iterate_probands(vus_file):
+        # move through the DDG2P probands until we reach the VUS proband
+        while ddg2p_id is not None and ddg2p_id < person_id:
+            ddg2p_id, ddg2p_vars = next(ddg2p, (None, None))
         
-        key = (individual_id, chrom, position)
-        if individual_id not in variants:
-            variants[individual_id] = {}
+        matched = {}
+        if ddg2p_id == person_id:
+            matched = {person_id: ddg2p_vars}
         
-        variants[individual_id][key] = line
-    
-    return variants
+        yield {person_id: variants}, matched
 
 def open_omim_genes(filename):
     """ open a list of OMIM morbid map genes
@@ -110,7 +210,7 @@ def open_validated_denovos(filename):
     """ gets (ID, chrom, pos) tuple keys for validated denovos
     """
     
-    f = open(filename, "rU")
+    f = open(filename, "r")
     
     validated = set([])
     for line in f:
@@ -283,21 +383,21 @@ def annotate_omim_gene(variants, omim_genes):
     
     return annotated_vars  
 
-def write_output(filename, variants):
-    """ writes the output to a file
+def write_header(f):
+    """ writes the output header to a file
     """
     
-    f = open(filename, "w")
-    
     header = "proband\talternate_ID\tsex\tchrom\tposition\tgene\tmutation_ID"+ \
         "\ttranscript\tconsequence\tref/alt_alleles\tMAX_MAF\tinheritance" + \
         "\ttrio_genotype\tmom_aff\tdad_aff\tresult\tomim_match\n"
     f.write(header)
+
+def write_output(f, variants):
+    """ writes the variants for a proband to a file
+    """
     
     for key in sorted(variants):
         f.write(variants[key])
-    
-    f.close()
 
 def main():
     """
@@ -305,35 +405,38 @@ def main():
     
     vus_file, ddg2p_file, de_novo_file, omim_file, common_lof_file, output_file = get_options()
     
-    # open the datasets for the script
-    vus_vars = open_variants(vus_file)
-    ddg2p_vars = open_variants(ddg2p_file)
+    # open the gene lists and validated de novos, which are small, unlike the
+    # variant lists, which we read one proband at a time
     common_lof_genes = open_common_lof(common_lof_file)
-    
     de_novos = open_validated_denovos(de_novo_file)
-    de_novo_variants = get_functional_de_novos(vus_vars, de_novos)
+    omim_genes = open_omim_genes(omim_file)
     
-    # filter the VUS variants
-    vus_vars = remove_ddg_overlap(vus_vars, ddg2p_vars)
-    vus_vars = get_lof_recessive_variants(vus_vars)
-    vus_vars = remove_common_lof_genes(vus_vars, common_lof_genes)
+    output = open(output_file, "w")
+    write_header(output)
     
-    # put all the validated de novos back in
-    for person_id in de_novo_variants:
-        if person_id not in vus_vars:
-            vus_vars[person_id] = {}
-        vus_vars[person_id].update(de_novo_variants[person_id])
+    # the VUS and DDG2P outputs are read in proband order, and each proband is
+    # filtered independently, so we filter one proband at a time
+    for vus_vars, ddg2p_vars in join_probands(vus_file, ddg2p_file):
+        de_novo_variants = get_functional_de_novos(vus_vars, de_novos)
+        
+        # filter the VUS variants
+        vus_vars = remove_ddg_overlap(vus_vars, ddg2p_vars)
+        vus_vars = get_lof_recessive_variants(vus_vars)
+        vus_vars = remove_common_lof_genes(vus_vars, common_lof_genes)
+        
+        # put all the validated de novos back in
+        for person_id in de_novo_variants:
+            if person_id not in vus_vars:
+                vus_vars[person_id] = {}
+            vus_vars[person_id].update(de_novo_variants[person_id])
+        
+        # annotate the variants with whether their genes are OMIM morbid map
+        # genes, and write the variants to a file
+        vus_vars = annotate_omim_gene(vus_vars, omim_genes)
+        write_output(output, vus_vars)
     
-    # annotate the variants with whether their genes are OMIM morbid map genes, 
-    # and write the variants to a file
-    omim_genes = open_omim_genes(omim_file)
-    vus_vars = annotate_omim_gene(vus_vars, omim_genes)
-    write_output(output_file, vus_vars)
+    output.close()
 
 
 if __name__ == '__main__':
     main()
-
-
-
-    
\ No newline at end of file
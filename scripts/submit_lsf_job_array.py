@@ -3,7 +3,9 @@ array. Splits trios in a PED file across multiple ped files in order to run
 them in parallel.
 
 Not recommended for use, as this is very scrappy code, and highly user-specific,
-but it works if all the files are in the expected locations.
+but it works if all the files are in the expected locations. To run a cohort on
+a single large node, use "clinical_filter.py schedule" instead, which balances
+the families across workers by their VCF sizes.
 """
 
 import subprocess
@@ -221,12 +223,10 @@ def run_cleanup(hash_string):
     
     output_name = "tmp_ped.{0}.output".format(hash_string)
     
-    # merge the array output after the array finishes
+    # merge the array output after the array finishes, in proband order
     merge_id = "merge1_{0}".format(hash_string)
-    command = ["head", "-n", "1", output_name + ".1.txt", \
-        ">", "clinical_reporting.txt", ";", \
-        "tail", "-q", "-n", "+2", output_name + "*", \
-        ">>", "clinical_reporting.txt"]
+    command = ["python3", FILTER_CODE, "merge-results", \
+        "--output", "clinical_reporting.txt", output_name + ".*.txt"]
     submit_bsub_job(command, job_id=merge_id, dependent_id=hash_string, \
         logfile="tmp_ped.{0}*bjob_output.var_merge.txt".format(hash_string))
     
@@ -24,16 +24,30 @@ Written by Jeremy McRae (jm33@sanger.ac.uk), derived from code by Saeed Al
 Turki (sa9@sanger.ac.uk) and Jeff Barrett.
 """
 
+import os
 import sys
+import time
 import logging
 
 from clinicalfilter.load_vcfs import LoadVCFs
-from clinicalfilter.inheritance import Allosomal, Autosomal, CNVInheritance
 from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
 from clinicalfilter.reporting import Report
-from clinicalfilter.load_options import LoadOptions, get_options
+from clinicalfilter.load_options import LoadOptions, get_options, \
+    get_summary_paths
+from clinicalfilter.trio_analysis import TrioAnalysis
+from clinicalfilter.region_parallel import RegionParallelAnalysis
+from clinicalfilter.prefetch import TrioPrefetcher, get_probands
+from clinicalfilter import local_scheduler, merge_results, daemon
+from clinicalfilter.local_scheduler import merge_family_outputs
+from clinicalfilter.resume import RunManifest, get_config_hash, get_trio_inputs
+from clinicalfilter.incremental import IncrementalAnalysis, CandidateCache
+from clinicalfilter.work_queue import WorkQueue, LeaseHeartbeat, get_worker_id
+from clinicalfilter.site_cache import SiteCache
+from clinicalfilter.cohort_summary import merge_summaries
+from clinicalfilter.profiling import Profiler, StageTimer, MemoryProfiler, \
+    ProfilerGroup
 
-class ClinicalFilter(LoadOptions):
+class ClinicalFilter(LoadOptions, TrioAnalysis):
     """ filters trios for candidate variants that might contribute to a
     probands disorder.
     """
@@ -43,168 +57,444 @@ class ClinicalFilter(LoadOptions):
         """
         
         self.set_definitions(opts)
-        self.report = Report(self.output_path, self.export_vcf, self.ID_mapper,
-            self.known_genes_date)
+        
+        # optionally skip the probands finished by an earlier run, in which
+        # case we keep the output from the earlier run
+        self.manifest = None
+        resumed = False
+        if self.resume:
+            self.manifest = RunManifest(self.output_path, get_config_hash(opts))
+            resumed = self.manifest.resume(get_probands(self.families))
+        
+        # optionally only reanalyse the probands affected by changes to the
+        # known genes since an earlier run, and record the candidate sites for
+        # the next time the known genes change
+        self.incremental = None
+        if self.previous_cache is not None:
+            self.incremental = IncrementalAnalysis(opts, self.known_genes,
+                self.excluded_genes)
+        self.candidate_cache = None
+        if self.candidate_cache_path is not None:
+            self.candidate_cache = CandidateCache(self.candidate_cache_path, opts)
+        
+        # optionally summarise the variants across the cohort (eg genes with
+        # recurrent de novos), workers start summaries for each family instead
+        self.summaries = []
+        if self.worker_queue is None:
+            self.start_summaries(resumed)
+        
+        # workers write a separate report for each family they claim
+        if self.worker_queue is None:
+            self.report = Report(self.output_path, self.export_vcf, self.ID_mapper,
+                self.known_genes_date, clear_output=not resumed)
+        
+        # only profile the analysis stages if we have asked for it
+        profilers = []
+        if self.timings_path is not None:
+            profilers.append(StageTimer(self.timings_path))
+        if self.memory_profile_path is not None:
+            profilers.append(MemoryProfiler(self.memory_profile_path))
+        
+        self.profiler = Profiler()
+        if len(profilers) == 1:
+            self.profiler = profilers[0]
+        elif len(profilers) > 1:
+            self.profiler = ProfilerGroup(profilers)
+        
+        # reuse the parsed annotations for SNV sites which recur across the
+        # VCFs of the run
+        self.site_cache = None
+        if self.site_cache_size > 0:
+            self.site_cache = SiteCache(self.site_cache_size)
+        
+        # optionally split each proband's analysis into genomic regions, which
+        # are analysed in parallel worker processes
+        self.region_analysis = None
+        if self.region_workers is not None and self.region_workers > 1:
+            self.region_analysis = RegionParallelAnalysis(self, self.region_workers)
     
     def filter_trios(self):
         """ loads trio variants, and screens for candidate variants
         """
         
+        record_sites = self.candidate_cache is not None
         self.vcf_loader = LoadVCFs(len(self.families), self.known_genes, \
-            self.excluded_genes, self.debug_chrom, self.debug_pos)
+            self.excluded_genes, self.tracer, self.profiler,
+            self.load_threads, record_sites, self.site_cache,
+            self.decompression_threads)
+        
+        # optionally load the upcoming trios in a background thread, using a
+        # separate loader, since the loaders hold the state of the trio
+        self.prefetcher = None
+        if self.prefetch is not None and self.prefetch > 0:
+            loader = LoadVCFs(len(self.families), self.known_genes, \
+                self.excluded_genes, self.tracer, threads=self.load_threads,
+                record_sites=record_sites, site_cache=self.site_cache,
+                decompression_threads=self.decompression_threads)
+            probands = get_probands(self.families)
+            if self.manifest is not None:
+                probands = [x for x in probands if not self.manifest.is_complete(x)]
+            if self.incremental is not None:
+                probands = [x for x in probands if self.incremental.get_reusable(x) is None]
+            self.prefetcher = TrioPrefetcher(loader, probands, self.pp_filter,
+                self.prefetch, self.prefetch_memory * 1024 * 1024)
         
         # load the trio paths into the current path setup
         for family_ID in sorted(self.families):
-            self.family = self.families[family_ID]
+            self.analyse_family(self.families[family_ID])
+        
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        
+        self.finish()
+    
+    def process_queue(self):
+        """ analyse families claimed from a work queue shared with other workers
+        
+        Each family's results are written to a separate file, and once every
+        family in the queue is finished, the worker that finishes last merges
+        the results into the output path.
+        """
+        
+        self.vcf_loader = LoadVCFs(len(self.families), self.known_genes, \
+            self.excluded_genes, self.tracer, self.profiler,
+            self.load_threads, site_cache=self.site_cache,
+            decompression_threads=self.decompression_threads)
+        self.prefetcher = None
+        
+        queue = WorkQueue(self.worker_queue, self.lease, self.max_attempts)
+        queue.add_families(self.families)
+        worker = get_worker_id()
+        
+        results_dir = self.output_path + ".families"
+        if not os.path.exists(results_dir):
+            os.makedirs(results_dir)
+        
+        while True:
+            family_ID = queue.claim(worker)
+            if family_ID is None:
+                # other workers might still be running families, wait in case
+                # their leases expire, which requeues their families
+                if queue.is_finished():
+                    break
+                time.sleep(queue.get_poll_interval())
+                continue
             
-            # some families have more than one child in the family, so run
-            # through each child.
-            self.family.set_child()
-            while self.family.child is not None:
-                if self.family.child.is_affected():
-                    variants = self.vcf_loader.get_trio_variants(self.family, self.pp_filter)
-                    self.vcf_provenance = self.vcf_loader.get_trio_provenance()
-                    self.analyse_trio(variants)
-                
-                self.family.set_child_examined()
+            # each worker writes to its own result path, so a worker whose
+            # lease expired can't overwrite the results from the worker which
+            # took over the family
+            result_path = os.path.join(results_dir, family_ID + "." + worker + ".txt")
+            temp_path = result_path + ".tmp"
+            heartbeat = LeaseHeartbeat(self.worker_queue, family_ID, worker, self.lease)
+            try:
+                self.report = Report(temp_path, self.export_vcf, self.ID_mapper,
+                    self.known_genes_date)
+                self.summaries = []
+                for summary_type, path in get_summary_paths(self):
+                    summary = summary_type(temp_path + "." + summary_type.entry_key)
+                    summary.save()
+                    self.summaries.append((summary, path))
+                self.analyse_family(self.families[family_ID])
+                for summary, path in self.summaries:
+                    os.rename(summary.counts_path,
+                        result_path + "." + summary.entry_key)
+                os.rename(temp_path, result_path)
+                if not queue.complete(family_ID, worker, result_path):
+                    logging.warning("discarding the results for family " + \
+                        family_ID + " from worker " + worker + ", since the " \
+                        "lease expired and another worker claimed the family")
+                    for path in [result_path] + [result_path + "." + x.entry_key
+                            for x, summary_path in self.summaries]:
+                        os.remove(path)
+            except Exception:
+                logging.exception("family " + family_ID + " failed in worker " + worker)
+                queue.release(family_ID, worker)
+            finally:
+                heartbeat.stop()
+        
+        if queue.claim_merge(worker):
+            merge_family_outputs(queue.get_results(), self.output_path)
+            for summary_type, path in get_summary_paths(self):
+                merge_summaries(summary_type, [x + "." + summary_type.entry_key
+                    for x in queue.get_results()], path)
+        
+        self.finish()
+        
+        failed = queue.get_failed()
+        queue.close()
+        if len(failed) > 0:
+            sys.exit("families failed in every attempt: " + ", ".join(failed))
         
         sys.exit(0)
     
-    def analyse_trio(self, variants):
-        """identify candidate variants in exome data for a single trio.
+    def start_summaries(self, resumed):
+        """ start the summaries across the cohort
         
-        takes variants that passed the initial filtering from VCF loading, and
-        splits the variants into groups for each gene with variants. Then
-        analyses variants in a single gene (so we can utilise the appropriate
-        inheritance mechanisms for that gene), before running some
-        pos-inheritance filters, and exporting the data (ir required).
+        Each proband's values for the summaries are written to a counts file
+        next to the summary, so on resuming, we keep the values for the
+        probands finished by the earlier run.
         
         Args:
-            variants: list of TrioGenotypes objects
+            resumed: True/False for whether we are resuming an earlier run
         """
         
-        # organise variants by gene, then find variants that fit
-        # different inheritance models
-        genes_dict = self.create_gene_dict(variants)
-        found_vars = []
-        for gene in genes_dict:
-            gene_vars = genes_dict[gene]
-            found_vars += self.find_variants(gene_vars, gene)
+        finished = None
+        if resumed:
+            finished = set([(x.family_id, x.child.get_id()) for x in
+                get_probands(self.families) if self.manifest.is_complete(x)])
         
-        # remove any duplicate variants (which might ocur due to CNVs being
-        # checked against all the genes that they encompass)
-        found_vars = self.exclude_duplicates(found_vars)
+        for summary_type, path in get_summary_paths(self):
+            summary = summary_type(path + ".counts")
+            if finished is not None:
+                if not os.path.exists(summary.counts_path):
+                    logging.warning("lacking " + summary.counts_path + " for " \
+                        "the probands finished in the earlier run")
+                summary.load(summary.counts_path, keep=finished)
+            summary.save()
+            self.summaries.append((summary, path))
+    
+    def finish(self):
+        """ stop any helper processes, and finish the profiling
+        """
         
-        # apply some final filters to the flagged variants
-        post_filter = PostInheritanceFilter(found_vars, self.debug_chrom, self.debug_pos)
-        found_vars = post_filter.filter_variants()
+        if self.region_analysis is not None:
+            self.region_analysis.close()
         
-        # export the results to either tab-separated table or VCF format
-        self.report.export_data(found_vars, self.family, \
-            self.vcf_loader.child_header, self.vcf_provenance)
+        # workers only summarise their families, the summaries for the cohort
+        # are written once the counts for the families are merged
+        if self.worker_queue is None:
+            for summary, path in self.summaries:
+                summary.write_summary(path)
+        
+        if self.site_cache is not None and self.tracer is None:
+            stats = self.site_cache.get_stats()
+            if stats["hit_rate"] is not None:
+                logging.info("site cache: " + str(stats["hits"]) + " hits, " + \
+                    str(stats["misses"]) + " misses ({0:.1f}% hit rate), ".format(
+                    100 * stats["hit_rate"]) + str(stats["evictions"]) + \
+                    " evictions")
+        
+        self.profiler.close()
     
-    def create_gene_dict(self, variants):
-        """creates dictionary of variants indexed by gene
+    def analyse_family(self, family):
+        """ find candidate variants for each affected child in a family
         
         Args:
-            variants: list of TrioGenotypes objects
-        
-        Returns:
-            dictionary of variants indexed by HGNC symbols
+            family: Family object
         """
         
-        # organise the variants into entries for each gene
-        genes_dict = {}
-        for var in variants:
-            # cnvs can span mulitple genes, so we need to check each gene
-            # separately, and then collapse duplicates later
-            if var.is_cnv():
-                for gene in var.child.get_genes():
-                    if gene not in genes_dict:
-                        genes_dict[gene] = []
-                    # add the variant to the gene entry
-                    genes_dict[gene].append(var)
-                continue
-            # make sure that gene is in genes_dict
-            if var.get_gene() not in genes_dict:
-                genes_dict[var.get_gene()] = []
+        self.family = family
+        
+        # some families have more than one child in the family, so run
+        # through each child.
+        self.family.set_child()
+        while self.family.child is not None:
+            if self.manifest is not None and self.manifest.is_complete(self.family):
+                logging.info("skipping " + self.family.child.get_id() + \
+                    ", which was finished in an earlier run")
+            elif self.family.child.is_affected():
+                entry = None
+                if self.incremental is not None:
+                    entry = self.incremental.get_reusable(self.family)
+                
+                if entry is not None:
+                    self.reuse_proband(entry)
+                else:
+                    self.analyse_proband()
+                
+                if self.manifest is not None:
+                    self.manifest.add_proband(self.family, self.vcf_provenance)
             
-            # add the variant to the gene entry
-            genes_dict[var.get_gene()].append(var)
+            self.family.set_child_examined()
+    
+    def analyse_proband(self):
+        """ load and analyse the trio for the current proband
+        """
+        
+        if self.candidate_cache is not None:
+            self.candidate_cache.start_proband()
+        
+        self.profiler.start_proband(self.family)
+        if self.tracer is not None:
+            self.tracer.set_proband(self.family.child.get_id())
         
-        return genes_dict
+        indexes = None
+        if self.region_analysis is not None:
+            indexes = self.region_analysis.get_indexes(self.family)
         
-    def find_variants(self, variants, gene):
-        """ finds variants that fit inheritance models
+        if indexes is not None:
+            self.analyse_trio_by_region(indexes)
+        elif self.prefetcher is not None:
+            self.analyse_prefetched_trio(self.prefetcher)
+        else:
+            variants = self.vcf_loader.get_trio_variants(self.family, self.pp_filter)
+            self.get_trio_provenance()
+            self.analyse_trio(variants)
+        self.profiler.end_proband()
+        
+        if self.candidate_cache is not None:
+            self.candidate_cache.add_proband(self.family,
+                get_trio_inputs(self.family, self.vcf_provenance),
+                self.vcf_loader.sites)
+    
+    def reuse_proband(self, entry):
+        """ copy the current proband's results from an earlier run, which the
+        changes to the known genes can't affect
         
         Args:
-            variants: list of TrioGenotype objects
-            gene: gene ID as string
+            entry: candidate cache entry for the proband from the earlier run
+        """
+        
+        logging.info("reusing the earlier results for " + \
+            self.family.child.get_id() + ", which has no sites in changed genes")
+        
+        if self.candidate_cache is not None:
+            self.candidate_cache.start_proband()
+        
+        self.incremental.copy_results(entry, self.output_path)
+        self.vcf_provenance = [(x[3], "NA", "NA") for x in entry["inputs"]]
+        
+        if self.candidate_cache is not None:
+            self.candidate_cache.add_proband(self.family, entry["inputs"],
+                entry["sites"])
+    
+    def get_trio_provenance(self):
+        """ get the provenance of the VCFs for the current trio
+        """
+        
+        with self.profiler.stage("get_trio_provenance") as stage:
+            bytes_read = self.vcf_loader.bytes_read
+            self.vcf_provenance = self.vcf_loader.get_trio_provenance()
+            stage.update(bytes_read=self.vcf_loader.bytes_read - bytes_read)
+    
+    def analyse_trio_by_region(self, indexes):
+        """ identify candidate variants for a trio, split into genomic regions
+        
+        The regions are loaded and analysed in parallel worker processes, then
+        the candidates from all the regions are merged, before we exclude
+        duplicates and apply the post-inheritance filters, as in analyse_trio.
         
-        Returns:
-            list of variants that pass inheritance checks
+        Args:
+            indexes: dictionary of VCF indexes for the trio, keyed by VCF path
         """
         
-        # get the inheritance for the gene (monoalleleic, biallelic, hemizygous
-        # etc), but allow for times when we haven't specified a list of genes
-        # to use
-        gene_inh = None
-        if self.known_genes is not None and gene in self.known_genes:
-            gene_inh = self.known_genes[gene]["inh"]
+        with self.profiler.stage("analyse_regions") as stage:
+            found_vars, summary_values, regions, lines_scanned = \
+                self.region_analysis.find_candidates(self.family, indexes)
+            stage.update(regions=regions, lines_scanned=lines_scanned,
+                variants=len(found_vars))
+        
+        self.add_to_summaries(summary_values)
+        
+        # the reports need the child's VCF header, and the trio provenance
+        self.vcf_loader.family = self.family
+        self.vcf_loader.child_header = \
+            self.vcf_loader.get_vcf_header(self.family.child.get_path())
+        self.get_trio_provenance()
+        
+        with self.profiler.stage("find_variants") as stage:
+            found_vars = self.exclude_duplicates(found_vars)
+            stage.update(variants=len(found_vars))
+        
+        self.report_candidates(found_vars)
+    
+    def analyse_prefetched_trio(self, prefetcher):
+        """ identify candidate variants for a trio loaded in the background
         
-        # ignore intergenic variants
-        if gene is None:
-            for var in variants:
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(var, "lacks HGNC/gene symbol")
-            return []
+        Args:
+            prefetcher: TrioPrefetcher object, which is loading the trios in
+                the same order as we analyse them.
+        """
         
-        logging.debug(self.family.child.get_id() + " " + gene + " " + \
-            str(variants) + " " + str(gene_inh))
-        chrom_inheritance = variants[0].get_inheritance_type()
+        # the time spent here is the time the analysis waited on loading
+        with self.profiler.stage("wait_for_prefetch") as stage:
+            trio = prefetcher.get(self.family)
+            stage.update(variants=len(trio.variants), **trio.counts)
         
-        if chrom_inheritance == "autosomal":
-            finder = Autosomal(variants, self.family, self.known_genes, gene_inh, self.cnv_regions)
-        elif chrom_inheritance in ["XChrMale", "XChrFemale", "YChrMale"]:
-            finder = Allosomal(variants, self.family, self.known_genes, gene_inh, self.cnv_regions)
+        self.vcf_loader.child_header = trio.child_header
+        self.vcf_loader.sites = trio.sites
+        self.vcf_provenance = trio.provenance
         
-        return finder.get_candidate_variants()
+        self.analyse_trio(trio.variants)
     
-    def exclude_duplicates(self, variants):
-        """ rejig variants included under multiple inheritance mechanisms
+    def analyse_trio(self, variants):
+        """identify candidate variants in exome data for a single trio.
+        
+        takes variants that passed the initial filtering from VCF loading, and
+        splits the variants into groups for each gene with variants. Then
+        analyses variants in a single gene (so we can utilise the appropriate
+        inheritance mechanisms for that gene), before running some
+        pos-inheritance filters, and exporting the data (ir required).
         
         Args:
-            variants: list of candidate variants
+            variants: list of TrioGenotypes objects
+        """
         
-        Returns:
-            list of (variant, check_type, inheritance) tuples, with duplicates
-            excluded, and originals modified to show both mechanisms
+        if len(self.summaries) > 0:
+            self.add_to_summaries(dict([(x.entry_key, x.get_values(self.family,
+                variants)) for x, path in self.summaries]))
+        
+        with self.profiler.stage("find_variants") as stage:
+            found_vars = self.find_candidates(variants)
+            
+            # remove any duplicate variants (which might ocur due to CNVs being
+            # checked against all the genes that they encompass)
+            found_vars = self.exclude_duplicates(found_vars)
+            stage.update(variants=len(found_vars))
+        
+        self.report_candidates(found_vars)
+    
+    def add_to_summaries(self, values):
+        """ add the current proband's values to the summaries for the cohort
+        
+        Args:
+            values: dictionary of the proband's values for each summary, keyed
+                by the summary's entry key
         """
         
-        unique_vars = {}
-        for variant in variants:
-            key = variant[0].child.get_key()
-            if key not in unique_vars:
-                unique_vars[key] = list(variant)
-            else:
-                result = variant[1]
-                inh = variant[2]
-                
-                # append the check type and inheritance type to the first
-                # instance of the variant
-                if result not in unique_vars[key][1]:
-                    unique_vars[key][1] += "," + result
-                if inh not in unique_vars[key][2]:
-                    unique_vars[key][2] += "," +  inh
+        for summary, path in self.summaries:
+            summary.add_proband(self.family.family_id,
+                self.family.child.get_id(), values[summary.entry_key])
+    
+    def report_candidates(self, found_vars):
+        """ apply the post-inheritance filters, and export the candidates
         
-        unique_vars = [tuple(unique_vars[x]) for x in unique_vars]
+        Args:
+            found_vars: list of (variant, check, inheritance) tuples
+        """
         
-        return unique_vars
-
+        # apply some final filters to the flagged variants
+        with self.profiler.stage("post_inheritance_filter") as stage:
+            post_filter = PostInheritanceFilter(found_vars, self.tracer)
+            found_vars = post_filter.filter_variants()
+            stage.update(variants=len(found_vars))
+        
+        # export the results to either tab-separated table or VCF format
+        with self.profiler.stage("export_data") as stage:
+            self.report.export_data(found_vars, self.family, \
+                self.vcf_loader.child_header, self.vcf_provenance)
+            stage.update(variants=len(found_vars))
+    
 def main():
     """ run the clinical filtering analyses
     """
     
+    # the schedule subcommand runs each family in a PED file as a separate job
+    if len(sys.argv) > 1 and sys.argv[1] == "schedule":
+        local_scheduler.main(sys.argv[2:], os.path.abspath(__file__))
+        return
+    
+    # the merge-results subcommand merges the outputs from separate shards
+    if len(sys.argv) > 1 and sys.argv[1] == "merge-results":
+        merge_results.main(sys.argv[2:])
+        return
+    
+    # the daemon subcommand keeps the reference data loaded, and analyses
+    # trios as they are requested
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        daemon.main(sys.argv[2:])
+        return
+    
     options = get_options()
     
     # set the level of logging to generate
@@ -217,7 +507,10 @@ def main():
     logging.basicConfig(level=numeric_level, filename=log_filename)
     
     finder = ClinicalFilter(options)
-    finder.filter_trios()
+    if options.worker is not None:
+        finder.process_queue()
+    else:
+        finder.filter_trios()
 
 if __name__ == "__main__":
     main()
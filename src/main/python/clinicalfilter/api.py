@@ -0,0 +1,150 @@
+""" analyse trios from within python, without writing files or exiting
+
+The command line analysis writes its results through a Report, and is set up
+from argparse options. This runs the same analysis for families (or the
+families in a PED file), using reference data already loaded in memory, and
+yields the candidates for each proband, so a driver can analyse many probands
+in a single process:
+
+    from clinicalfilter.api import analyse_families
+    from clinicalfilter.load_files import open_known_genes
+
+    known_genes, excluded_genes = open_known_genes("known_genes.txt")
+    for family, candidates in analyse_families("cohort.ped", known_genes,
+            excluded_genes):
+        for variant, check, inheritance in candidates:
+            ...
+
+The loader gives each variant the known genes and the tracer, rather than
+setting them on the SNV and CNV classes, so analysers with different known
+genes can run at the same time in separate threads of a single process.
+"""
+
+from clinicalfilter.load_vcfs import LoadVCFs
+from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
+from clinicalfilter.prefetch import get_probands
+from clinicalfilter.syndrome_regions import index_cnv_regions
+from clinicalfilter.trace import Tracer
+from clinicalfilter.trio_analysis import TrioAnalysis
+from clinicalfilter import ped
+
+def get_tracer(tracer, debug_chrom, debug_pos):
+    """ get the tracer for an analysis, including any debug position
+
+    Args:
+        tracer: Tracer object, or None
+        debug_chrom: chromosome of a variant to debug, or None
+        debug_pos: position of a variant to debug, or None
+
+    Returns:
+        Tracer object, or None if nothing is traced
+    """
+
+    if debug_chrom is None:
+        return tracer
+
+    positions = set([(debug_chrom, debug_pos)])
+    path = None
+    if tracer is not None:
+        positions |= tracer.positions
+        path = tracer.path
+
+    return Tracer(positions, path)
+
+
+class TrioAnalyser(TrioAnalysis):
+    """ finds the candidate variants for probands, using in-memory references
+
+    An analyser holds the proband it is analysing, so threads analysing trios
+    at the same time each need their own analyser.
+    """
+
+    def __init__(self, known_genes=None, excluded_genes=None, cnv_regions=None,
+            pp_filter=0.9, debug_chrom=None, debug_pos=None, tracer=None):
+        """ set up the analysis
+
+        Args:
+            known_genes: dictionary of known genes, from open_known_genes(),
+                or None to analyse all genes
+            excluded_genes: set of excluded genes, from open_known_genes()
+            cnv_regions: index of syndrome regions, from open_cnv_regions(),
+                a dictionary of copy numbers indexed by (chrom, start, end)
+                tuples, or None
+            pp_filter: threshold for the PP_DNM filter of de novos
+            debug_chrom: chromosome of a variant to debug the filtering for
+            debug_pos: position of a variant to debug the filtering for
+            tracer: Tracer object for the positions to trace the filtering of,
+                or None. The debug position is traced too, and is written to
+                standard output without a tracer.
+        """
+
+        if pp_filter < 0.0 or pp_filter > 1:
+            raise ValueError("pp_filter must be between 0 and 1")
+
+        self.known_genes = known_genes
+        self.excluded_genes = excluded_genes
+        self.cnv_regions = None
+        if cnv_regions is not None:
+            self.cnv_regions = index_cnv_regions(cnv_regions)
+        self.pp_filter = pp_filter
+        self.tracer = get_tracer(tracer, debug_chrom, debug_pos)
+        self.family = None
+
+    def analyse(self, family):
+        """ find the candidate variants for a proband
+
+        Args:
+            family: Family object, with the child set to the proband
+
+        Returns:
+            list of (variant, check, inheritance) tuples, sorted by variant
+        """
+
+        self.family = family
+
+        loader = LoadVCFs(1, self.known_genes, self.excluded_genes,
+            self.tracer)
+        variants = loader.get_trio_variants(family, self.pp_filter)
+
+        found_vars = self.exclude_duplicates(self.find_candidates(variants))
+
+        post_filter = PostInheritanceFilter(found_vars, self.tracer)
+        found_vars = post_filter.filter_variants()
+
+        return sorted(found_vars)
+
+def analyse_families(families, known_genes=None, excluded_genes=None,
+        cnv_regions=None, pp_filter=0.9, debug_chrom=None, debug_pos=None,
+        tracer=None):
+    """ find the candidate variants for each affected proband in families
+
+    Args:
+        families: dictionary of Family objects indexed by family ID, a list of
+            Family objects, or the path to a PED file
+        known_genes: dictionary of known genes, from open_known_genes(), or
+            None to analyse all genes
+        excluded_genes: set of excluded genes, from open_known_genes()
+        cnv_regions: index of syndrome regions, from open_cnv_regions(), or
+            None
+        pp_filter: threshold for the PP_DNM filter of de novos
+        debug_chrom: chromosome of a variant to debug the filtering for
+        debug_pos: position of a variant to debug the filtering for
+        tracer: Tracer object for the positions to trace, or None
+
+    Returns:
+        iterator of (family, candidates) tuples, one per affected proband, in
+        family ID order. Each family is a copy of the original family, with the
+        child set to the proband, and the candidates are a list of (variant,
+        check, inheritance) tuples. The original families are not changed.
+    """
+
+    if isinstance(families, str):
+        families = ped.load_families(families)
+    elif not isinstance(families, dict):
+        families = dict((x.family_id, x) for x in families)
+
+    analyser = TrioAnalyser(known_genes, excluded_genes, cnv_regions,
+        pp_filter, debug_chrom, debug_pos, tracer)
+
+    for family in get_probands(families):
+        yield family, analyser.analyse(family)
@@ -0,0 +1,188 @@
+""" find clusters of similar CNVs across the probands of a cohort
+
+CNVs found in several probands point to recurrent rearrangements, such as the
+CNVs of genomic disorders. As each proband is analysed, the proband's CNVs
+which passed the CNV filters are added to an interval index for the cohort. At
+the end of the run, CNVs of the same type (deletion or duplication) are linked
+if they overlap and each CNV's size is within the other's size tolerance (the
+rule MatchCNVs uses to match CNVs between family members). Clusters are the
+groups of linked CNVs, and we report the number of probands carrying each
+cluster.
+
+Rather than comparing every pair of CNVs, each CNV is only compared with the
+CNVs the index finds overlapping it. The counts from separate processes are
+merged as described in cohort_summary.py.
+"""
+
+import logging
+
+from clinicalfilter.cohort_summary import CohortSummary
+from clinicalfilter.interval_index import IntervalIndex
+from clinicalfilter.match_cnvs import get_size_tolerance
+
+def get_cnvs(variants):
+    """ find the proband's CNVs
+
+    Args:
+        variants: list of TrioGenotypes objects for a proband, which have
+            passed the filters.
+
+    Returns:
+        list of dictionaries for the CNVs, with the chromosome, start, end,
+        type (DEL or DUP) and genes.
+    """
+
+    cnvs = []
+    for var in variants:
+        if not var.is_cnv():
+            continue
+
+        start, end = var.child.get_range()
+        cnvs.append({"chrom": var.get_chrom(), "start": start, "end": end,
+            "type": var.child.get_genotype(), "gene": var.get_gene()})
+
+    return cnvs
+
+
+class CNVClusters(CohortSummary):
+    """ clusters the CNVs of the probands in a cohort
+    """
+
+    entry_key = "cnvs"
+    option = "cnv_clusters"
+    flag = "--cnv-clusters"
+
+    def __init__(self, counts_path=None):
+        """ initialise the index of CNVs
+
+        Args:
+            counts_path: path to append each proband's CNVs to, or None to
+                only hold the CNVs in memory
+        """
+
+        super(CNVClusters, self).__init__(counts_path)
+
+        self.index = IntervalIndex()
+        self.cnvs = []
+
+    @staticmethod
+    def get_values(family, variants):
+        """ get the CNVs for a proband
+        """
+
+        return get_cnvs(variants)
+
+    def add_values(self, proband_id, cnvs):
+        """ add a proband's CNVs to the index
+
+        Args:
+            proband_id: ID of the proband with the CNVs
+            cnvs: list of CNV dictionaries, from get_cnvs()
+        """
+
+        for cnv in cnvs:
+            tolerance = get_size_tolerance(cnv["end"] - cnv["start"])
+            self.index.add(cnv["chrom"], cnv["start"], cnv["end"], len(self.cnvs))
+            self.cnvs.append((proband_id, cnv, tolerance))
+
+    def is_similar(self, first, second):
+        """ check if two CNVs have the same type, and similar sizes
+
+        Args:
+            first: index of a CNV
+            second: index of another CNV
+
+        Returns:
+            True/False for whether each CNV's size is within the size
+            tolerance of the other CNV.
+        """
+
+        first_cnv, first_tolerance = self.cnvs[first][1:]
+        second_cnv, second_tolerance = self.cnvs[second][1:]
+
+        if first_cnv["type"] != second_cnv["type"]:
+            return False
+
+        first_size = first_cnv["end"] - first_cnv["start"]
+        second_size = second_cnv["end"] - second_cnv["start"]
+
+        return first_tolerance[1] > second_size > first_tolerance[0] and \
+            second_tolerance[1] > first_size > second_tolerance[0]
+
+    def get_clusters(self):
+        """ group the CNVs into clusters of overlapping, similar CNVs
+
+        Returns:
+            list of clusters, where each cluster is a list of CNV indexes,
+            sorted by chromosome and start position.
+        """
+
+        # each CNV starts in its own cluster, and clusters are joined whenever
+        # a pair of their CNVs are similar
+        parents = list(range(len(self.cnvs)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        clusters = []
+        for chrom in self.index.get_chroms():
+            intervals = self.index.get_intervals(chrom)
+            for start, end, i in intervals:
+                for other in self.index.find_overlaps(chrom, start, end):
+                    j = other[2]
+                    if j < i and find(i) != find(j) and self.is_similar(i, j):
+                        parents[find(i)] = find(j)
+
+            groups = {}
+            for start, end, i in intervals:
+                root = find(i)
+                if root not in groups:
+                    groups[root] = []
+                    clusters.append(groups[root])
+                groups[root].append(i)
+
+        return clusters
+
+    def write_summary(self, path):
+        """ write a table of the CNV clusters
+
+        The clusters carried by the most probands are written first.
+
+        Args:
+            path: path for the table of clusters
+        """
+
+        rows = []
+        for cluster in self.get_clusters():
+            cnvs = [self.cnvs[i][1] for i in cluster]
+            probands = []
+            for i in cluster:
+                if self.cnvs[i][0] not in probands:
+                    probands.append(self.cnvs[i][0])
+
+            genes = set()
+            for cnv in cnvs:
+                if cnv["gene"] is not None:
+                    genes |= set(cnv["gene"].split(","))
+
+            rows.append([cnvs[0]["chrom"], min([x["start"] for x in cnvs]),
+                max([x["end"] for x in cnvs]), cnvs[0]["type"], len(cnvs),
+                len(probands), ",".join(probands), ",".join(sorted(genes))])
+
+        # the clusters are already in position order, so sorting by the number
+        # of carriers keeps clusters with the same number in position order
+        rows = sorted(rows, key=lambda x: -x[5])
+
+        with open(path, "w") as handle:
+            handle.write("\t".join(["chrom", "start", "end", "type", "cnvs",
+                "carriers", "proband_ids", "genes"]) + "\n")
+            for row in rows:
+                handle.write("\t".join([str(x) for x in row]) + "\n")
+
+        recurrent = [x for x in rows if x[5] > 1]
+        logging.info("clustered " + str(len(self.cnvs)) + " CNVs from " + \
+            str(len(self.probands)) + " probands, " + str(len(recurrent)) + \
+            " clusters have more than one carrier")
@@ -0,0 +1,194 @@
+""" summaries of the variants found across the probands of a cohort
+
+Summaries (such as the genes with recurrent de novos, or clusters of CNVs found
+in several probands) are collected as each trio is analysed, rather than by
+another pass over the outputs. Each proband's values are appended to a counts
+file as a line of JSON, and added to the summary's counters. The counts files
+from separate processes (region workers, local scheduler jobs, queue workers,
+or the shards of a cohort) are merged by loading them into a single summary,
+which counts each proband once, then the summary tables are written for the
+cohort.
+"""
+
+import json
+import logging
+import os
+
+def merge_summaries(summary_type, paths, output_path):
+    """ merge the counts files from separate processes, and write the summary
+
+    Args:
+        summary_type: CohortSummary subclass for the counts files
+        paths: list of paths to counts files, in the order to merge them.
+            Missing paths are skipped.
+        output_path: path for the summary tables, the merged counts are
+            written to the same path with a ".counts" suffix.
+
+    Returns:
+        summary object with the merged counts
+    """
+
+    summary = summary_type(output_path + ".counts")
+    for path in paths:
+        summary.load(path)
+
+    summary.save()
+    summary.write_summary(output_path)
+
+    return summary
+
+
+def merge_values(values):
+    """ merge a proband's values from separate regions of the genome
+
+    Args:
+        values: list of the values for each region, from get_values()
+
+    Returns:
+        list of the values from every region, or None if the proband isn't
+        included in the summary.
+    """
+
+    if None in values:
+        return None
+
+    merged = []
+    for region_values in values:
+        merged += region_values
+
+    return merged
+
+
+class CohortSummary(object):
+    """ collects values for each proband, to summarise across the cohort
+
+    Subclasses set the entry key and command line option for the summary, and
+    define get_values(), add_values() and write_summary().
+    """
+
+    # the key of the proband's values in the counts file entries
+    entry_key = None
+
+    # the option (in the ClinicalFilter definitions) with the summary path,
+    # and the command line flag for the option
+    option = None
+    flag = None
+
+    def __init__(self, counts_path=None):
+        """ initialise the summary
+
+        Args:
+            counts_path: path to append each proband's values to, or None to
+                only hold the values in memory
+        """
+
+        self.counts_path = counts_path
+
+        self.entries = []
+        self.probands = set()
+
+    @staticmethod
+    def get_values(family, variants):
+        """ get the values to summarise for a proband
+
+        Args:
+            family: Family object, with the child set to the proband
+            variants: list of TrioGenotypes objects for the proband
+
+        Returns:
+            list of values to summarise (which need to be JSON serialisable),
+            or None if the proband isn't included in the summary.
+        """
+
+        raise NotImplementedError
+
+    def add_values(self, proband_id, values):
+        """ add the values for a proband to the counters
+        """
+
+        raise NotImplementedError
+
+    def write_summary(self, path):
+        """ write the summary tables for the cohort
+        """
+
+        raise NotImplementedError
+
+    def add_proband(self, family_id, proband_id, values):
+        """ add the values for a proband, and append them to the counts file
+
+        Args:
+            family_id: ID of the proband's family
+            proband_id: ID of the proband
+            values: list of values, from get_values(), or None to skip the
+                proband
+        """
+
+        if values is None:
+            return
+
+        entry = {"family": family_id, "proband": proband_id,
+            self.entry_key: values}
+
+        if self.add_entry(entry) and self.counts_path is not None:
+            with open(self.counts_path, "a") as handle:
+                handle.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    def add_entry(self, entry):
+        """ add a proband's entry to the counters
+
+        Probands are only counted once, so we keep the first entry for any
+        proband found in more than one counts file.
+
+        Args:
+            entry: dictionary with the family ID, proband ID and values
+
+        Returns:
+            True/False for whether the proband was counted
+        """
+
+        key = (entry["family"], entry["proband"])
+        if key in self.probands:
+            logging.warning(entry["proband"] + " has already been counted in " \
+                "the " + self.entry_key + " summary, only the first copy is kept")
+            return False
+
+        self.probands.add(key)
+        self.entries.append(entry)
+        self.add_values(entry["proband"], entry[self.entry_key])
+
+        return True
+
+    def load(self, path, keep=None):
+        """ add the probands from a counts file
+
+        Args:
+            path: path to a counts file. Missing files are skipped.
+            keep: set of (family ID, proband ID) tuples to restrict the
+                probands to, or None to add every proband.
+        """
+
+        if not os.path.exists(path):
+            return
+
+        with open(path, "r") as handle:
+            for line in handle:
+                # a run which died can leave a partial line at the end
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning("skipping an incomplete line in " + path)
+                    continue
+
+                if keep is not None and (entry["family"], entry["proband"]) not in keep:
+                    continue
+
+                self.add_entry(entry)
+
+    def save(self):
+        """ write the entries for every counted proband to the counts file
+        """
+
+        with open(self.counts_path, "w") as handle:
+            for entry in self.entries:
+                handle.write(json.dumps(entry, sort_keys=True) + "\n")
@@ -0,0 +1,429 @@
+""" a long-running daemon, which analyses trios as they are requested
+
+Loading the known genes, syndrome regions and alternate IDs takes longer than
+analysing a single trio, so for trios that arrive one at a time (eg as samples
+finish sequencing) we load the reference data once, and keep it in memory.
+
+Usage:
+
+python clinical_filter.py daemon \\
+    --socket /tmp/clinical_filter.sock \\
+    --known-genes known_genes.txt \\
+    --syndrome-regions regions.txt
+
+Each request is a JSON object describing a trio:
+
+    {"family_id": "fam1",
+     "child": {"id": "child1", "path": "child1.vcf.gz", "sex": "F"},
+     "mother": {"id": "mom1", "path": "mom1.vcf.gz", "affected": "1"},
+     "father": {"id": "dad1", "path": "dad1.vcf.gz", "affected": "1"},
+     "options": {"pp_filter": 0.9}}
+
+The parents and options are optional. The response is a JSON object with the
+family ID, the proband ID, and a list of candidates, each keyed by the columns
+of the tabular output, or a JSON object with an "error" message.
+
+Requests are sent over a Unix socket as a single line of JSON (and the response
+is a single line of JSON), or with --port, POSTed to /analyse over HTTP. Each
+request is analysed in a forked process, so several requests run concurrently,
+and share the reference data without copying it. The reference files are
+checked before each request, and reloaded if they have changed on disk.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from clinicalfilter.load_files import open_known_genes, \
+    create_person_ID_mapper, open_cnv_regions
+from clinicalfilter.api import TrioAnalyser
+from clinicalfilter.reporting import Report
+from clinicalfilter import ped
+
+# options which each request can set for its trio
+REQUEST_OPTIONS = ["pp_filter"]
+
+def get_options(arguments):
+    """ get the options for running the daemon
+
+    Args:
+        arguments: list of command line arguments, following "daemon"
+
+    Returns:
+        argparse Namespace of options
+    """
+
+    parser = argparse.ArgumentParser(prog="clinical_filter.py daemon",
+        description="Keep the reference data loaded, and analyse trios as \
+        they are requested.")
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket", dest="socket", help="Path for a Unix socket to accept requests on.")
+    group.add_argument("--port", dest="port", type=int, help="Port to accept HTTP requests on.")
+
+    parser.add_argument("--host", dest="host", default="127.0.0.1", help="Address to accept HTTP requests on (defaults to 127.0.0.1, so only local requests are accepted).")
+    parser.add_argument("--syndrome-regions", dest="regions", help="Path to list of CNV regions known to occur in disorders.")
+    parser.add_argument("--known-genes", dest="genes", help="Path to table of known disease causative genes.")
+    parser.add_argument("--known-genes-date", dest="genes_date", help="Date that the list of known disease causative genes was last updated.")
+    parser.add_argument("--alternate-ids", dest="alternate_ids", help="Path to table of alternate IDs, used to map individual IDs to their alternate study IDs.")
+    parser.add_argument("--pp-dnm-threshold", dest="pp_filter", type=float, default=0.9, help="Default threshold for the PP_DNM filter, which requests can override (defaults to 0.9).")
+    parser.add_argument("--workers", dest="workers", type=int, default=4, help="Number of requests to analyse concurrently (defaults to 4).")
+    parser.add_argument("--log", dest="loglevel", default="info", help="Level of logging to use, choose from: debug, info, warning, error or critical.")
+
+    args = parser.parse_args(arguments)
+
+    if args.pp_filter < 0.0 or args.pp_filter > 1:
+        parser.error("--pp-dnm-threshold must be between 0 and 1")
+
+    return args
+
+
+class References(object):
+    """ holds the reference data, and reloads it when the files change
+    """
+
+    def __init__(self, genes=None, regions=None, alternate_ids=None,
+            genes_date=None, pp_filter=0.9):
+        """ load the reference data
+
+        Args:
+            genes: path to the known genes, or None
+            regions: path to the syndrome regions, or None
+            alternate_ids: path to the alternate IDs, or None
+            genes_date: date the known genes were last updated, or None
+            pp_filter: default threshold for the PP_DNM filter
+        """
+
+        self.paths = {"genes": genes, "regions": regions,
+            "alternate_ids": alternate_ids}
+        self.known_genes_date = genes_date
+        self.pp_filter = pp_filter
+
+        self.load()
+
+    def get_mtimes(self):
+        """ get the modification times of the reference files
+        """
+
+        mtimes = {}
+        for key in self.paths:
+            if self.paths[key] is not None:
+                mtimes[key] = os.stat(self.paths[key]).st_mtime_ns
+
+        return mtimes
+
+    def load(self):
+        """ load the reference data from the files
+        """
+
+        mtimes = self.get_mtimes()
+
+        known_genes, excluded_genes = None, None
+        if self.paths["genes"] is not None:
+            known_genes, excluded_genes = open_known_genes(self.paths["genes"])
+
+        cnv_regions = None
+        if self.paths["regions"] is not None:
+            cnv_regions = open_cnv_regions(self.paths["regions"])
+
+        ID_mapper = None
+        if self.paths["alternate_ids"] is not None:
+            ID_mapper = create_person_ID_mapper(self.paths["alternate_ids"])
+
+        # only swap in the new data once it has all loaded
+        self.known_genes = known_genes
+        self.excluded_genes = excluded_genes
+        self.cnv_regions = cnv_regions
+        self.ID_mapper = ID_mapper
+        self.mtimes = mtimes
+
+    def is_stale(self):
+        """ check whether any of the reference files have changed
+        """
+
+        try:
+            return self.get_mtimes() != self.mtimes
+        except OSError:
+            # a file being replaced can be briefly missing
+            return False
+
+    def reload_if_stale(self):
+        """ reload the reference data if the files have changed
+
+        If the files can't be loaded (eg they are partway through being
+        written), we keep the current data, and try again for the next request.
+
+        Returns:
+            True/False for whether the reference data was reloaded
+        """
+
+        if not self.is_stale():
+            return False
+
+        try:
+            self.load()
+        except Exception:
+            logging.exception("couldn't reload the reference data, keeping " \
+                "the current data")
+            return False
+
+        logging.info("reloaded the reference data")
+        return True
+
+
+def get_family(spec):
+    """ make a Family object from a request
+
+    Args:
+        spec: dictionary for the request, see the module docstring
+
+    Returns:
+        Family object, with the child set
+    """
+
+    for key in ["family_id", "child"]:
+        if key not in spec:
+            raise ValueError("request lacks " + key)
+
+    family = ped.Family(str(spec["family_id"]))
+
+    members = [("child", family.add_child, "2", None),
+        ("mother", family.add_mother, "1", "2"),
+        ("father", family.add_father, "1", "1")]
+    for member, add_member, affected, sex in members:
+        if member not in spec:
+            continue
+
+        details = spec[member]
+        for key in ["id", "path"]:
+            if key not in details:
+                raise ValueError(member + " lacks " + key)
+
+        sex = details.get("sex", sex)
+        if sex is None:
+            raise ValueError(member + " lacks sex")
+
+        add_member(str(details["id"]), details["path"],
+            str(details.get("affected", affected)), str(sex))
+
+    if ("mother" in spec) != ("father" in spec):
+        raise ValueError("requests need both parents, or neither parent")
+
+    family.set_child()
+
+    return family
+
+
+class TrioRequest(object):
+    """ analyses the trio for a single request
+    """
+
+    def __init__(self, references, spec):
+        """ set up the analysis for a request
+
+        Args:
+            references: References object
+            spec: dictionary for the request, see the module docstring
+        """
+
+        self.references = references
+        self.family = get_family(spec)
+
+        options = spec.get("options", {})
+        for key in options:
+            if key not in REQUEST_OPTIONS:
+                raise ValueError("unknown option: " + key)
+
+        pp_filter = float(options.get("pp_filter", references.pp_filter))
+        self.analyser = TrioAnalyser(references.known_genes,
+            references.excluded_genes, references.cnv_regions, pp_filter)
+
+    def analyse(self):
+        """ find the candidate variants for the trio
+
+        Returns:
+            dictionary with the family ID, proband ID, and list of candidates
+        """
+
+        found_vars = self.analyser.analyse(self.family)
+
+        report = Report(None, None, self.references.ID_mapper,
+            self.references.known_genes_date)
+
+        return {"family_id": self.family.family_id,
+            "proband": self.family.child.get_id(),
+            "candidates": report.get_candidate_records(found_vars, self.family)}
+
+
+def analyse_request(references, data):
+    """ analyse the trio for a request, and get the response
+
+    Args:
+        references: References object
+        data: JSON string for the request
+
+    Returns:
+        tuple of (response dictionary, True/False for whether the request was
+        valid)
+    """
+
+    try:
+        request = TrioRequest(references, json.loads(data))
+    except (ValueError, TypeError, AttributeError) as error:
+        return {"error": "invalid request: " + str(error)}, False
+
+    try:
+        return request.analyse(), True
+    except Exception as error:
+        logging.exception("failed to analyse " + request.family.family_id)
+        return {"error": str(error)}, True
+
+
+class ReloadingMixIn(object):
+    """ checks the reference data before each request is forked
+
+    The reload happens in the parent process, so later requests use the new
+    data. Requests which are already running keep the data they started with.
+    """
+
+    def process_request(self, request, client_address):
+        self.references.reload_if_stale()
+        super(ReloadingMixIn, self).process_request(request, client_address)
+
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    """ handles a request sent over a Unix socket, as a line of JSON
+    """
+
+    def handle(self):
+        data = self.rfile.readline().decode("utf8")
+        response = analyse_request(self.server.references, data)[0]
+        self.wfile.write((json.dumps(response) + "\n").encode("utf8"))
+
+
+class HTTPHandler(BaseHTTPRequestHandler):
+    """ handles a request POSTed to /analyse
+    """
+
+    def do_POST(self):
+        if self.path != "/analyse":
+            self.send_json({"error": "unknown path: " + self.path}, 404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length).decode("utf8")
+        response, valid = analyse_request(self.server.references, data)
+
+        status = 200
+        if not valid:
+            status = 400
+        elif "error" in response:
+            status = 500
+
+        self.send_json(response, status)
+
+    def send_json(self, response, status):
+        """ send a JSON response
+        """
+
+        body = json.dumps(response).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info(self.address_string() + " " + (format % args))
+
+
+class ForkingUnixServer(ReloadingMixIn, socketserver.ForkingMixIn,
+        socketserver.UnixStreamServer):
+    """ analyses each request from a Unix socket in a forked process
+    """
+
+    def __init__(self, path, references, workers):
+        self.references = references
+        self.max_children = workers
+
+        # remove the socket left behind by an earlier daemon
+        if os.path.exists(path):
+            os.remove(path)
+
+        socketserver.UnixStreamServer.__init__(self, path, SocketHandler)
+
+
+class ForkingHTTPServer(ReloadingMixIn, socketserver.ForkingMixIn, HTTPServer):
+    """ analyses each HTTP request in a forked process
+    """
+
+    def __init__(self, address, references, workers):
+        self.references = references
+        self.max_children = workers
+
+        HTTPServer.__init__(self, address, HTTPHandler)
+
+
+def send_request(socket_path, spec):
+    """ send a request to a daemon listening on a Unix socket
+
+    Args:
+        socket_path: path to the daemon's socket
+        spec: dictionary for the request, see the module docstring
+
+    Returns:
+        dictionary for the response
+    """
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall((json.dumps(spec) + "\n").encode("utf8"))
+
+        handle = client.makefile("rb")
+        response = handle.readline()
+        handle.close()
+    finally:
+        client.close()
+
+    return json.loads(response.decode("utf8"))
+
+def main(arguments):
+    """ run the daemon from the command line
+
+    Args:
+        arguments: list of command line arguments, following "daemon"
+    """
+
+    options = get_options(arguments)
+
+    numeric_level = getattr(logging, options.loglevel.upper(), None)
+    logging.basicConfig(level=numeric_level, format="%(asctime)s %(message)s")
+
+    references = References(options.genes, options.regions,
+        options.alternate_ids, options.genes_date, options.pp_filter)
+
+    if options.socket is not None:
+        server = ForkingUnixServer(options.socket, references, options.workers)
+        logging.info("listening on " + options.socket)
+    else:
+        server = ForkingHTTPServer((options.host, options.port), references,
+            options.workers)
+        logging.info("listening on " + options.host + ":" + str(options.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if options.socket is not None and os.path.exists(options.socket):
+            os.remove(options.socket)
+
+    sys.exit(0)
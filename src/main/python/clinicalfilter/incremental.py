@@ -0,0 +1,270 @@
+""" reanalyse a cohort incrementally when the known genes list changes
+
+A run with a candidate cache records, for each proband, where the proband's
+results are in the output, and the sites of the proband's candidate variants.
+The sites are the child's variants which pass the filters that don't depend on
+the known genes (functional consequence and allele frequency), along with all
+the child's CNVs. Each site keeps its position range, and the gene symbols from
+its annotation.
+
+When the known genes list is updated, we compare the old and new lists for
+genes which were added, removed or changed (in their inheritance modes,
+mechanisms, status or position), including genes which moved in or out of the
+excluded genes. The known genes only affect how a proband's variants are
+loaded and checked within the known genes' positions, or for variants annotated
+with the known gene's symbol, so a proband needs reanalysing only if one of its
+sites overlaps the old or new position of a changed gene, or is annotated with
+a changed gene. The other probands' results are copied from the earlier output.
+"""
+
+import json
+import logging
+import os
+
+from clinicalfilter.load_files import open_known_genes
+from clinicalfilter.resume import get_file_checksum, get_config_hash, \
+    get_proband_key, inputs_unchanged
+
+# options which can change between the earlier and current run
+GENE_OPTIONS = ["genes", "genes_date"]
+
+def get_site(var):
+    """ get the site for a child's variant, if it could be a candidate under
+    any known genes list
+
+    Args:
+        var: SNV or CNV object, before the variant has been filtered
+
+    Returns:
+        list of [chrom, start, end, gene symbols], or None if the variant fails
+        the filters that don't depend on the known genes.
+    """
+
+    if not var.is_cnv():
+        if not var.is_lof() and not var.is_missense():
+            return None
+
+        max_maf = var.find_max_allele_frequency()
+        if max_maf is not None and max_maf > 0.01:
+            return None
+
+    symbols = set()
+    for value in [var.gene, var.info.get("HGNC"), var.info.get("HGNC_ALL")]:
+        if isinstance(value, str):
+            symbols.update(value.split(","))
+
+    start, end = var.get_range()
+
+    return [var.get_chrom(), start, end, sorted(symbols)]
+
+def get_changed_genes(old_genes, old_excluded, new_genes, new_excluded):
+    """ find the genes which differ between two known genes lists
+
+    Args:
+        old_genes: dictionary of known genes, from open_known_genes()
+        old_excluded: set of excluded gene symbols from the old list
+        new_genes: dictionary of known genes for the updated list
+        new_excluded: set of excluded gene symbols from the updated list
+
+    Returns:
+        dictionary of (chrom, start, end) ranges for each changed gene, from
+        the old and new lists. Genes which are only excluded have no ranges.
+    """
+
+    changed = {}
+    for gene in set(old_genes) | set(new_genes):
+        old = old_genes.get(gene)
+        new = new_genes.get(gene)
+        if old == new:
+            continue
+
+        changed[gene] = []
+        for entry in [old, new]:
+            if entry is not None:
+                changed[gene].append((entry["chrom"], entry["start"], entry["end"]))
+
+    for gene in old_excluded ^ new_excluded:
+        if gene not in changed:
+            changed[gene] = []
+
+    return changed
+
+def is_site_affected(site, changed, changed_ranges):
+    """ check if a site might be affected by the changed genes
+
+    Args:
+        site: [chrom, start, end, gene symbols] list
+        changed: dictionary of ranges for the changed genes
+        changed_ranges: dictionary of (start, end) ranges for the changed
+            genes, indexed by chromosome
+
+    Returns:
+        True/False for whether the site needs reanalysing
+    """
+
+    chrom, start, end, symbols = site
+
+    for symbol in symbols:
+        if symbol in changed:
+            return True
+
+    for gene_start, gene_end in changed_ranges.get(chrom, []):
+        if start <= gene_end and end >= gene_start:
+            return True
+
+    return False
+
+
+class CandidateCache(object):
+    """ writes the output ranges and candidate sites for each proband
+    """
+
+    def __init__(self, path, options):
+        """ start a cache, replacing any existing file
+
+        Args:
+            path: path to write the cache to
+            options: argparse Namespace of the run options
+        """
+
+        self.path = path
+        self.output_path = options.output
+
+        header = {"config": get_config_hash(options, ignore=GENE_OPTIONS),
+            "known_genes_sha1": get_file_checksum(options.genes)}
+        with open(self.path, "w") as handle:
+            handle.write(json.dumps(header, sort_keys=True) + "\n")
+
+        self.start = None
+
+    def start_proband(self):
+        """ note where the current proband's results start in the output
+        """
+
+        self.start = os.path.getsize(self.output_path)
+
+    def add_proband(self, family, inputs, sites):
+        """ record the current proband's output range and sites
+
+        Args:
+            family: Family object, with the child set to the proband
+            inputs: list of [path, size, mtime, checksum] for the trio's VCFs
+            sites: list of [chrom, start, end, gene symbols] lists
+        """
+
+        entry = {"proband": get_proband_key(family), "start": self.start,
+            "end": os.path.getsize(self.output_path), "inputs": inputs,
+            "sites": sites}
+
+        with open(self.path, "a") as handle:
+            handle.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+class IncrementalAnalysis(object):
+    """ decides which probands need reanalysing after the known genes change
+    """
+
+    def __init__(self, options, known_genes, excluded_genes):
+        """ load the earlier run's cache, and find the changed genes
+
+        Args:
+            options: argparse Namespace of the run options, which include the
+                previous known genes list, output and candidate cache.
+            known_genes: dictionary of known genes for the current run
+            excluded_genes: set of excluded genes for the current run
+        """
+
+        self.previous_output = options.previous_output
+
+        old_genes, old_excluded = open_known_genes(options.previous_genes)
+        self.changed = get_changed_genes(old_genes, old_excluded, known_genes,
+            excluded_genes)
+        logging.info(str(len(self.changed)) + " known genes were added, " \
+            "removed or changed: " + ",".join(sorted(self.changed)))
+
+        self.changed_ranges = {}
+        for gene in self.changed:
+            for chrom, start, end in self.changed[gene]:
+                if chrom not in self.changed_ranges:
+                    self.changed_ranges[chrom] = []
+                self.changed_ranges[chrom].append((start, end))
+
+        self.entries = self.load_cache(options)
+        self.reusable = {}
+
+    def load_cache(self, options):
+        """ load the proband entries from the earlier run's candidate cache
+
+        Returns:
+            dictionary of cache entries, indexed by proband key. This is empty
+            if the earlier run used different options, so every proband is
+            reanalysed.
+        """
+
+        with open(options.previous_cache, "r") as handle:
+            header = json.loads(handle.readline())
+            entries = [json.loads(line) for line in handle]
+
+        if header["known_genes_sha1"] != get_file_checksum(options.previous_genes):
+            raise ValueError("the candidate cache at " + options.previous_cache + \
+                " was made with a different known genes list from " + \
+                options.previous_genes)
+
+        if header["config"] != get_config_hash(options, ignore=GENE_OPTIONS):
+            logging.warning("the options differ from the earlier run, so " \
+                "every proband will be reanalysed")
+            return {}
+
+        size = os.path.getsize(self.previous_output)
+
+        return dict((x["proband"], x) for x in entries if x["end"] <= size)
+
+    def get_reusable(self, family):
+        """ get the cache entry for a proband, if its results can be reused
+
+        Args:
+            family: Family object, with the child set to the proband
+
+        Returns:
+            cache entry, or None if the proband needs reanalysing
+        """
+
+        key = get_proband_key(family)
+        if key not in self.reusable:
+            self.reusable[key] = self.check_entry(self.entries.get(key))
+
+        return self.reusable[key]
+
+    def check_entry(self, entry):
+        """ check if a proband's cache entry is unaffected by the changed genes
+
+        Returns:
+            the cache entry, or None if the proband needs reanalysing
+        """
+
+        if entry is None:
+            return None
+
+        for site in entry["sites"]:
+            if is_site_affected(site, self.changed, self.changed_ranges):
+                return None
+
+        if not inputs_unchanged(entry["inputs"]):
+            return None
+
+        return entry
+
+    def copy_results(self, entry, output_path):
+        """ append a proband's results from the earlier output
+
+        Args:
+            entry: cache entry for the proband
+            output_path: path to the output for the current run
+        """
+
+        with open(self.previous_output, "rb") as handle:
+            handle.seek(entry["start"])
+            data = handle.read(entry["end"] - entry["start"])
+
+        with open(output_path, "ab") as handle:
+            handle.write(data)
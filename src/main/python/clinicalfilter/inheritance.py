@@ -5,6 +5,9 @@ chromosome that the variant/s are in.
 
 import logging
 
+from clinicalfilter.syndrome_regions import index_cnv_regions, \
+    find_syndrome_regions, has_enough_overlap
+
 
 class Inheritance(object):
     """figure out whether trio genotypes fit mendelian inheritance models
@@ -78,7 +81,7 @@ class Inheritance(object):
             self.is_lof = variant.child.is_lof()
             
             # check against every inheritance mode for the gene
-            for inheritance in self.inheritance_modes & self.gene_inheritance:
+            for inheritance in sorted(self.inheritance_modes & self.gene_inheritance):
                 check = self.examine_variant(variant, inheritance)
                 self.add_variant_to_appropriate_list(variant, check, inheritance)
             
@@ -742,53 +745,29 @@ class CNVInheritance(object):
     
     def check_cnv_region_overlap(self, cnv_regions):
         """ finds CNVs that overlap DECIPHER syndrome regions
+        
+        Args:
+            cnv_regions: IntervalIndex of syndrome regions, from
+                open_cnv_regions(), or a dictionary of copy numbers indexed by
+                (chrom, start, end) tuples.
+        
+        Returns:
+            True/False for whether the CNV sufficiently overlaps a region with
+            the same copy number.
         """
         
         chrom = self.variant.child.get_chrom()
         start, end = self.variant.child.get_range()
         copy_number = int(self.variant.child.info["CNS"])
         
-        for region_key in cnv_regions:
-            region_chrom = region_key[0]
-            region_start = int(region_key[1])
-            region_end = int(region_key[2])
-            region_copy_number = int(cnv_regions[region_key])
-            
-            if region_chrom != chrom or copy_number != region_copy_number:
-                continue
-            
-            if start <= region_end and end >= region_start and \
-                    self.has_enough_overlap(start, end, region_start, region_end):
-                return True
+        regions = find_syndrome_regions(index_cnv_regions(cnv_regions), chrom,
+            start, end, copy_number)
         
-        return False
+        return len(regions) > 0
     
     def has_enough_overlap(self, start, end, region_start, region_end):
         """ finds if a CNV and another chrom region share sufficient overlap
         """
         
-        # find the point where the overlap starts
-        overlap_start = region_start
-        if region_start <= start <= region_end:
-            overlap_start = start
-        
-        # find the point where the overlap ends
-        overlap_end = region_end
-        if region_start <= end <= region_end:
-            overlap_end = end
-        
-        distance = (overlap_end - overlap_start) + 1
-        
-        # adjust the positions before we try to divide by zero, if the "region"
-        # is actually a SNV
-        if end == start:
-            start -= 1
-        if region_end == region_start:
-            region_start -= 1
-        
-        forward = float(distance)/(abs(end - start) + 1)
-        reverse = float(distance)/(abs(region_end - region_start) + 1)
-        
-        # determine whether there is sufficient overlap
-        return forward > 0.01 and reverse > 0.01
+        return has_enough_overlap(start, end, region_start, region_end)
         
@@ -0,0 +1,183 @@
+""" an index of intervals on each chromosome, for finding overlapping intervals
+
+The intervals on each chromosome are sorted by their start positions, and we
+keep a segment tree of the furthest end position within each range of the
+sorted intervals. The intervals which start before the end of a query are found
+with a binary search, then we only descend into the branches of the tree that
+reach the start of the query. Building the index takes O(n log n) time, and a
+query takes O(log n) time for each overlapping interval, rather than checking
+every interval on the chromosome.
+
+Intervals can be added at any time, a chromosome is sorted again at the next
+query after intervals were added to it. Coordinates are integers, and
+intervals include both their start and end positions.
+"""
+
+import bisect
+
+
+class SortedIntervals(object):
+    """ the intervals for a single chromosome, sorted by start position
+    """
+
+    def __init__(self, intervals):
+        """ sort the intervals and build the tree of end positions
+
+        Args:
+            intervals: list of (start, end, order, value) tuples, where the
+                order is the index of when the interval was added.
+        """
+
+        self.intervals = sorted(intervals, key=lambda x: (x[0], x[2]))
+        self.starts = [x[0] for x in self.intervals]
+
+        # the leaves of the tree are the end positions of the sorted
+        # intervals, and each node holds the furthest end of its two children
+        self.size = 1
+        while self.size < len(self.intervals):
+            self.size *= 2
+
+        self.tree = [None] * (2 * self.size)
+        for i, interval in enumerate(self.intervals):
+            self.tree[self.size + i] = interval[1]
+        for node in range(self.size - 1, 0, -1):
+            ends = [x for x in self.tree[2 * node:2 * node + 2] if x is not None]
+            if len(ends) > 0:
+                self.tree[node] = max(ends)
+
+    def find_overlaps(self, start, end):
+        """ find the intervals which overlap a region
+
+        Args:
+            start: start position of the region
+            end: end position of the region
+
+        Returns:
+            list of (start, end, order, value) tuples, in the order that the
+            intervals were added to the index.
+        """
+
+        # only intervals starting at or before the end of the region can
+        # overlap it
+        limit = bisect.bisect_right(self.starts, end)
+
+        found = []
+        nodes = [(1, 0, self.size)]
+        while len(nodes) > 0:
+            node, low, high = nodes.pop()
+            if low >= limit or self.tree[node] is None or self.tree[node] < start:
+                continue
+
+            if high - low == 1:
+                found.append(self.intervals[low])
+                continue
+
+            middle = (low + high) // 2
+            nodes.append((2 * node + 1, middle, high))
+            nodes.append((2 * node, low, middle))
+
+        return sorted(found, key=lambda x: x[2])
+
+
+class IntervalIndex(object):
+    """ finds the intervals overlapping a region, on each chromosome
+    """
+
+    def __init__(self, intervals=None):
+        """ start the index
+
+        Args:
+            intervals: iterable of (chrom, start, end, value) tuples to add to
+                the index, or None to start an empty index.
+        """
+
+        self.intervals = {}
+        self.sorted = {}
+        self.count = 0
+
+        if intervals is not None:
+            for chrom, start, end, value in intervals:
+                self.add(chrom, start, end, value)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, chrom, start, end, value=None):
+        """ add an interval to the index
+
+        Args:
+            chrom: chromosome of the interval
+            start: start position of the interval
+            end: end position of the interval
+            value: object to return for the interval
+        """
+
+        if chrom not in self.intervals:
+            self.intervals[chrom] = []
+
+        self.intervals[chrom].append((int(start), int(end), self.count, value))
+        self.count += 1
+
+        # the chromosome needs sorting again before the next query
+        if chrom in self.sorted:
+            del self.sorted[chrom]
+
+    def build(self):
+        """ sort the intervals on every chromosome, rather than at the next
+        query, eg before the index is shared between threads
+        """
+
+        for chrom in self.intervals:
+            self.get_sorted(chrom)
+
+    def get_chroms(self):
+        """ get the chromosomes with intervals
+        """
+
+        return sorted(self.intervals)
+
+    def get_sorted(self, chrom):
+        """ get the sorted intervals for a chromosome, sorting if needed
+        """
+
+        if chrom not in self.sorted:
+            self.sorted[chrom] = SortedIntervals(self.intervals[chrom])
+
+        return self.sorted[chrom]
+
+    def get_intervals(self, chrom):
+        """ get the intervals on a chromosome
+
+        Args:
+            chrom: chromosome to get the intervals for
+
+        Returns:
+            list of (start, end, value) tuples, sorted by start position, then
+            by the order they were added.
+        """
+
+        if chrom not in self.intervals:
+            return []
+
+        return [(x[0], x[1], x[3]) for x in self.get_sorted(chrom).intervals]
+
+    def find_overlaps(self, chrom, start, end):
+        """ find the intervals which overlap a region
+
+        Args:
+            chrom: chromosome of the region
+            start: start position of the region
+            end: end position of the region
+
+        Returns:
+            list of (start, end, value) tuples for the intervals which overlap
+            the region (including intervals which only share an end position),
+            in the order the intervals were added.
+        """
+
+        if chrom not in self.intervals:
+            return []
+
+        found = self.get_sorted(chrom).find_overlaps(int(start), int(end))
+
+        return [(x[0], x[1], x[3]) for x in found]
@@ -6,6 +6,8 @@ import io
 import time
 import sys
 
+from clinicalfilter.syndrome_regions import index_cnv_regions
+
 def open_file(path):
     """ opens a file handle, allowing for permission errors
     
@@ -257,7 +259,8 @@ def open_cnv_regions(path):
         path: path to CNV regions file
     
     Returns:
-        dictionary of copy number values, indexed by (chrom, start end) tuples
+        IntervalIndex of the regions, with integer copy numbers as values (see
+        syndrome_regions.py)
     """
     
     f = open_file(path)
@@ -277,4 +280,4 @@ def open_cnv_regions(path):
     
     f.close()
     
-    return cnv_regions
+    return index_cnv_regions(cnv_regions)
@@ -7,7 +7,31 @@ import sys
 from clinicalfilter.load_files import open_filters, open_tags, \
     open_known_genes, create_person_ID_mapper, open_cnv_regions
 from clinicalfilter import ped
+from clinicalfilter.recurrence import DeNovoRecurrence
+from clinicalfilter.cnv_clusters import CNVClusters
+from clinicalfilter.trace import Tracer, open_trace_positions
 
+# the summaries which can be collected across the probands of a cohort
+COHORT_SUMMARIES = [DeNovoRecurrence, CNVClusters]
+
+def get_summary_paths(options):
+    """ get the cohort summaries asked for, along with their output paths
+
+    Args:
+        options: object with an attribute (which can be None) for each
+            summary's path, eg the ClinicalFilter object, or argparse options
+
+    Returns:
+        list of (summary class, path) tuples
+    """
+
+    paths = []
+    for summary_type in COHORT_SUMMARIES:
+        path = getattr(options, summary_type.option, None)
+        if path is not None:
+            paths.append((summary_type, path))
+
+    return paths
 
 def get_options():
     """gets the options from the command line
@@ -34,8 +58,28 @@ def get_options():
     parser.add_argument("-o", "--output", dest="output", help="Path for analysis output in tabular format.")
     parser.add_argument("--export-vcf", dest="export_vcf", help="Directory or file path for analysis output in VCF format.")
     parser.add_argument("--log", dest="loglevel", default="debug", help="Level of logging to use, choose from: debug, info, warning, error or critical.")
-    parser.add_argument("--debug-chrom", dest="debug_chrom", help="chromosome of variant for which to debug the filtering behaviour.")
-    parser.add_argument("--debug-pos", dest="debug_pos", help="position of variant for which to debug the filtering behaviour.")
+    parser.add_argument("--debug-chrom", dest="debug_chrom", help="chromosome of variant for which to debug the filtering behaviour. This traces the variant, as for --trace-positions, and needs --debug-pos.")
+    parser.add_argument("--debug-pos", dest="debug_pos", type=int, help="position of variant for which to debug the filtering behaviour.")
+    parser.add_argument("--trace-positions", dest="trace_positions", help="Path to a file of variant positions (a chromosome and position on each line) to trace. The decision at each filtering and inheritance stage for variants at these positions is recorded as JSON lines.")
+    parser.add_argument("--trace-output", dest="trace_output", help="Path to append the trace records to (defaults to standard output).")
+    parser.add_argument("--timings", dest="timings", help="Path to write JSON lines of the wall time, CPU time and counts for each analysis stage of each proband, plus a summary for the run.")
+    parser.add_argument("--region-workers", dest="region_workers", type=int, help="Number of worker processes used to analyse each proband, by splitting the genome into regions which are analysed in parallel. Regions are only used when every VCF in a trio is either uncompressed, or bgzipped with a tabix index.")
+    parser.add_argument("--load-threads", dest="load_threads", type=int, default=3, help="Number of threads for loading each trio, used to scan the parents' VCFs concurrently, and to find the VCF checksums while the VCFs are parsed (defaults to 3, use 1 to load the VCFs one after another).")
+    parser.add_argument("--prefetch", dest="prefetch", type=int, help="Number of upcoming trios to load in a background thread while the current trio is analysed.")
+    parser.add_argument("--prefetch-memory", dest="prefetch_memory", type=int, default=1000, help="Approximate memory (in MB) that prefetched trios can hold while waiting for analysis (defaults to 1000). At least one trio is always prefetched.")
+    parser.add_argument("--worker", dest="worker", help="Path to a SQLite database (on a shared filesystem) for a queue of the families in the PED file. Any number of workers on different nodes can share the queue, each claims a family at a time, and the last worker to finish merges the family results into the output path.")
+    parser.add_argument("--lease", dest="lease", type=int, default=600, help="Seconds a worker holds a family for before other workers can claim it, which is renewed while the worker is running (defaults to 600). Families from workers that die are claimed again once their lease expires.")
+    parser.add_argument("--max-attempts", dest="max_attempts", type=int, default=3, help="Number of times a worker can claim a family before we give up on the family (defaults to 3).")
+    parser.add_argument("--resume", dest="resume", action="store_true", default=False, help="Record the finished probands in a manifest next to the output, and when rerun with the same options, skip the probands finished by the earlier run, appending only the missing results.")
+    parser.add_argument("--candidate-cache", dest="candidate_cache", help="Path to write the output range and candidate sites for each proband, which allows a later run with an updated known genes list to only reanalyse the affected probands.")
+    parser.add_argument("--previous-known-genes", dest="previous_genes", help="Path to the known genes list used by an earlier run. Only probands with candidate sites in genes which were added, removed or changed since then are reanalysed, the results for the other probands are copied from the earlier output. Needs --previous-output and --previous-cache.")
+    parser.add_argument("--previous-output", dest="previous_output", help="Path to the output of the earlier run, for use with --previous-known-genes.")
+    parser.add_argument("--previous-cache", dest="previous_cache", help="Path to the candidate cache from the earlier run, for use with --previous-known-genes.")
+    parser.add_argument("--memory-profile", dest="memory_profile", help="Path to write JSON lines of the memory allocated by each analysis stage of each proband (traced with tracemalloc), with peak RSS, top allocation sites and live variant object counts.")
+    parser.add_argument("--site-cache", dest="site_cache", type=int, default=50000, help="Number of recent SNV sites to keep the parsed annotations and filter results for, which are reused when the same site recurs in other VCFs of the run (defaults to 50000, use 0 to parse every line).")
+    parser.add_argument("--decompression-threads", dest="decompression_threads", type=int, default=1, help="Number of threads for decompressing the blocks of BGZF (bgzipped) VCFs in parallel (defaults to 1, which decompresses serially). Other gzipped VCFs are always decompressed serially. Lower this when running several processes on a node, eg with the local scheduler.")
+    parser.add_argument("--de-novo-recurrence", dest="de_novo_recurrence", help="Path to write a table of the de novo variants per gene across the cohort (with the per-site table at PATH.sites), counting the de novos which pass the de novo checks in each trio. Each proband's de novos are also written to PATH.counts, which can be merged across shards with merge-results.")
+    parser.add_argument("--cnv-clusters", dest="cnv_clusters", help="Path to write a table of the clusters of overlapping, similar-sized CNVs across the cohort, with the number of probands carrying each cluster. Each proband's CNVs which pass the filters are also written to PATH.counts, which can be merged across shards with merge-results.")
     
     # New argument added by PJ to allow DNM_PP filtering to be disabled.
     parser.add_argument("--pp-dnm-threshold", dest="pp_filter", type=float, default=0.9, help="Set PP_DNM threshold for filtering (defaults to >=0.9)")
@@ -45,6 +89,52 @@ def get_options():
     if args.child is not None and args.alternate_ids is not None:
         argparse.ArgumentParser.error("You can't specify alternate IDs when using --child")
 
+    if args.prefetch is not None and args.region_workers is not None:
+        parser.error("--prefetch can't be used with --region-workers")
+    
+    if args.worker is not None and (args.ped is None or args.output is None):
+        parser.error("--worker needs both --ped and --output")
+    
+    if args.resume and args.output is None:
+        parser.error("--resume needs --output")
+    
+    if args.resume and args.worker is not None:
+        parser.error("--resume can't be used with --worker, which already skips finished families")
+    
+    previous = [args.previous_genes, args.previous_output, args.previous_cache]
+    if any(x is not None for x in previous):
+        if any(x is None for x in previous):
+            parser.error("--previous-known-genes, --previous-output and --previous-cache are needed together")
+        if args.genes is None or args.output is None:
+            parser.error("--previous-known-genes needs --known-genes and --output")
+        if args.export_vcf is not None:
+            parser.error("--previous-known-genes can't be used with --export-vcf")
+    
+    if args.candidate_cache is not None and (args.genes is None or args.output is None):
+        parser.error("--candidate-cache needs --known-genes and --output")
+    
+    for option in [args.previous_cache, args.candidate_cache]:
+        if option is not None and (args.region_workers is not None or args.worker is not None):
+            parser.error("--candidate-cache and --previous-cache can't be used with --region-workers or --worker")
+    
+    if args.worker is not None and args.prefetch is not None:
+        parser.error("--prefetch can't be used with --worker")
+    
+    for option in [args.de_novo_recurrence, args.cnv_clusters]:
+        if option is not None and args.previous_cache is not None:
+            parser.error("--de-novo-recurrence and --cnv-clusters can't be used with --previous-known-genes, which skips reanalysing probands")
+    
+    if (args.debug_chrom is None) != (args.debug_pos is None):
+        parser.error("--debug-chrom and --debug-pos are needed together")
+    
+    if args.trace_output is not None and args.trace_positions is None and args.debug_chrom is None:
+        parser.error("--trace-output needs --trace-positions or --debug-chrom and --debug-pos")
+    
+    if args.site_cache < 0:
+        parser.error("--site-cache can't be negative")
+    if args.decompression_threads < 1:
+        parser.error("--decompression-threads must be at least 1")
+    
     if args.pp_filter < 0.0 or args.pp_filter > 1:
         argparse.ArgumentParser.error("--pp-dnm-threshold must be between 0 and 1")
     
@@ -63,10 +153,33 @@ class LoadOptions(object):
         
         self.output_path = self.options.output
         self.export_vcf = self.options.export_vcf
-        self.debug_chrom = self.options.debug_chrom
-        self.debug_pos = self.options.debug_pos
-        if self.debug_pos is not None:
-            self.debug_pos = int(self.debug_pos)
+        self.timings_path = self.options.timings
+        self.memory_profile_path = self.options.memory_profile
+        self.region_workers = self.options.region_workers
+        self.prefetch = self.options.prefetch
+        self.load_threads = self.options.load_threads
+        self.prefetch_memory = self.options.prefetch_memory
+        self.worker_queue = self.options.worker
+        self.resume = self.options.resume
+        self.candidate_cache_path = self.options.candidate_cache
+        self.previous_cache = self.options.previous_cache
+        self.lease = self.options.lease
+        self.max_attempts = self.options.max_attempts
+        self.site_cache_size = self.options.site_cache
+        self.decompression_threads = self.options.decompression_threads
+        self.de_novo_recurrence = self.options.de_novo_recurrence
+        self.cnv_clusters = self.options.cnv_clusters
+        
+        # the debug position is traced along with any other traced positions
+        self.tracer = None
+        positions = set()
+        if self.options.trace_positions is not None:
+            positions |= open_trace_positions(self.options.trace_positions)
+        if self.options.debug_chrom is not None:
+            positions.add((self.options.debug_chrom, self.options.debug_pos))
+        if self.options.trace_positions is not None or \
+                self.options.debug_chrom is not None:
+            self.tracer = Tracer(positions, self.options.trace_output)
         
         # Attempt to recover a date for the dictionary of genes
         self.known_genes_date = self.options.genes_date
@@ -3,25 +3,38 @@
 
 import os
 import io
+import re
 import sys
 import gzip
 import logging
 import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
 
 from clinicalfilter.variant.snv import SNV
 from clinicalfilter.variant.cnv import CNV
 from clinicalfilter.trio_genotypes import TrioGenotypes
 from clinicalfilter.match_cnvs import MatchCNVs
+from clinicalfilter.profiling import Profiler
+from clinicalfilter.incremental import get_site
+from clinicalfilter.vcf_reader import MappedVCF, GzipVCF
 
 IS_PYTHON2 = sys.version_info[0] == 2
 IS_PYTHON3 = sys.version_info[0] == 3
 
+# matches VCF lines where one of the CQ (consequence) values is a
+# loss-of-function or missense consequence, which SNVs need to pass the filters
+FUNCTIONAL_CONSEQUENCES = sorted(SNV.lof_consequences | SNV.missense_consequences)
+FUNCTIONAL_PATTERN = re.compile(b"CQ=(?:[^;\t]*,)?(?:" + \
+    b"|".join([x.encode("ascii") for x in FUNCTIONAL_CONSEQUENCES]) + \
+    b")(?:[,;\t\r\n]|$)")
+
 
 class LoadVCFs(object):
     """ load VCF files for a trio
     """
     
-    def __init__(self, total_trios, known_genes, excluded_genes, debug_chrom, debug_pos):
+    def __init__(self, total_trios, known_genes, excluded_genes, tracer=None, profiler=None, threads=1, record_sites=False, site_cache=None, decompression_threads=1):
         """ intitalise the class with the filters and tags details etc
         
         Args:
@@ -30,6 +43,23 @@ class LoadVCFs(object):
             known_genes: dictionary of genes known to be involved with genetic
                 disorders.
             tags_dict: dictionary of alternate tags for INFO fields
+            tracer: Tracer object for the positions to trace the filtering of,
+                or None
+            profiler: Profiler object to record the loading stages, or None
+            threads: number of threads for loading a trio. With more than one
+                thread, the parents' VCFs are scanned concurrently, and the
+                VCF checksums for the provenance are found while the VCFs are
+                being parsed.
+            record_sites: whether to record the sites of the child's variants
+                which could be candidates under any known genes list, for
+                incremental reanalysis when the known genes change.
+            site_cache: SiteCache object, to reuse the parsed annotations of
+                SNV sites seen in earlier VCF lines (which can be shared with
+                other loaders), or None. This isn't used when tracing
+                variants, so the filtering of every line can be traced.
+            decompression_threads: number of threads for decompressing the
+                blocks of BGZF VCFs. With one thread, gzipped VCFs are
+                decompressed serially.
         """
         
         self.family = None
@@ -37,20 +67,45 @@ class LoadVCFs(object):
         self.total_trios = total_trios
         self.known_genes = known_genes
         
-        # define several parameters of the variant classes, before we have
-        # initialised any class objects
-        SNV.debug_chrom = debug_chrom
-        SNV.debug_pos = debug_pos
-        CNV.debug_chrom = debug_chrom
-        CNV.debug_pos = debug_pos
-        
-        SNV.known_genes = known_genes
-        SNV.excluded_genes = excluded_genes
-        CNV.known_genes = known_genes
-        CNV.excluded_genes = excluded_genes
-        
-        if debug_chrom is not None:
-            SNV.passes_filters = SNV.passes_filters_with_debug
+        if profiler is None:
+            profiler = Profiler()
+        self.profiler = profiler
+        
+        # count the lines and bytes read from VCFs, so we can report these per
+        # analysis stage. The bytes are counted as they are consumed, from the
+        # VCF lines scanned (uncompressed, for gzipped VCFs), and the file
+        # bytes hashed for the provenance checksums.
+        self.lines_scanned = 0
+        self.bytes_read = 0
+        self.counts_lock = threading.Lock()
+        
+        self.pool = None
+        if threads > 1:
+            self.pool = ThreadPool(threads)
+        
+        self.decompression_threads = decompression_threads
+        self.decompression_pool = None
+        if decompression_threads > 1:
+            self.decompression_pool = ThreadPool(decompression_threads)
+        self.provenance = None
+        
+        self.record_sites = record_sites
+        self.sites = None
+        
+        self.tracer = tracer
+        self.site_cache = site_cache
+        if tracer is not None:
+            self.site_cache = None
+        
+        # the child's lines are checked for functional consequences before
+        # being decoded, except when tracing, so that the filtering of the
+        # traced variants can be recorded
+        self.check_consequences = tracer is None
+        
+        # each variant is given the known genes and tracer when constructed
+        # (see configure_variant), rather than setting them on the variant
+        # classes, so loaders with different settings can run in one process
+        self.excluded_genes = excluded_genes
     
     def get_trio_variants(self, family, pp_filter):
         """ loads the variants for a trio
@@ -66,10 +121,41 @@ class LoadVCFs(object):
         self.family = family
         self.counter += 1
         
+        if self.tracer is not None:
+            self.tracer.set_proband(family.child.get_id())
+        
+        self.sites = None
+        if self.record_sites:
+            self.sites = []
+        
+        # start finding the VCF checksums, which only needs the file bytes, so
+        # can run while we parse the VCFs
+        self.provenance = None
+        if self.pool is not None:
+            self.provenance = [self.pool.apply_async(self.get_vcf_provenance, (path, ))
+                for path in self.get_trio_paths()]
+        
         try:
-            (child_vars, mother_vars, father_vars) = self.load_trio()
-            variants = self.combine_trio_variants(child_vars, mother_vars, father_vars)
-            variants = self.filter_de_novos(variants, pp_filter)
+            with self.profiler.stage("load_trio") as stage:
+                lines_scanned = self.lines_scanned
+                bytes_read = self.bytes_read
+                cache_stats = self.get_site_cache_stats()
+                (child_vars, mother_vars, father_vars) = self.load_trio()
+                stage.update(lines_scanned=self.lines_scanned - lines_scanned,
+                    bytes_read=self.bytes_read - bytes_read,
+                    variants=len(child_vars) + len(mother_vars) + len(father_vars))
+                if self.site_cache is not None:
+                    current = self.get_site_cache_stats()
+                    stage.update(site_cache_hits=current["hits"] - cache_stats["hits"],
+                        site_cache_misses=current["misses"] - cache_stats["misses"])
+            
+            with self.profiler.stage("combine_trio_variants") as stage:
+                variants = self.combine_trio_variants(child_vars, mother_vars, father_vars)
+                stage.update(variants=len(variants))
+            
+            with self.profiler.stage("filter_de_novos") as stage:
+                variants = self.filter_de_novos(variants, pp_filter)
+                stage.update(variants=len(variants))
         except OSError as error:
             if self.family.has_parents():
                 mother_id = self.family.mother.get_id()
@@ -85,6 +171,15 @@ class LoadVCFs(object):
         
         return variants
     
+    def get_site_cache_stats(self):
+        """ get the hit and miss counts for the site cache, if we have one
+        """
+        
+        if self.site_cache is None:
+            return None
+        
+        return self.site_cache.get_stats()
+    
     def open_vcf_file(self, path):
         """ Gets a file object for an individual's VCF file.
         
@@ -136,33 +231,6 @@ class LoadVCFs(object):
         
         return header
     
-    def exclude_header(self, f):
-        """ removes the header from a VCF file object
-        
-        We remove the header from the VCF file, since the header is ~200 lines
-        long, and an exome VCF file is 100,000 lines long, so it's better to
-        remove the header once, rather than continually check if lines are part
-        of the header as we traverse the VCF. We simply run through the VCF
-        until we find a non-header line, then seek back to the start of that
-        line.
-        
-        Args:
-            f: handler for a VCF file
-        """
-        
-        file_pos = f.tell()
-        in_header = True
-        while in_header:
-            line = f.readline()
-            if not line.startswith("#"):
-                in_header = False
-                break
-            file_pos = f.tell()
-        
-        # jump back to the start of the last line, which should be the first
-        # line following the header
-        f.seek(file_pos)
-    
     def add_single_variant(self, variants, var, gender, line):
         """ adds a single variant to a vcf dictionary indexed by position key
         
@@ -175,19 +243,43 @@ class LoadVCFs(object):
         
         # Complete the variant setup, now that the variant has passed the
         # filtering. If we do this earlier, it slows all the unneeded variants.
-        var.set_gene_from_known_gene_overlap()
+        if self.site_cache is not None and not var.is_cnv():
+            self.site_cache.set_gene_from_known_gene_overlap(var, line)
+        else:
+            var.set_gene_from_known_gene_overlap()
         var.add_format(line[8], line[9])
         var.add_vcf_line(line)
         var.set_gender(gender)
         
         try:
             var.set_genotype()
+            var.finalise_info()
             variants.append(var)
         except ValueError:
             # we only get ValueError when the genotype cannot be set, which
             # occurs for x chrom male heterozygotes (an impossible genotype)
             pass
     
+    def configure_variant(self, var):
+        """ give a variant the known genes, excluded genes and tracer
+        
+        These are set on each variant, rather than on the SNV and CNV classes,
+        so loaders with different known genes (eg analysing trios in separate
+        threads) don't affect each other's variants.
+        
+        Args:
+            var: SNV or CNV object
+        """
+        
+        var.known_genes = self.known_genes
+        var.excluded_genes = self.excluded_genes
+        var.tracer = self.tracer
+        
+        # only check for traced positions when tracing, so the filtering of
+        # every other variant is unchanged
+        if self.tracer is not None and not var.is_cnv():
+            var.passes_filters = var.passes_filters_with_trace
+    
     def construct_variant(self, line, gender):
         """ constructs a Variant object for a VCF line, specific to the variant type
         
@@ -205,6 +297,7 @@ class LoadVCFs(object):
         # CNVs are found by their alt_allele values, as either <DUP>, or <DEL>
         if line[4] == "<DUP>" or line[4] == "<DEL>":
             var = CNV(line[0], line[1], line[2], line[3], line[4], line[6])
+            self.configure_variant(var)
             var.add_info(line[7])
             # CNVs require the format values for filtering
             var.set_gender(gender)
@@ -213,7 +306,11 @@ class LoadVCFs(object):
                 var.fix_gene_IDs()
         else:
             var = SNV(line[0], line[1], line[2], line[3], line[4], line[6])
-            var.add_info(line[7])
+            self.configure_variant(var)
+            if self.site_cache is not None:
+                self.site_cache.add_info(var, line)
+            else:
+                var.add_info(line[7])
         
         return var
     
@@ -242,7 +339,13 @@ class LoadVCFs(object):
                     use_variant = True
         else:
             var = self.construct_variant(line, gender)
-            if var.passes_filters():
+            if self.sites is not None:
+                site = get_site(var)
+                if site is not None:
+                    self.sites.append(site)
+            if self.site_cache is not None and not var.is_cnv():
+                use_variant = self.site_cache.passes_filters(var, line)
+            elif var.passes_filters():
                 use_variant = True
             
         return use_variant
@@ -267,13 +370,22 @@ class LoadVCFs(object):
         path = individual.get_path()
         gender = individual.get_gender()
         
-        # open the vcf, and adjust the position in the file to immediately after
-        # the header, so we can run through the variants
-        vcf = self.open_vcf_file(path)
-        self.exclude_header(vcf)
-        
         variants = []
-        for line in vcf:
+        lines_scanned = 0
+        bytes_read = 0
+        for line in self.iterate_vcf_lines(path, child_variants):
+            lines_scanned += 1
+            # most lines can be rejected from a few fields, so check the lines
+            # from the VCF readers before decoding them (the region indexes
+            # give lines as text, which are all decoded)
+            if isinstance(line, bytes):
+                # the readers drop the newline when splitting the lines
+                bytes_read += len(line) + 1
+                if not self.could_include(line, child_variants):
+                    continue
+                line = line.decode("latin_1")
+            else:
+                bytes_read += len(line)
             line = line.strip().split("\t")
             
             # check if we want to include the variant or not
@@ -281,8 +393,106 @@ class LoadVCFs(object):
                 var = self.construct_variant(line, gender)
                 self.add_single_variant(variants, var, gender, line)
         
+        # the parents can be loaded in separate threads, so lock the counts
+        with self.counts_lock:
+            self.lines_scanned += lines_scanned
+            self.bytes_read += bytes_read
+        
         return variants
     
+    def could_include(self, line, child_variants):
+        """ check if a VCF line could be included, before decoding the line
+        
+        Args:
+            line: VCF line, as bytes
+            child_variants: True/False for whether the line is from a parent's
+                VCF, after the child's variants have been loaded.
+        
+        Returns:
+            False if the line can't pass include_variant(), otherwise True.
+        """
+        
+        if child_variants:
+            return self.is_at_child_site(line)
+        
+        if not self.check_consequences:
+            return True
+        
+        return self.has_functional_consequence(line)
+    
+    def has_functional_consequence(self, line):
+        """ check if a VCF line is a CNV, or has a functional consequence
+        
+        SNVs fail the filters unless their consequence is loss-of-function or
+        missense, so SNV lines without any such value in the CQ field can be
+        skipped. CNVs are filtered differently, so we keep all CNV lines.
+        
+        Args:
+            line: VCF line, as bytes
+        
+        Returns:
+            True/False for whether the line could pass the filters.
+        """
+        
+        if b"\t<DEL>\t" in line or b"\t<DUP>\t" in line:
+            return True
+        
+        return FUNCTIONAL_PATTERN.search(line) is not None
+    
+    def is_at_child_site(self, line):
+        """ check if a parent's VCF line could match one of the child's variants
+        
+        This only looks at the chromosome and position of the line, and
+        whether the line is for a CNV (which can overlap the child's CNVs
+        without sharing the start site), so we can skip most of the parents'
+        lines without decoding or splitting them. Lines which pass still go
+        through include_variant().
+        
+        Args:
+            line: VCF line, as bytes
+        
+        Returns:
+            True/False for whether the line could match a child's variant.
+        """
+        
+        fields = line.split(b"\t", 2)
+        if (fields[0].decode("latin_1"), int(fields[1])) in self.child_keys:
+            return True
+        
+        return b"\t<DEL>\t" in line or b"\t<DUP>\t" in line
+    
+    def iterate_vcf_lines(self, path, child_variants=False):
+        """ iterates through the variant lines of a VCF file
+        
+        Args:
+            path: path to VCF file
+            child_variants: True/False for whether we are loading a parent,
+                (unused here, but allows subclasses to load the proband and
+                parents differently).
+        
+        Returns:
+            iterator of VCF lines as bytes, excluding the header.
+        """
+        
+        if not os.path.exists(path):
+            raise OSError("VCF file not found at: " + path)
+        
+        # both readers give the lines as bytes, starting from the end of the
+        # header
+        extension = os.path.splitext(path)[1]
+        if extension in [".vcf", ".txt"]:
+            vcf = MappedVCF(path)
+        elif extension == ".gz":
+            vcf = GzipVCF(path, pool=self.decompression_pool,
+                threads=self.decompression_threads)
+        else:
+            raise OSError("unsupported filetype: " + path)
+        
+        for line in vcf:
+            yield line
+        
+        vcf.close()
+    
     def load_trio(self):
         """ opens and parses the VCF files for members of the family trio.
         
@@ -309,10 +519,20 @@ class LoadVCFs(object):
         father_vars = []
         if self.family.has_parents():
             logging.info(" mothers path: " + self.family.mother.get_path())
-            mother_vars = self.open_individual(self.family.mother, child_variants=True)
-            
             logging.info(" fathers path: " + self.family.father.get_path())
-            father_vars = self.open_individual(self.family.father, child_variants=True)
+            
+            # the parents only depend on the child's variants, not on each
+            # other, so we can scan their VCFs at the same time
+            if self.pool is not None:
+                mother = self.pool.apply_async(self.open_individual,
+                    (self.family.mother, True))
+                father = self.pool.apply_async(self.open_individual,
+                    (self.family.father, True))
+                mother_vars = mother.get()
+                father_vars = father.get()
+            else:
+                mother_vars = self.open_individual(self.family.mother, child_variants=True)
+                father_vars = self.open_individual(self.family.father, child_variants=True)
         
         return (child_vars, mother_vars, father_vars)
     
@@ -333,7 +553,7 @@ class LoadVCFs(object):
         
         variants = []
         for var in child_vars:
-            trio = TrioGenotypes(var, SNV.debug_chrom, SNV.debug_pos)
+            trio = TrioGenotypes(var)
             
             # if we only have the child, then just add the variant to the list
             if self.family.has_parents() == False:
@@ -382,6 +602,7 @@ class LoadVCFs(object):
         else:
             parental = SNV(var.chrom, var.position, var.variant_id, var.ref_allele, var.alt_allele, var.filter)
         
+        self.configure_variant(parental)
         parental.set_gender(gender)
         parental.set_default_genotype()
         
@@ -401,13 +622,19 @@ class LoadVCFs(object):
         # get the SHA1 hash of the VCF file (in a memory efficient manner)
         BLOCKSIZE=65536
         vcf_checksum = hashlib.sha1()
+        bytes_read = 0
         with open(path, "rb") as handle:
             buf = handle.read(BLOCKSIZE)
             while len(buf) > 0:
                 vcf_checksum.update(buf)
+                bytes_read += len(buf)
                 buf = handle.read(BLOCKSIZE)
         vcf_checksum = vcf_checksum.hexdigest()
         
+        # the checksums can be found in a separate thread, so lock the counts
+        with self.counts_lock:
+            self.bytes_read += bytes_read
+        
         vcf_basename = os.path.basename(path)
         
         header = self.get_vcf_header(path)
@@ -425,17 +652,40 @@ class LoadVCFs(object):
         
         return (vcf_checksum, vcf_basename, vcf_date)
     
+    def get_trio_paths(self):
+        """ get the VCF paths for the members of a trio
+        
+        Returns:
+            list of VCF paths for the child, and the mother and father (if
+            the trio includes parents).
+        """
+        
+        paths = [self.family.child.get_path()]
+        if self.family.has_parents():
+            paths += [self.family.mother.get_path(), self.family.father.get_path()]
+        
+        return paths
+    
     def get_trio_provenance(self):
         """ returns provenance of VCFs for individuals in a trio
         """
         
-        child_defs = self.get_vcf_provenance(self.family.child.get_path())
+        paths = self.get_trio_paths()
+        
+        # use the provenance started while loading the trio, if available
+        if self.provenance is not None:
+            provenance = [result.get() for result in self.provenance]
+            self.provenance = None
+        else:
+            provenance = [self.get_vcf_provenance(path) for path in paths]
+        
+        child_defs = provenance[0]
         
         mother_defs = ("NA", "NA", "NA")
         father_defs = ("NA", "NA", "NA")
         if self.family.has_parents():
-            mother_defs = self.get_vcf_provenance(self.family.mother.get_path())
-            father_defs = self.get_vcf_provenance(self.family.father.get_path())
+            mother_defs = provenance[1]
+            father_defs = provenance[2]
         
         return child_defs, mother_defs, father_defs
     
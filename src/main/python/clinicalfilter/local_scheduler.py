@@ -0,0 +1,351 @@
+""" run the clinical filtering for a cohort across the cores of a single node
+
+The families in a PED file vary a lot in how long they take to analyse, so
+splitting a cohort into equal-sized shards leaves some shards running long
+after the others have finished. Instead we run each family as a separate job,
+estimate each family's cost from the size of its VCFs, and start the largest
+families first. Idle workers take the next family from a shared queue, so no
+worker sits idle while families remain. Failed families are retried, and once
+every family is done the outputs are merged in family order, which matches the
+output from analysing the whole PED file in a single run.
+
+Usage:
+
+python clinical_filter.py schedule \\
+    --ped cohort.ped \\
+    --output clinical_reporting.txt \\
+    --workers 64 \\
+    --known-genes known_genes.txt \\
+    --syndrome-regions regions.txt
+
+Any options besides the scheduler's own options are passed on to each job.
+Each job loads its trios in a single thread (--load-threads 1), since the
+workers already fill the cores, unless the options set --load-threads.
+With --de-novo-recurrence or --cnv-clusters, each job collects the values for
+its family, and these are merged into a single summary for the cohort.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from clinicalfilter.load_options import get_summary_paths
+from clinicalfilter.cohort_summary import merge_summaries
+
+def get_options(arguments):
+    """ get the options for the scheduler, and the options to pass to each job
+
+    Args:
+        arguments: list of command line arguments, following "schedule"
+
+    Returns:
+        tuple of the scheduler options, and a list of extra arguments
+    """
+
+    parser = argparse.ArgumentParser(prog="clinical_filter.py schedule",
+        description="Analyse the families in a PED file in parallel on a \
+        single node, starting with the families with the largest VCFs.")
+    parser.add_argument("--ped", dest="ped", required=True, help="Path to ped file containing cohort details for multiple trios.")
+    parser.add_argument("-o", "--output", dest="output", required=True, help="Path for the merged analysis output in tabular format.")
+    parser.add_argument("--workers", dest="workers", type=int, default=os.cpu_count(), help="Number of families to analyse at once (defaults to the number of CPUs).")
+    parser.add_argument("--retries", dest="retries", type=int, default=2, help="Number of times to retry a family that fails (defaults to 2).")
+    parser.add_argument("--de-novo-recurrence", dest="de_novo_recurrence", help="Path for a table of the de novo variants per gene across the cohort, merged from the counts for each family.")
+    parser.add_argument("--cnv-clusters", dest="cnv_clusters", help="Path for a table of the clusters of similar CNVs across the cohort, merged from the CNVs for each family.")
+    parser.add_argument("--temp-dir", dest="temp_dir", help="Directory for the per-family PED files and outputs (defaults to the output directory). These are removed once every family has succeeded.")
+
+    args, extra = parser.parse_known_args(arguments)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    return args, extra
+
+def split_ped_by_family(ped_path):
+    """ group the lines of a PED file by family
+
+    Args:
+        ped_path: path to PED file
+
+    Returns:
+        dictionary of PED lines, indexed by family ID
+    """
+
+    families = {}
+    with open(ped_path, "r") as handle:
+        for line in handle:
+            if line.strip() == "":
+                continue
+            family_id = line.split()[0]
+            if family_id not in families:
+                families[family_id] = []
+            families[family_id].append(line)
+
+    return families
+
+def get_family_cost(lines):
+    """ estimate the cost of analysing a family from the size of its VCFs
+
+    Args:
+        lines: list of PED lines for the family
+
+    Returns:
+        total size of the family's VCFs in bytes
+    """
+
+    cost = 0
+    for line in lines:
+        path = line.split()[6]
+        if os.path.exists(path):
+            cost += os.path.getsize(path)
+
+    return cost
+
+
+def has_option(arguments, flag):
+    """ check if a list of command line arguments sets an option
+
+    Args:
+        arguments: list of command line arguments
+        flag: option to look for, eg "--load-threads"
+
+    Returns:
+        True/False for whether the option is given, as "--flag value" or
+        "--flag=value".
+    """
+
+    return any(x == flag or x.startswith(flag + "=") for x in arguments)
+
+
+class FamilyJob(object):
+    """ a single family to analyse
+    """
+
+    def __init__(self, family_id, ped_path, output_path, cost):
+        """ initialise the job
+
+        Args:
+            family_id: ID of the family
+            ped_path: path to a PED file for just this family
+            output_path: path for the family's output
+            cost: estimated cost of the family (the size of its VCFs)
+        """
+
+        self.family_id = family_id
+        self.ped_path = ped_path
+        self.output_path = output_path
+        self.cost = cost
+        self.attempts = 0
+        self.succeeded = False
+
+
+class LocalScheduler(object):
+    """ runs a job per family on a pool of local workers
+    """
+
+    def __init__(self, script, ped_path, output_path, workers, retries, temp_dir=None, extra_args=None, summary_paths=None):
+        """ initialise the scheduler
+
+        Args:
+            script: path to clinical_filter.py, which we run for each family
+            ped_path: path to PED file for the cohort
+            output_path: path for the merged output
+            workers: number of families to analyse at once
+            retries: number of times to retry failed families
+            temp_dir: directory for the per-family files, or None to use the
+                output directory
+            extra_args: list of extra arguments for each job
+            summary_paths: list of (summary class, path) tuples for the
+                summaries across the cohort, from get_summary_paths()
+        """
+
+        self.script = script
+        self.ped_path = ped_path
+        self.output_path = output_path
+        self.workers = workers
+        self.retries = retries
+        self.extra_args = extra_args
+        if self.extra_args is None:
+            self.extra_args = []
+        self.summary_paths = summary_paths
+        if self.summary_paths is None:
+            self.summary_paths = []
+
+        if temp_dir is None:
+            temp_dir = os.path.dirname(os.path.abspath(output_path))
+        self.temp_dir = tempfile.mkdtemp(prefix="clinical_filter.", dir=temp_dir)
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.jobs = []
+
+    def create_jobs(self):
+        """ write a PED file for each family, and queue the families by cost
+        """
+
+        families = split_ped_by_family(self.ped_path)
+        for family_id in sorted(families):
+            lines = families[family_id]
+            ped_path = os.path.join(self.temp_dir, family_id + ".ped")
+            with open(ped_path, "w") as handle:
+                handle.writelines(lines)
+
+            output_path = os.path.join(self.temp_dir, family_id + ".output.txt")
+            self.jobs.append(FamilyJob(family_id, ped_path, output_path,
+                get_family_cost(lines)))
+
+        # start the largest families first, so they don't finish last
+        self.pending = sorted(self.jobs, key=lambda job: (-job.cost, job.family_id))
+
+    def get_command(self, job):
+        """ get the command to analyse a single family
+        """
+
+        command = [sys.executable, self.script, "--ped", job.ped_path,
+            "--output", job.output_path]
+        for summary_type, path in self.summary_paths:
+            command += [summary_type.flag, job.output_path + "." + summary_type.entry_key]
+
+        # the workers already use every core, so extra threads per job would
+        # oversubscribe the node
+        if not has_option(self.extra_args, "--load-threads"):
+            command += ["--load-threads", "1"]
+
+        return command + self.extra_args
+
+    def run_job(self, job):
+        """ analyse a single family
+
+        Returns:
+            True/False for whether the job succeeded
+        """
+
+        job.attempts += 1
+        logging.info("starting family " + job.family_id + " (attempt " + \
+            str(job.attempts) + ")")
+
+        return subprocess.call(self.get_command(job)) == 0
+
+    def work(self):
+        """ take families from the queue until none remain
+        """
+
+        while True:
+            with self.lock:
+                if len(self.pending) == 0:
+                    return
+                job = self.pending.pop(0)
+
+            if self.run_job(job):
+                job.succeeded = True
+                continue
+
+            logging.warning("family " + job.family_id + " failed on attempt " + \
+                str(job.attempts))
+
+            # retry the family once the other queued families have started
+            if job.attempts <= self.retries:
+                with self.lock:
+                    self.pending.append(job)
+
+    def run(self):
+        """ analyse every family, then merge the outputs
+
+        Returns:
+            list of IDs for families that failed after every retry
+        """
+
+        self.create_jobs()
+
+        threads = []
+        for _ in range(min(self.workers, len(self.pending))):
+            thread = threading.Thread(target=self.work)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        failed = [job.family_id for job in self.jobs if not job.succeeded]
+
+        self.merge_outputs()
+        self.merge_logs()
+
+        # keep the temporary files if anything failed, to help debugging
+        if len(failed) == 0:
+            shutil.rmtree(self.temp_dir)
+
+        return failed
+
+    def merge_outputs(self):
+        """ merge the outputs of the successful families, in family order
+        """
+
+        paths = [job.output_path for job in self.jobs if job.succeeded]
+        merge_family_outputs(paths, self.output_path)
+
+        for summary_type, path in self.summary_paths:
+            suffix = "." + summary_type.entry_key + ".counts"
+            merge_summaries(summary_type, [x + suffix for x in paths], path)
+
+    def merge_logs(self):
+        """ add the family log files to the log for the cohort
+        """
+
+        with open(self.ped_path + ".log", "a") as output:
+            for job in self.jobs:
+                path = job.ped_path + ".log"
+                if os.path.exists(path):
+                    with open(path, "r") as handle:
+                        shutil.copyfileobj(handle, output)
+
+def merge_family_outputs(paths, output_path):
+    """ merge the outputs for separate families, keeping a single header
+
+    Args:
+        paths: list of paths to family outputs, in the order to merge them.
+            Missing paths are skipped.
+        output_path: path for the merged output
+    """
+
+    # copy each output in turn, rather than holding every family's lines
+    has_header = False
+    with open(output_path, "w") as output:
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+
+            with open(path, "r") as handle:
+                header = handle.readline()
+                if header == "":
+                    continue
+                if not has_header:
+                    output.write(header)
+                    has_header = True
+                shutil.copyfileobj(handle, output)
+
+def main(arguments, script):
+    """ run the local scheduler from the command line
+
+    Args:
+        arguments: list of command line arguments, following "schedule"
+        script: path to clinical_filter.py
+    """
+
+    options, extra = get_options(arguments)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    scheduler = LocalScheduler(script, options.ped, options.output,
+        options.workers, options.retries, options.temp_dir, extra,
+        get_summary_paths(options))
+    failed = scheduler.run()
+
+    if len(failed) > 0:
+        sys.exit("families failed after " + str(options.retries + 1) + \
+            " attempts: " + ", ".join(failed) + ". Their files are in " + \
+            scheduler.temp_dir)
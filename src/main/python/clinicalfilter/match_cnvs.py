@@ -3,6 +3,23 @@
 
 import math
 
+from clinicalfilter.interval_index import IntervalIndex
+
+def get_size_tolerance(size):
+    """ calculates the size range of CNVs that might match a given CNV size.
+    
+    Args:
+        size: size of a CNV in base pairs
+    
+    Returns:
+        tuple of minimum and maximum sizes in base pairs
+    """
+    
+    min_size = size - abs(100 * math.sqrt(size + 2500)) + 5000
+    max_size = size + 100 * math.sqrt(size)
+    
+    return (min_size, max_size)
+
 class MatchCNVs(object):
     """ class to find if a CNV matches any of another individuals CNVs
     """
@@ -11,12 +28,15 @@ class MatchCNVs(object):
         """ initiate the class with a dict of variants
         """
         
-        # figure out which of the variants are CNVs
-        self.cnvs = []
+        # index the CNVs by chromosome, with integer coordinates, so we only
+        # check the CNVs which overlap the CNV being matched. The index is
+        # sorted now, since the parents can be matched in separate threads.
+        self.index = IntervalIndex()
         for var in variants:
             key = var.get_key()
             if len(key) == 3: # ignore SNVs, which are only (chrom, position)
-                self.cnvs.append(key)
+                self.index.add(key[0], key[1], key[2], key)
+        self.index.build()
         
     def has_match(self, var):
         """ checks if any of the individuals CNVs overlap the current CNV
@@ -28,28 +48,7 @@ class MatchCNVs(object):
             returns true if any of the individuals CNVs overlap
         """
         
-        var_key = var.get_key() # CNVs are (chrom, start, end)
-        var_chrom = var_key[0]
-        var_start = int(var_key[1])
-        var_end = int(var_key[2])
-        
-        self.overlap = {}
-        for key in self.cnvs:
-            
-            chrom = key[0]
-            start = key[1]
-            end = key[2]
-            
-            if var_chrom != chrom:
-                continue
-            
-            # check if the individuals CNVs end points lie within the CNV that
-            # we are examining, or if the individuals CNV surrounds the examined
-            # CNV
-            if var_start <= int(end) and var_end >= int(start) and self.similar_size(var, start, end):
-                self.overlap[var_key] = key
-        
-        return len(self.overlap) > 0
+        return self.get_overlap_key(var.get_key()) is not None
     
     def calculate_cnv_size_tolerance(self, var):
         """ calculates the size range of CNVs that might match a given CNV size.
@@ -64,12 +63,8 @@ class MatchCNVs(object):
         var_key = var.get_key()
         var_start = int(var_key[1])
         var_end = int(var_key[2])
-        size = var_end - var_start
-        
-        min_size = size - abs(100 * math.sqrt(size + 2500)) + 5000
-        max_size = size + 100 * math.sqrt(size)
         
-        return (min_size, max_size)
+        return get_size_tolerance(var_end - var_start)
     
     def similar_size(self, var, start, end):
         """ checks if the current CNV matches the overlapping child CNVs size
@@ -92,12 +87,29 @@ class MatchCNVs(object):
     
     def get_overlap_key(self, var_key):
         """ returns the tuple for an overlapping CNV
+        
+        The individual's CNVs match if they overlap the CNV (including CNVs
+        with end points within the CNV, or surrounding the CNV), and have a
+        similar size to the CNV.
+        
+        Args:
+            var_key: (chrom, start, end) tuple for a CNV
+        
+        Returns:
+            key for the matching CNV, or None if no CNVs match. If several
+            CNVs match, we use the last of them, in the order of the variants
+            the class was initiated with.
         """
         
-        if var_key in self.overlap:
-            return self.overlap[var_key]
-        else:
-            return None
-
-
-
+        var_chrom = var_key[0]
+        var_start = int(var_key[1])
+        var_end = int(var_key[2])
+        
+        (min_size, max_size) = get_size_tolerance(var_end - var_start)
+        
+        overlaps = self.index.find_overlaps(var_chrom, var_start, var_end)
+        for start, end, key in reversed(overlaps):
+            if max_size > end - start > min_size:
+                return key
+        
+        return None
@@ -0,0 +1,356 @@
+""" merge the tabular outputs from runs over separate shards of a cohort
+
+Each shard's output is a header line, then a block of lines for each proband
+with candidates, in position order, with a blank line after each block. The
+blocks are in the order the shard analysed its families, which isn't proband
+order (eg siblings follow the PED file, and P10 sorts before P9). We first
+index each shard, recording the proband and byte offset of each block, and
+sort the index. The shards are then merged one proband block at a time, reading
+each block from its offset, so we only hold a block from each shard in memory
+(plus the small indexes), however large the cohort. The merged output is in
+proband order, with each proband's candidates in position order.
+
+Usage:
+
+python clinical_filter.py merge-results \\
+    --output clinical_reporting.txt \\
+    --ped cohort.ped \\
+    shard.1.txt shard.2.txt ...
+
+The shards need to have the same header. We report probands found in more
+than one shard (keeping the first), and probands in the PED file without any
+results. Probands without candidates have no lines in the output, so a proband
+only counts as missing if there is a record of which probands finished, either
+from a manifest next to the shard (from runs with --resume), or from exported
+VCFs, which are written for every proband, including those without candidates.
+
+The counts from shards run with --de-novo-recurrence or --cnv-clusters (the
+PATH.counts files) can be merged into summaries for the whole cohort, with
+--de-novo-counts and --de-novo-recurrence, or --cnv-counts and --cnv-clusters.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+
+from clinicalfilter.ped import load_families
+from clinicalfilter.cohort_summary import merge_summaries
+from clinicalfilter.recurrence import DeNovoRecurrence
+from clinicalfilter.cnv_clusters import CNVClusters
+
+
+def get_options(arguments):
+    """ get the options for merging shard outputs
+
+    Args:
+        arguments: list of command line arguments, following "merge-results"
+
+    Returns:
+        argparse Namespace of options
+    """
+
+    parser = argparse.ArgumentParser(prog="clinical_filter.py merge-results",
+        description="Merge the tabular outputs from separate shards of a \
+        cohort into proband order, checking for missing and duplicate probands.")
+    parser.add_argument("shards", nargs="+", help="Paths to the tabular outputs for each shard.")
+    parser.add_argument("-o", "--output", dest="output", required=True, help="Path for the merged output.")
+    parser.add_argument("--ped", dest="ped", help="Path to the PED file for the whole cohort, to check for probands without results.")
+    parser.add_argument("--vcf-dirs", dest="vcf_dirs", nargs="+", help="Folders of per-proband VCFs exported by each shard (with --export-vcf).")
+    parser.add_argument("--vcf-output", dest="vcf_output", help="Folder to collect the per-proband VCFs into, in proband order.")
+    parser.add_argument("--de-novo-counts", dest="de_novo_counts", nargs="+", help="De novo counts files from each shard (the PATH.counts files from --de-novo-recurrence).")
+    parser.add_argument("--de-novo-recurrence", dest="de_novo_recurrence", help="Path for the table of de novo variants per gene across the cohort, merged from --de-novo-counts.")
+    parser.add_argument("--cnv-counts", dest="cnv_counts", nargs="+", help="CNV counts files from each shard (the PATH.counts files from --cnv-clusters).")
+    parser.add_argument("--cnv-clusters", dest="cnv_clusters", help="Path for the table of CNV clusters across the cohort, merged from --cnv-counts.")
+    parser.add_argument("--strict", dest="strict", default=False, action="store_true", help="Exit with an error if any probands are duplicated or missing.")
+
+    args = parser.parse_args(arguments)
+
+    if args.vcf_output is not None and args.vcf_dirs is None:
+        parser.error("--vcf-output needs --vcf-dirs")
+
+    if (args.de_novo_counts is None) != (args.de_novo_recurrence is None):
+        parser.error("--de-novo-counts and --de-novo-recurrence are needed together")
+
+    if (args.cnv_counts is None) != (args.cnv_clusters is None):
+        parser.error("--cnv-counts and --cnv-clusters are needed together")
+
+    return args
+
+def read_header(path):
+    """ read the header line from a shard output
+    """
+
+    with open(path, "r") as handle:
+        header = handle.readline()
+
+    if header == "":
+        raise ValueError("shard output lacks a header: " + path)
+
+    return header
+
+def check_headers(paths):
+    """ make sure every shard output has the same header
+
+    Returns:
+        the header line shared by the shards
+    """
+
+    header = read_header(paths[0])
+    for path in paths[1:]:
+        if read_header(path) != header:
+            raise ValueError("the header for " + path + " doesn't match the " \
+                "header for " + paths[0])
+
+    return header
+
+def index_blocks(path):
+    """ find the proband and byte offset of each block in a shard output
+
+    Args:
+        path: path to the shard output
+
+    Returns:
+        list of (proband ID, byte offset) tuples, sorted by proband ID, and
+        then by position in the shard.
+    """
+
+    blocks = []
+    with open(path, "rb") as handle:
+        offset = len(handle.readline())
+        start = None
+        for line in handle:
+            if line.strip() != b"":
+                if start is None:
+                    start = offset
+                    proband = line.split(b"\t")[0].decode("latin_1")
+            elif start is not None:
+                blocks.append((proband, start))
+                start = None
+            offset += len(line)
+
+    # allow for a final block without a trailing blank line
+    if start is not None:
+        blocks.append((proband, start))
+
+    return sorted(blocks)
+
+def read_block(handle, offset):
+    """ read the lines of a proband block
+
+    Args:
+        handle: binary file handle for a shard output
+        offset: byte offset of the start of the block
+
+    Returns:
+        list of lines (as bytes) in the block
+    """
+
+    handle.seek(offset)
+
+    lines = []
+    for line in iter(handle.readline, b""):
+        if line.strip() == b"":
+            break
+        lines.append(line)
+
+    # make sure the final line ends, if the file lacks a trailing newline
+    if not lines[-1].endswith(b"\n"):
+        lines[-1] += b"\n"
+
+    return lines
+
+def iterate_blocks(path, index):
+    """ iterate through the proband blocks in a shard output, in proband order
+
+    Args:
+        path: path to the shard output
+        index: position of the shard in the list of shards, which breaks ties
+            between probands in more than one shard in favour of earlier shards
+
+    Returns:
+        iterator of (proband ID, shard index, byte offset, list of lines)
+        tuples, sorted by proband ID.
+    """
+
+    blocks = index_blocks(path)
+    with open(path, "rb") as handle:
+        for proband, offset in blocks:
+            yield (proband, index, offset, read_block(handle, offset))
+
+def merge_shards(paths, output_path):
+    """ merge shard outputs into a single output, one proband block at a time
+
+    Args:
+        paths: list of paths to shard outputs
+        output_path: path for the merged output
+
+    Returns:
+        tuple of (list of probands in the merged output, dictionary of lists
+        of the shards for each proband found in more than one shard)
+    """
+
+    check_headers(paths)
+    with open(paths[0], "rb") as handle:
+        header = handle.readline()
+
+    blocks = [iterate_blocks(path, i) for i, path in enumerate(paths)]
+
+    probands = []
+    duplicates = {}
+    with open(output_path, "wb") as output:
+        output.write(header)
+        for proband, index, offset, lines in heapq.merge(*blocks):
+            if len(probands) > 0 and probands[-1] == proband:
+                if proband not in duplicates:
+                    duplicates[proband] = []
+                duplicates[proband].append(paths[index])
+                continue
+
+            probands.append(proband)
+            output.writelines(lines)
+            output.write(b"\n")
+
+    return probands, duplicates
+
+def get_finished_probands(paths):
+    """ get the probands recorded as finished in manifests next to the shards
+
+    Returns:
+        set of proband IDs, or None if any shard lacks a manifest
+    """
+
+    finished = set()
+    for path in paths:
+        manifest = path + ".manifest"
+        if not os.path.exists(manifest):
+            return None
+
+        with open(manifest, "r") as handle:
+            handle.readline()
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                finished.add(entry["proband"].split("\t")[1])
+
+    return finished
+
+def collect_vcfs(vcf_dirs, vcf_output):
+    """ collect the per-proband VCFs from each shard into one folder
+
+    Args:
+        vcf_dirs: list of folders with VCFs exported by each shard
+        vcf_output: folder to copy the VCFs into, or None to only check them
+
+    Returns:
+        tuple of (set of probands with VCFs, dictionary of lists of the
+        folders for each proband with VCFs in more than one folder)
+    """
+
+    suffix = ".vcf.gz"
+
+    found = {}
+    for folder in vcf_dirs:
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(suffix):
+                continue
+            proband = name[:-len(suffix)]
+            if proband not in found:
+                found[proband] = []
+            found[proband].append(folder)
+
+    duplicates = {}
+    for proband in sorted(found):
+        folders = found[proband]
+        if len(folders) > 1:
+            duplicates[proband] = folders[1:]
+
+        if vcf_output is not None:
+            shutil.copyfile(os.path.join(folders[0], proband + suffix),
+                os.path.join(vcf_output, proband + suffix))
+
+    return set(found), duplicates
+
+def get_expected_probands(ped_path):
+    """ get the affected probands in a PED file
+    """
+
+    probands = set()
+    families = load_families(ped_path)
+    for family_id in families:
+        for child in families[family_id].children:
+            if child.is_affected():
+                probands.add(child.get_id())
+
+    return probands
+
+def main(arguments):
+    """ merge shard outputs from the command line
+
+    Args:
+        arguments: list of command line arguments, following "merge-results"
+    """
+
+    options = get_options(arguments)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    probands, duplicates = merge_shards(options.shards, options.output)
+    logging.info("merged " + str(len(probands)) + " probands with candidates " \
+        "from " + str(len(options.shards)) + " shards")
+
+    finished = get_finished_probands(options.shards)
+
+    if options.vcf_dirs is not None:
+        if options.vcf_output is not None and not os.path.exists(options.vcf_output):
+            os.makedirs(options.vcf_output)
+        with_vcfs, vcf_duplicates = collect_vcfs(options.vcf_dirs, options.vcf_output)
+        for proband in vcf_duplicates:
+            if proband not in duplicates:
+                duplicates[proband] = []
+            duplicates[proband] += vcf_duplicates[proband]
+
+        if finished is None:
+            finished = set()
+        finished |= with_vcfs
+
+        lacking = sorted(set(probands) - with_vcfs)
+        if len(lacking) > 0:
+            logging.warning(str(len(lacking)) + " probands with candidates " \
+                "lack VCFs: " + ", ".join(lacking))
+
+    if options.de_novo_counts is not None:
+        merge_summaries(DeNovoRecurrence, options.de_novo_counts,
+            options.de_novo_recurrence)
+    if options.cnv_counts is not None:
+        merge_summaries(CNVClusters, options.cnv_counts, options.cnv_clusters)
+
+    for proband in sorted(duplicates):
+        logging.warning(proband + " is duplicated in: " + ", ".join(duplicates[proband]))
+
+    missing = []
+    if options.ped is not None:
+        expected = get_expected_probands(options.ped)
+        if finished is not None:
+            missing = sorted(expected - finished - set(probands))
+            if len(missing) > 0:
+                logging.warning(str(len(missing)) + " probands are missing: " + \
+                    ", ".join(missing))
+        else:
+            without = sorted(expected - set(probands))
+            logging.info(str(len(without)) + " probands have no results, " \
+                "either from lacking candidates, or from missing shards: " + \
+                ", ".join(without))
+
+        unexpected = sorted(set(probands) - expected)
+        if len(unexpected) > 0:
+            logging.warning(str(len(unexpected)) + " probands aren't in the " \
+                "PED file: " + ", ".join(unexpected))
+
+    if options.strict and (len(duplicates) > 0 or len(missing) > 0):
+        sys.exit("found duplicated or missing probands")
@@ -21,13 +21,16 @@ class PostInheritanceFilter(object):
     """ Apply some post inheritance filters to flagged variants
     """
     
-    def __init__(self, variants, debug_chrom=None, debug_pos=None):
+    def __init__(self, variants, tracer=None):
         """intialise the class with the some definitions
+        
+        Args:
+            variants: list of (variant, check, inheritance) tuples
+            tracer: Tracer object for the positions to trace, or None
         """
         
         self.variants = variants
-        self.debug_chrom = debug_chrom
-        self.debug_pos = debug_pos
+        self.tracer = tracer
     
     def filter_variants(self):
         """ loads trio variants, and screens for candidate variants
@@ -43,6 +46,11 @@ class PostInheritanceFilter(object):
         
         self.variants = self.filter_polyphen(self.variants)
         
+        if self.tracer is not None:
+            for (var, check, inh) in self.variants:
+                self.tracer.log_variant(var, "post_inheritance", "pass", None,
+                    {"check": check, "inheritance": inh})
+        
         return self.variants
     
     def count_cnv_chroms(self, variants):
@@ -80,8 +88,9 @@ class PostInheritanceFilter(object):
                 passed_vars.append((var, check, inh))
             else:
                 logging.debug(str(var) + " dropped from excess CNVs in proband")
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(str(var) + " dropped from excess CNVs in proband")
+                if self.tracer is not None:
+                    self.tracer.log_variant(var, "post_inheritance", "fail",
+                        "excess CNVs in proband")
         
         return  passed_vars
     
@@ -113,8 +122,9 @@ class PostInheritanceFilter(object):
                     passed_vars.append((var, check, inh))
                 else:
                     logging.debug(str(var) + " dropped from low MAF in non-biallelic variant")
-                    if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                        print(str(var) + " dropped from low MAF in non-biallelic variant")
+                    if self.tracer is not None:
+                        self.tracer.log_variant(var, "post_inheritance", "fail",
+                            "low MAF in non-biallelic variant", {"value": max_maf})
         
         return passed_vars
     
@@ -151,8 +161,9 @@ class PostInheritanceFilter(object):
                 passed_vars.append((var, check, inh))
             else:
                 logging.debug(str(var) + " dropped from polyphen prediction")
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(str(var) + " dropped from polyphen prediction")
+                if self.tracer is not None:
+                    self.tracer.log_variant(var, "post_inheritance", "fail",
+                        "polyphen prediction")
         
         return passed_vars
     
@@ -0,0 +1,220 @@
+""" load the VCFs for upcoming trios in a background thread
+
+Loading a trio is mostly spent waiting on reading and decompressing VCFs,
+whereas analysing a trio is spent in the inheritance checks. We load the next
+few trios in a background thread while the current trio is analysed, so the
+two overlap. The number of loaded trios waiting for analysis is capped by a
+count, and by an estimate of the memory held by their variants.
+"""
+
+import copy
+import sys
+import threading
+
+
+def get_probands(families):
+    """ get the families for each affected proband, in the analysis order
+
+    Args:
+        families: dictionary of Family objects, indexed by family ID
+
+    Returns:
+        list of Family objects, one per affected child, each with the child set
+        to the proband. These are copies, so the original families are not
+        changed.
+    """
+
+    probands = []
+    for family_ID in sorted(families):
+        family = families[family_ID]
+        for child in family.children:
+            if child.is_affected():
+                proband = copy.copy(family)
+                proband.child = child
+                probands.append(proband)
+
+    return probands
+
+def estimate_size(variants):
+    """ estimate the memory held by a list of TrioGenotypes objects
+
+    Args:
+        variants: list of TrioGenotypes objects
+
+    Returns:
+        approximate size in bytes
+    """
+
+    total = sys.getsizeof(variants)
+    for trio in variants:
+        members = [trio, trio.child, getattr(trio, "mother", None),
+            getattr(trio, "father", None)]
+        for var in members:
+            if var is None:
+                continue
+
+            total += sys.getsizeof(var) + sys.getsizeof(var.__dict__)
+            for value in var.__dict__.values():
+                total += sys.getsizeof(value)
+                if isinstance(value, dict):
+                    for key in value:
+                        total += sys.getsizeof(key) + sys.getsizeof(value[key])
+                elif isinstance(value, list):
+                    for item in value:
+                        total += sys.getsizeof(item)
+
+    return total
+
+
+class PrefetchedTrio(object):
+    """ the loaded variants and VCF details for a single trio
+    """
+
+    def __init__(self, family, variants, child_header, provenance, counts, error=None, sites=None):
+        """ initialise the loaded trio
+
+        Args:
+            family: Family object, with the child set to the proband
+            variants: list of TrioGenotypes objects
+            child_header: list of header lines from the child's VCF
+            provenance: tuple of provenance details for the trio's VCFs
+            counts: dictionary of lines_scanned and bytes_read counts
+            error: exception raised while loading the trio, or None
+            sites: list of candidate sites for the child, if the loader
+                records these, otherwise None.
+        """
+
+        self.family = family
+        self.variants = variants
+        self.child_header = child_header
+        self.provenance = provenance
+        self.counts = counts
+        self.error = error
+        self.sites = sites
+        self.size = 0
+        if variants is not None:
+            self.size = estimate_size(variants)
+
+
+class TrioPrefetcher(object):
+    """ loads trios in a background thread, ahead of their analysis
+    """
+
+    def __init__(self, loader, probands, pp_filter, depth, memory_budget):
+        """ initialise the prefetcher
+
+        Args:
+            loader: LoadVCFs object, only used by the background thread
+            probands: list of Family objects, in the order they are analysed
+            pp_filter: threshold for the PP_DNM filter
+            depth: maximum number of loaded trios waiting for analysis
+            memory_budget: maximum bytes held by loaded trios waiting for
+                analysis. We always allow one trio, even if it exceeds this.
+        """
+
+        self.loader = loader
+        self.probands = probands
+        self.pp_filter = pp_filter
+        self.depth = depth
+        self.memory_budget = memory_budget
+
+        self.loaded = []
+        self.loaded_size = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def is_full(self):
+        """ check if we have loaded enough trios to wait for the analysis
+        """
+
+        if len(self.loaded) == 0:
+            return False
+
+        return len(self.loaded) >= self.depth or self.loaded_size >= self.memory_budget
+
+    def run(self):
+        """ load each trio in turn, waiting while the loaded trios are full
+        """
+
+        for family in self.probands:
+            with self.condition:
+                while self.is_full() and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+
+            trio = self.load(family)
+
+            with self.condition:
+                self.loaded.append(trio)
+                self.loaded_size += trio.size
+                self.condition.notify_all()
+
+    def load(self, family):
+        """ load the variants and provenance for a single trio
+
+        Args:
+            family: Family object, with the child set to the proband
+
+        Returns:
+            PrefetchedTrio object
+        """
+
+        lines_scanned = self.loader.lines_scanned
+        bytes_read = self.loader.bytes_read
+        try:
+            variants = self.loader.get_trio_variants(family, self.pp_filter)
+            provenance = self.loader.get_trio_provenance()
+        except Exception as error:
+            # pass errors to the main thread, which raises them when it
+            # reaches the trio, as it would have when loading the trio itself
+            return PrefetchedTrio(family, None, None, None, {}, error)
+
+        counts = {"lines_scanned": self.loader.lines_scanned - lines_scanned,
+            "bytes_read": self.loader.bytes_read - bytes_read}
+
+        return PrefetchedTrio(family, variants, self.loader.child_header,
+            provenance, counts, sites=self.loader.sites)
+
+    def get(self, family):
+        """ get the next loaded trio, waiting for it to load if need be
+
+        Args:
+            family: Family object for the trio we are about to analyse, this
+                needs to match the next trio from the background thread.
+
+        Returns:
+            PrefetchedTrio object
+        """
+
+        with self.condition:
+            while len(self.loaded) == 0:
+                self.condition.wait()
+
+            trio = self.loaded.pop(0)
+            self.loaded_size -= trio.size
+            self.condition.notify_all()
+
+        if trio.family.family_id != family.family_id or \
+                trio.family.child.get_id() != family.child.get_id():
+            raise ValueError("prefetched trio for " + trio.family.child.get_id() + \
+                " does not match the current proband: " + family.child.get_id())
+
+        if trio.error is not None:
+            raise trio.error
+
+        return trio
+
+    def close(self):
+        """ stop loading trios
+        """
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+        self.thread.join()
@@ -0,0 +1,400 @@
+""" classes for recording the time and memory used by stages of a trio analysis
+"""
+
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # the resource module is unix-only
+    resource = None
+
+
+class NullStage(object):
+    """ a stage that records nothing, used when profiling is switched off
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def update(self, **counts):
+        """ discard the counts for the stage
+        """
+
+        pass
+
+NULL_STAGE = NullStage()
+
+
+class Profiler(object):
+    """ base profiler, which does nothing.
+
+    The analysis code wraps each stage in "with profiler.stage(name)", so when
+    profiling is off we only pay for entering and exiting a shared no-op
+    object a handful of times per proband.
+    """
+
+    def start_proband(self, family):
+        """ start recording for the currently examined child of a family
+
+        Args:
+            family: Family object, with the child set to the proband
+        """
+
+        pass
+
+    def stage(self, name):
+        """ get a context manager that records a single stage
+
+        Args:
+            name: name of the stage (eg "load_trio")
+        """
+
+        return NULL_STAGE
+
+    def end_proband(self):
+        """ finish recording for the current proband
+        """
+
+        pass
+
+    def close(self):
+        """ finish recording for the run
+        """
+
+        pass
+
+
+class TimedStage(object):
+    """ records the wall and CPU time for a single stage of an analysis
+    """
+
+    def __init__(self, name, stages):
+        """ initialise the stage
+
+        Args:
+            name: name of the stage
+            stages: dictionary of stage records for the proband, which we add
+                the stage record to once the stage completes.
+        """
+
+        self.name = name
+        self.stages = stages
+        self.counts = {}
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = {"wall": time.time() - self.wall,
+            "cpu": time.process_time() - self.cpu}
+        record.update(self.counts)
+
+        # some stages (eg export_data) might run more than once per proband,
+        # so we sum the values across repeats
+        if self.name in self.stages:
+            for key in record:
+                self.stages[self.name][key] = self.stages[self.name].get(key, 0) + record[key]
+        else:
+            self.stages[self.name] = record
+
+        return False
+
+    def update(self, **counts):
+        """ record counts for the stage, eg bytes_read, lines_scanned, variants
+        """
+
+        for key in counts:
+            self.counts[key] = self.counts.get(key, 0) + counts[key]
+
+
+class StageTimer(Profiler):
+    """ records wall time, CPU time, and counts for each stage of each proband,
+    and writes them as JSON lines.
+    """
+
+    def __init__(self, path):
+        """ initialise the class
+
+        Args:
+            path: path to write the JSON lines to. We write one line per
+                proband, and a final line summarising the whole run.
+        """
+
+        self.path = path
+        self.handle = open(self.path, "w")
+
+        self.run_start = time.time()
+        self.run_cpu = time.process_time()
+        self.probands = 0
+        self.summary = {}
+
+        self.proband = None
+
+    def start_proband(self, family):
+        self.proband = {"family_id": family.family_id,
+            "proband": family.child.get_id(), "stages": {}}
+        self.proband_start = time.time()
+        self.proband_cpu = time.process_time()
+
+    def stage(self, name):
+        if self.proband is None:
+            return NULL_STAGE
+
+        return TimedStage(name, self.proband["stages"])
+
+    def end_proband(self):
+        if self.proband is None:
+            return
+
+        self.proband["wall"] = time.time() - self.proband_start
+        self.proband["cpu"] = time.process_time() - self.proband_cpu
+        self.handle.write(json.dumps(self.proband, sort_keys=True) + "\n")
+
+        # add the values to the run totals
+        self.probands += 1
+        for name, record in self.proband["stages"].items():
+            if name not in self.summary:
+                self.summary[name] = {"max_wall": 0}
+            totals = self.summary[name]
+            for key, value in record.items():
+                totals[key] = totals.get(key, 0) + value
+            totals["max_wall"] = max(totals["max_wall"], record["wall"])
+
+        self.proband = None
+
+    def close(self):
+        summary = {"summary": True, "probands": self.probands,
+            "wall": time.time() - self.run_start,
+            "cpu": time.process_time() - self.run_cpu,
+            "stages": self.summary}
+        self.handle.write(json.dumps(summary, sort_keys=True) + "\n")
+        self.handle.close()
+
+
+def get_peak_rss():
+    """ get the peak resident set size of the process, in kilobytes
+
+    Returns:
+        peak RSS in kilobytes, or None if we cannot determine it
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports the peak in bytes, whereas linux reports kilobytes
+    if os.uname()[0] == "Darwin":
+        peak = peak // 1024
+
+    return peak
+
+def count_live_objects(class_names):
+    """ count the live objects for a set of class names
+
+    Args:
+        class_names: set of class names eg {"SNV", "CNV", "TrioGenotypes"}
+
+    Returns:
+        dictionary of counts, indexed by class name
+    """
+
+    counts = dict((name, 0) for name in class_names)
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+
+    return counts
+
+
+class MemoryStage(object):
+    """ records the memory allocated during a single stage of an analysis
+    """
+
+    def __init__(self, name, stages, top_sites, class_names):
+        """ initialise the stage
+
+        Args:
+            name: name of the stage
+            stages: dictionary of stage records for the proband
+            top_sites: number of allocation sites to report for the stage
+            class_names: names of classes to count live objects for
+        """
+
+        self.name = name
+        self.stages = stages
+        self.top_sites = top_sites
+        self.class_names = class_names
+
+    def __enter__(self):
+        self.snapshot = tracemalloc.take_snapshot()
+        self.traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        traced, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+
+        sites = []
+        for stat in snapshot.compare_to(self.snapshot, "lineno")[:self.top_sites]:
+            frame = stat.traceback[0]
+            sites.append({"site": "{0}:{1}".format(frame.filename, frame.lineno),
+                "size": stat.size_diff, "count": stat.count_diff})
+
+        record = {"allocated": traced - self.traced,
+            "peak": peak - self.traced,
+            "top_sites": sites,
+            "live_objects": count_live_objects(self.class_names)}
+
+        # keep the largest values, for stages which repeat for a proband
+        if self.name in self.stages:
+            previous = self.stages[self.name]
+            if previous["peak"] > record["peak"]:
+                record = previous
+
+        self.stages[self.name] = record
+
+        # drop the snapshots, so they don't inflate the later stages
+        self.snapshot = None
+
+        return False
+
+    def update(self, **counts):
+        """ ignore the counts, these are only used by the StageTimer
+        """
+
+        pass
+
+
+class MemoryProfiler(Profiler):
+    """ records tracemalloc snapshots around each stage of each proband, and
+    writes the allocations and peak memory as JSON lines.
+    """
+
+    class_names = set(["SNV", "CNV", "TrioGenotypes"])
+
+    def __init__(self, path, top_sites=10):
+        """ initialise the class, and start tracing memory allocations
+
+        Args:
+            path: path to write the JSON lines to. We write one line per
+                proband, and a final line summarising the whole run.
+            top_sites: number of allocation sites to report per stage
+        """
+
+        self.path = path
+        self.top_sites = top_sites
+        self.handle = open(self.path, "w")
+
+        tracemalloc.start()
+
+        self.probands = 0
+        self.summary = {}
+        self.proband = None
+
+    def start_proband(self, family):
+        self.proband = {"family_id": family.family_id,
+            "proband": family.child.get_id(), "stages": {}}
+
+    def stage(self, name):
+        if self.proband is None:
+            return NULL_STAGE
+
+        return MemoryStage(name, self.proband["stages"], self.top_sites,
+            self.class_names)
+
+    def end_proband(self):
+        if self.proband is None:
+            return
+
+        self.proband["peak_rss_kb"] = get_peak_rss()
+
+        # find the most live objects of each class seen during the proband
+        live = dict((name, 0) for name in self.class_names)
+        for record in self.proband["stages"].values():
+            for name, count in record["live_objects"].items():
+                live[name] = max(live[name], count)
+        self.proband["max_live_objects"] = live
+
+        self.handle.write(json.dumps(self.proband, sort_keys=True) + "\n")
+
+        self.probands += 1
+        for name, record in self.proband["stages"].items():
+            if name not in self.summary:
+                self.summary[name] = {"max_allocated": 0, "max_peak": 0}
+            totals = self.summary[name]
+            totals["max_allocated"] = max(totals["max_allocated"], record["allocated"])
+            totals["max_peak"] = max(totals["max_peak"], record["peak"])
+
+        self.proband = None
+
+    def close(self):
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        summary = {"summary": True, "probands": self.probands,
+            "peak_rss_kb": get_peak_rss(), "traced_peak": peak,
+            "stages": self.summary}
+        self.handle.write(json.dumps(summary, sort_keys=True) + "\n")
+        self.handle.close()
+
+
+class ProfilerGroup(Profiler):
+    """ runs several profilers side by side (eg timings and memory)
+    """
+
+    def __init__(self, profilers):
+        """ initialise with a list of Profiler objects
+        """
+
+        self.profilers = profilers
+
+    def start_proband(self, family):
+        for profiler in self.profilers:
+            profiler.start_proband(family)
+
+    def stage(self, name):
+        return StageGroup([x.stage(name) for x in self.profilers])
+
+    def end_proband(self):
+        for profiler in self.profilers:
+            profiler.end_proband()
+
+    def close(self):
+        for profiler in self.profilers:
+            profiler.close()
+
+
+class StageGroup(object):
+    """ enters and exits the stages of several profilers together
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def __enter__(self):
+        for stage in self.stages:
+            stage.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # exit in reverse order, so the outermost stage includes the others
+        for stage in reversed(self.stages):
+            stage.__exit__(exc_type, exc_value, traceback)
+        return False
+
+    def update(self, **counts):
+        for stage in self.stages:
+            stage.update(**counts)
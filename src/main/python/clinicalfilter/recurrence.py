@@ -0,0 +1,172 @@
+""" count the de novo variants which recur across the probands of a cohort
+
+Genes with de novos in several probands are candidates for novel disorder
+genes. Rather than making a second pass over the outputs, we count each trio's
+de novos as the trio is analysed. These are the child's variants with the de
+novo genotype combination which passed TrioGenotypes.passes_de_novo_checks (as
+well as the consequence and allele frequency filters), whether or not they go
+on to pass the inheritance checks. The de novos are counted per gene and per
+site, and the counts from separate processes are merged as described in
+cohort_summary.py.
+"""
+
+import logging
+
+from clinicalfilter.cohort_summary import CohortSummary
+
+CLASSES = ["lof", "missense", "other"]
+
+def get_de_novos(variants):
+    """ find the de novo variants in a trio
+
+    Args:
+        variants: list of TrioGenotypes objects, which have passed the de novo
+            checks. The trio needs both parents.
+
+    Returns:
+        list of dictionaries for the de novo SNVs, with the site, gene,
+        consequence and consequence class.
+    """
+
+    de_novos = []
+    for var in variants:
+        # CNVs never have the de novo genotype combination
+        if var.is_cnv() or var.get_trio_genotype() != var.get_de_novo_genotype():
+            continue
+
+        child = var.child
+        cq_class = "other"
+        if child.is_lof():
+            cq_class = "lof"
+        elif child.is_missense():
+            cq_class = "missense"
+
+        de_novos.append({"chrom": child.get_chrom(), "pos": child.get_position(),
+            "ref": child.ref_allele, "alt": child.alt_allele,
+            "gene": var.get_gene(), "consequence": child.consequence,
+            "class": cq_class})
+
+    return de_novos
+
+
+class DeNovoRecurrence(CohortSummary):
+    """ counts de novo variants per gene and per site across a cohort
+    """
+
+    entry_key = "de_novos"
+    option = "de_novo_recurrence"
+    flag = "--de-novo-recurrence"
+
+    def __init__(self, counts_path=None):
+        """ initialise the counters
+
+        Args:
+            counts_path: path to append each proband's de novos to, or None
+                to only count the de novos in memory
+        """
+
+        super(DeNovoRecurrence, self).__init__(counts_path)
+
+        self.genes = {}
+        self.sites = {}
+
+    @staticmethod
+    def get_values(family, variants):
+        """ get the de novos for a proband, or None if the proband lacks parents
+        """
+
+        # only trios can have de novos
+        if not family.has_parents():
+            return None
+
+        return get_de_novos(variants)
+
+    def add_values(self, proband_id, de_novos):
+        """ add a proband's de novos to the counters
+
+        Args:
+            proband_id: ID of the proband with the de novos
+            de_novos: list of de novo dictionaries, from get_de_novos()
+        """
+
+        for de_novo in de_novos:
+            self.add_de_novo(proband_id, de_novo)
+
+    def add_de_novo(self, proband_id, de_novo):
+        """ add a single de novo to the per-site and per-gene counters
+
+        Args:
+            proband_id: ID of the proband with the de novo
+            de_novo: dictionary for the de novo, from get_de_novos()
+        """
+
+        site = (de_novo["chrom"], de_novo["pos"], de_novo["ref"], de_novo["alt"])
+        if site not in self.sites:
+            self.sites[site] = {"gene": de_novo["gene"],
+                "consequence": de_novo["consequence"],
+                "class": de_novo["class"], "probands": []}
+        self.sites[site]["probands"].append(proband_id)
+
+        genes = []
+        if de_novo["gene"] is not None:
+            genes = de_novo["gene"].split(",")
+
+        for gene in genes:
+            if gene not in self.genes:
+                self.genes[gene] = {"probands": set(), "de_novos": 0,
+                    "sites": set(), "lof": 0, "missense": 0, "other": 0}
+
+            counts = self.genes[gene]
+            counts["probands"].add(proband_id)
+            counts["de_novos"] += 1
+            counts["sites"].add(site)
+            counts[de_novo["class"]] += 1
+
+    def get_recurrent_sites(self, gene):
+        """ get the number of sites in a gene with de novos in several probands
+        """
+
+        sites = self.genes[gene]["sites"]
+        return len([x for x in sites if len(set(self.sites[x]["probands"])) > 1])
+
+    def write_summary(self, path):
+        """ write tables of the de novo counts per gene and per site
+
+        The genes are written to the path, and the sites are written to the
+        same path with a ".sites" suffix. Both tables start with the genes or
+        sites which recur in the most probands.
+
+        Args:
+            path: path for the per-gene table
+        """
+
+        genes = sorted(self.genes, key=lambda x: (-len(self.genes[x]["probands"]),
+            -self.genes[x]["de_novos"], x))
+
+        with open(path, "w") as handle:
+            handle.write("\t".join(["gene", "probands", "de_novos", "sites",
+                "recurrent_sites"] + CLASSES) + "\n")
+            for gene in genes:
+                counts = self.genes[gene]
+                values = [gene, len(counts["probands"]), counts["de_novos"],
+                    len(counts["sites"]), self.get_recurrent_sites(gene)] + \
+                    [counts[x] for x in CLASSES]
+                handle.write("\t".join([str(x) for x in values]) + "\n")
+
+        sites = sorted(self.sites, key=lambda x: (-len(self.sites[x]["probands"]),
+            x[0], x[1], x[2], x[3]))
+
+        with open(path + ".sites", "w") as handle:
+            handle.write("\t".join(["chrom", "pos", "ref", "alt", "gene",
+                "consequence", "class", "probands", "proband_ids"]) + "\n")
+            for site in sites:
+                counts = self.sites[site]
+                values = list(site) + [counts["gene"], counts["consequence"],
+                    counts["class"], len(counts["probands"]),
+                    ",".join(counts["probands"])]
+                handle.write("\t".join([str(x) for x in values]) + "\n")
+
+        recurrent = [x for x in genes if len(self.genes[x]["probands"]) > 1]
+        logging.info("counted " + str(len(self.sites)) + " de novo sites in " + \
+            str(len(self.probands)) + " trios, " + str(len(recurrent)) + \
+            " genes have de novos in more than one proband")
@@ -0,0 +1,443 @@
+""" analyse a trio in genomic regions, using parallel worker processes
+
+Whole genome VCFs have tens of millions of lines, which takes a long time to
+load on a single core. Instead we split each proband's genome into regions, and
+load and analyse the regions in separate processes. The regions are planned
+so that the candidate variants for each region can simply be merged:
+    regions never split a known gene, since the compound heterozygous checks
+        need every variant in a gene. Without known genes we don't know where
+        genes lie, so we use whole chromosomes as regions.
+    regions never split a CNV in the proband, since a CNV is checked against
+        every gene it overlaps. We only find the CNVs once we have loaded the
+        regions, so if a CNV extends beyond its region, we combine the region
+        with the following region, and analyse the combined region again.
+
+Gene symbols can still occur in more than one region (eg genes in the
+pseudoautosomal regions of X and Y, or when we lack known genes), so the workers
+return their candidates per gene, and we check any gene seen in several regions
+again with the variants from every region. The merged candidates then pass
+through exclude_duplicates and the PostInheritanceFilter, as for the serial
+analysis.
+"""
+
+import logging
+import multiprocessing
+
+from clinicalfilter.load_vcfs import LoadVCFs
+from clinicalfilter.match_cnvs import MatchCNVs
+from clinicalfilter.vcf_index import open_vcf_index
+from clinicalfilter.load_options import get_summary_paths
+from clinicalfilter.cohort_summary import merge_values
+
+# the approximate size of regions when we can split chromosomes at the gaps
+# between known genes
+REGION_SIZE = 10000000
+
+# the ClinicalFilter object used by the worker processes, this is set before
+# the workers are forked, so they share the known genes etc
+_FINDER = None
+
+
+def get_gene_intervals(known_genes, chrom):
+    """ get the merged intervals covered by known genes on a chromosome
+
+    Args:
+        known_genes: dictionary of known genes, or None
+        chrom: chromosome to get intervals for
+
+    Returns:
+        sorted list of [start, end] intervals
+    """
+
+    intervals = []
+    for gene in known_genes:
+        if known_genes[gene]["chrom"] == chrom:
+            intervals.append([known_genes[gene]["start"], known_genes[gene]["end"]])
+
+    intervals.sort()
+    merged = []
+    for start, end in intervals:
+        if len(merged) > 0 and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+def plan_regions(chroms, known_genes, region_size=REGION_SIZE):
+    """ split the genome into regions that don't split any known genes
+
+    Args:
+        chroms: list of chromosomes, in the order they occur in the VCF
+        known_genes: dictionary of known genes, or None
+        region_size: approximate region size, in base pairs
+
+    Returns:
+        list of (chrom, start, end) tuples, where end is None for the final
+        region of each chromosome.
+    """
+
+    regions = []
+    for chrom in chroms:
+        if known_genes is None:
+            regions.append((chrom, 1, None))
+            continue
+
+        # cut the chromosome at the midpoint of the first gap between known
+        # genes once we have passed the region size
+        start = 1
+        intervals = get_gene_intervals(known_genes, chrom)
+        for previous, current in zip(intervals, intervals[1:]):
+            if previous[1] - start + 1 >= region_size:
+                cut = (previous[1] + current[0]) // 2
+                regions.append((chrom, start, cut))
+                start = cut + 1
+
+        regions.append((chrom, start, None))
+
+    return regions
+
+def coalesce_regions(regions, results):
+    """ combine regions where a proband's CNV extends into the next region
+
+    Args:
+        regions: list of (chrom, start, end) tuples
+        results: list of RegionResult objects for the regions, or None for
+            regions that have not been analysed
+
+    Returns:
+        tuple of lists of regions and results, where the results of combined
+        regions are None, since they need to be analysed again.
+    """
+
+    new_regions = []
+    new_results = []
+    for region, result in zip(regions, results):
+        if len(new_regions) > 0:
+            previous = new_regions[-1]
+            previous_result = new_results[-1]
+            if previous[0] == region[0] and previous_result is not None \
+                    and previous_result.cnv_end is not None \
+                    and previous_result.cnv_end > previous[2]:
+                new_regions[-1] = (previous[0], previous[1], region[2])
+                new_results[-1] = None
+                continue
+
+        new_regions.append(region)
+        new_results.append(result)
+
+    return new_regions, new_results
+
+def open_region_index(path):
+    """ get the index for a VCF, so we can fetch regions from the VCF
+
+    This runs in the worker processes, so the VCFs of a trio are indexed in
+    parallel. Uncompressed VCFs are scanned for their index, which is cached
+    next to the VCF, so later runs (or other probands sharing a parent) don't
+    need to scan the VCF again.
+
+    Args:
+        path: path to the VCF
+
+    Returns:
+        TabixIndex or PlainVCFIndex, or None if we can't fetch regions
+    """
+
+    return open_vcf_index(path, cache=True)
+
+def analyse_region(task):
+    """ find the candidate variants for a trio in a single region
+
+    This runs in the worker processes.
+
+    Args:
+        task: tuple of (family, region, indexes), where the indexes are a
+            dictionary of VCF indexes, keyed by VCF path
+
+    Returns:
+        RegionResult object
+    """
+
+    family, region, indexes = task
+
+    loader = RegionLoadVCFs(region, indexes, _FINDER.known_genes,
+        _FINDER.excluded_genes, _FINDER.tracer, _FINDER.site_cache)
+    variants = loader.get_trio_variants(family, _FINDER.pp_filter)
+
+    _FINDER.family = family
+    genes_dict = _FINDER.create_gene_dict(variants)
+    genes = []
+    for gene in genes_dict:
+        candidates = _FINDER.find_variants(genes_dict[gene], gene)
+        genes.append((gene, genes_dict[gene], candidates))
+
+    # the values for the summaries across the cohort are merged from every
+    # region
+    summary_values = {}
+    for summary_type, path in get_summary_paths(_FINDER):
+        summary_values[summary_type.entry_key] = summary_type.get_values(family,
+            variants)
+
+    return RegionResult(genes, loader.cnv_end, loader.lines_scanned,
+        summary_values)
+
+
+class RegionResult(object):
+    """ the candidate variants from analysing a single region
+    """
+
+    def __init__(self, genes, cnv_end, lines_scanned, summary_values=None):
+        """ initialise the result
+
+        Args:
+            genes: list of (gene, variants, candidates) tuples, in the order
+                the genes were found in the region, where the candidates are
+                (variant, check, inheritance) tuples.
+            cnv_end: furthest end position of the proband's CNVs in the
+                region, or None if the proband lacked CNVs
+            lines_scanned: number of VCF lines read for the region
+            summary_values: dictionary of the region's values for the cohort
+                summaries, keyed by the summary's entry key
+        """
+
+        self.genes = genes
+        self.cnv_end = cnv_end
+        self.lines_scanned = lines_scanned
+        self.summary_values = summary_values
+        if self.summary_values is None:
+            self.summary_values = {}
+
+
+class RegionLoadVCFs(LoadVCFs):
+    """ loads the variants for a trio within a single genomic region
+    """
+
+    def __init__(self, region, indexes, known_genes, excluded_genes, tracer=None, site_cache=None):
+        """ initialise the loader
+
+        Args:
+            region: (chrom, start, end) tuple, where end can be None for the
+                end of the chromosome.
+            indexes: dictionary of VCF indexes, keyed by VCF path
+            known_genes: dictionary of known genes
+            excluded_genes: set of genes to exclude
+            tracer: Tracer object for the positions to trace, or None
+            site_cache: SiteCache object, or None. Each worker process has
+                its own copy of the cache, which is reused across regions.
+        """
+
+        super(RegionLoadVCFs, self).__init__(1, known_genes, excluded_genes,
+            tracer, site_cache=site_cache)
+
+        self.chrom, self.start, self.end = region
+        self.indexes = indexes
+        self.cnv_end = None
+
+    def load_trio(self):
+        """ load the variants for the trio, without the per-trio log messages
+        """
+
+        child_vars = self.open_individual(self.family.child)
+        self.child_keys = set([var.get_key() for var in child_vars])
+
+        # the parents' variants need to cover the full span of the child's
+        # CNVs, even where the CNVs extend past the region
+        for var in child_vars:
+            if var.is_cnv():
+                end = var.get_range()[1]
+                if self.cnv_end is None or end > self.cnv_end:
+                    self.cnv_end = end
+
+        self.child_header = []
+        self.cnv_matcher = MatchCNVs(child_vars)
+
+        mother_vars = []
+        father_vars = []
+        if self.family.has_parents():
+            mother_vars = self.open_individual(self.family.mother, child_variants=True)
+            father_vars = self.open_individual(self.family.father, child_variants=True)
+
+        return (child_vars, mother_vars, father_vars)
+
+    def iterate_vcf_lines(self, path, child_variants=False):
+        """ iterates through the VCF lines in the region
+
+        We only use the proband's variants which start within the region, but
+        for the parents we include any variants overlapping the region, or
+        the proband's CNVs within the region.
+
+        Args:
+            path: path to VCF file
+            child_variants: True/False for whether we are loading a parent
+
+        Returns:
+            iterator of VCF lines
+        """
+
+        index = self.indexes[path]
+
+        if child_variants:
+            end = self.end
+            if end is not None and self.cnv_end is not None:
+                end = max(end, self.cnv_end)
+
+            for line in index.fetch(self.chrom, self.start, end):
+                yield line
+        else:
+            for line in index.fetch(self.chrom, self.start, self.end):
+                if int(line.split("\t", 2)[1]) >= self.start:
+                    yield line
+
+
+class RegionParallelAnalysis(object):
+    """ finds candidate variants for trios using parallel region workers
+    """
+
+    def __init__(self, finder, workers, region_size=REGION_SIZE):
+        """ initialise the analysis
+
+        Args:
+            finder: ClinicalFilter object, which provides the known genes and
+                options, and finds the candidate variants within each region.
+            workers: number of worker processes
+            region_size: approximate size of regions in base pairs
+        """
+
+        self.finder = finder
+        self.workers = workers
+        self.region_size = region_size
+        self.pool = None
+
+        # the indexes for the previous trio, which siblings can reuse
+        self.indexes = {}
+
+    def get_pool(self):
+        """ start the worker processes, if they haven't been started already
+        """
+
+        global _FINDER
+
+        if self.pool is None:
+            _FINDER = self.finder
+            context = multiprocessing.get_context("fork")
+            self.pool = context.Pool(self.workers)
+
+        return self.pool
+
+    def close(self):
+        """ stop the worker processes
+        """
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_indexes(self, family):
+        """ get indexes for each VCF in a trio
+
+        Args:
+            family: Family object, with the child set to the proband
+
+        Returns:
+            dictionary of indexes keyed by VCF path, or None if any VCF in the
+            trio lacks an index.
+        """
+
+        members = [family.child]
+        if family.has_parents():
+            members += [family.mother, family.father]
+        paths = [member.get_path() for member in members]
+
+        # index the VCFs in the workers, rather than scanning them one at a
+        # time before any region is dispatched
+        todo = [path for path in paths if path not in self.indexes]
+        pool = self.get_pool()
+        indexes = dict((path, self.indexes[path]) for path in paths
+            if path in self.indexes)
+        indexes.update(zip(todo, pool.map(open_region_index, todo)))
+        self.indexes = indexes
+
+        for path in paths:
+            if indexes[path] is None:
+                logging.info("cannot split into regions, since no index for " + \
+                    path)
+                return None
+
+        return indexes
+
+    def find_candidates(self, family, indexes):
+        """ find the candidate variants for a trio, analysing regions in parallel
+
+        Args:
+            family: Family object, with the child set to the proband
+            indexes: dictionary of VCF indexes, keyed by VCF path
+
+        Returns:
+            tuple of the list of (variant, check, inheritance) tuples (with
+            duplicates not yet excluded), a dictionary of the values for the
+            cohort summaries from every region, the number of regions and the
+            number of lines scanned.
+        """
+
+        pool = self.get_pool()
+
+        chroms = indexes[family.child.get_path()].chroms
+        regions = plan_regions(chroms, self.finder.known_genes, self.region_size)
+        results = [None] * len(regions)
+
+        lines_scanned = 0
+        while None in results:
+            todo = [i for i, result in enumerate(results) if result is None]
+            tasks = [(family, regions[i], indexes) for i in todo]
+            for i, result in zip(todo, pool.map(analyse_region, tasks)):
+                results[i] = result
+                lines_scanned += result.lines_scanned
+
+            regions, results = coalesce_regions(regions, results)
+
+        summary_values = {}
+        for summary_type, path in get_summary_paths(self.finder):
+            key = summary_type.entry_key
+            values = [x.summary_values[key] for x in results]
+            if len(values) == 0:
+                values = [summary_type.get_values(family, [])]
+            summary_values[key] = merge_values(values)
+
+        return self.merge_results(results), summary_values, len(regions), lines_scanned
+
+    def merge_results(self, results):
+        """ merge the candidates from each region
+
+        We merge the genes in the order they were first found, which matches
+        the order from analysing the whole genome at once.
+
+        Args:
+            results: list of RegionResult objects, in genome order
+
+        Returns:
+            list of (variant, check, inheritance) tuples
+        """
+
+        genes = {}
+        order = []
+        for result in results:
+            for gene, variants, candidates in result.genes:
+                if gene not in genes:
+                    order.append(gene)
+                    genes[gene] = {"variants": list(variants),
+                        "candidates": candidates, "regions": 1}
+                else:
+                    genes[gene]["variants"] += variants
+                    genes[gene]["regions"] += 1
+
+        candidates = []
+        for gene in order:
+            # genes found in more than one region need checking with all their
+            # variants, so that we can find compound hets across regions
+            if genes[gene]["regions"] > 1:
+                genes[gene]["candidates"] = self.finder.find_variants(
+                    genes[gene]["variants"], gene)
+            candidates += genes[gene]["candidates"]
+
+        return candidates
@@ -8,11 +8,16 @@ import importlib
 import sys
 import os
 
+# columns of the tabular output
+OUTPUT_COLUMNS = ["proband", "alternate_ID", "sex", "chrom", "position", "gene",
+    "mutation_ID", "transcript", "consequence", "ref/alt_alleles", "MAX_MAF",
+    "inheritance", "trio_genotype", "mom_aff", "dad_aff", "result"]
+
 class Report(object):
     """ A class to report candidate variants.
     """
     
-    def __init__(self, output_path, export_vcf, ID_mapper, known_genes_date=None):
+    def __init__(self, output_path, export_vcf, ID_mapper, known_genes_date=None, clear_output=True):
         """ initialise the class
         
         Args:
@@ -20,6 +25,8 @@ class Report(object):
             export vcf: path string to export VCF files(s), or None
             ID_mapper: original_ID - alternate ID dictionary for study probands
             known_genes_date: date the known gene list was generated, or None
+            clear_output: whether to clear the tabular output, or to append
+                to the output (when we resume an earlier run)
         """
         
         self.output_path = output_path
@@ -28,12 +35,9 @@ class Report(object):
         self.known_genes_date = known_genes_date
         
         # clear the tabular output file if it exists
-        if self.output_path is not None:
+        if self.output_path is not None and clear_output:
             output = open(self.output_path, "w")
-            output.write("\t".join(["proband", "alternate_ID", "sex", \
-                "chrom", "position", "gene", "mutation_ID", "transcript", \
-                "consequence", "ref/alt_alleles", "MAX_MAF", "inheritance", \
-                "trio_genotype", "mom_aff", "dad_aff", "result"]) + "\n")
+            output.write("\t".join(OUTPUT_COLUMNS) + "\n")
             output.close()
         
         self._log_run_details()
@@ -134,11 +138,14 @@ class Report(object):
         
         return output_line
     
-    def _save_tabular(self, variants):
-        """ exports candidate variants and their details
+    def _get_output_lines(self, variants):
+        """ gets the output lines for the candidate variants of a proband
         
         Args:
             variants: list of (variant, check, inheritance) tuples
+        
+        Returns:
+            list of tab-separated lines, sorted by variant
         """
         
         # get the affected status of the parents
@@ -153,14 +160,43 @@ class Report(object):
         if self.ID_mapper is not None:
             alt_id = self.ID_mapper[self.family.child.get_id()]
         
-        for var in sorted(variants):
-            output_line = self._get_output_line(var, dad_aff, mom_aff, alt_id)
+        return [ self._get_output_line(var, dad_aff, mom_aff, alt_id) \
+            for var in sorted(variants) ]
+    
+    def _save_tabular(self, variants):
+        """ exports candidate variants and their details
+        
+        Args:
+            variants: list of (variant, check, inheritance) tuples
+        """
+        
+        for output_line in self._get_output_lines(variants):
             self.output.write(output_line)
         
         # leave a gap between individuals, as per previous reporting system
         if len(variants) > 0: 
             self.output.write("\n")
     
+    def get_candidate_records(self, variants, family):
+        """ gets the candidate variants as dictionaries of the output columns
+        
+        Args:
+            variants: list of (variant, check, inheritance) tuples
+            family: Family object
+        
+        Returns:
+            list of dictionaries, one per candidate, keyed by output column
+        """
+        
+        self.family = family
+        
+        records = []
+        for output_line in self._get_output_lines(variants):
+            values = output_line.rstrip("\n").split("\t")
+            records.append(dict(zip(OUTPUT_COLUMNS, values)))
+        
+        return records
+    
     def _get_provenance(self, provenance, member):
         """ gets the VCF filename, checksum and VCF date for family members
         
@@ -0,0 +1,243 @@
+""" checkpoint the probands finished in a run, so an interrupted run can resume
+
+We keep a manifest next to the tabular output. The manifest starts with a hash
+of the options (and the contents of the files named by the options) which
+affect the output. After each proband's results are written, we append a line
+with the proband's ID, checksums for its VCFs, and the size of the output once
+the proband's results were written.
+
+When we resume, the probands at the start of the manifest which match the
+current run (in the same order, with unchanged VCFs) are kept. The output is
+truncated to the end of the last kept proband, which drops any partial results
+from when the run died, and the remaining probands are analysed as usual. As
+the probands are analysed in a fixed order, the final output is identical to
+the output from a clean run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+# the options which change the output, rather than how we get there
+OUTPUT_OPTIONS = ["regions", "genes", "genes_date", "alternate_ids",
+    "export_vcf", "pp_filter"]
+FILE_OPTIONS = ["regions", "genes", "alternate_ids"]
+
+def get_file_checksum(path):
+    """ get the SHA1 hash of a file, in a memory efficient manner
+    """
+
+    BLOCKSIZE = 65536
+    checksum = hashlib.sha1()
+    with open(path, "rb") as handle:
+        buf = handle.read(BLOCKSIZE)
+        while len(buf) > 0:
+            checksum.update(buf)
+            buf = handle.read(BLOCKSIZE)
+
+    return checksum.hexdigest()
+
+def get_config_hash(options, ignore=None):
+    """ hash the options that affect the output of a run
+
+    Args:
+        options: argparse Namespace of the run options
+        ignore: list of options to leave out of the hash, or None
+
+    Returns:
+        SHA1 hash of the option values, and of the files named by the options
+    """
+
+    if ignore is None:
+        ignore = []
+
+    config = {}
+    for key in OUTPUT_OPTIONS:
+        if key in ignore:
+            continue
+        value = getattr(options, key, None)
+        config[key] = value
+        if key in FILE_OPTIONS and value is not None:
+            config[key + "_sha1"] = get_file_checksum(value)
+
+    text = json.dumps(config, sort_keys=True)
+
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+def get_proband_key(family):
+    """ get a key for the current proband in a family
+    """
+
+    return family.family_id + "\t" + family.child.get_id()
+
+def get_trio_inputs(family, provenance):
+    """ get the VCF details for a trio, for checking the VCFs when we resume
+
+    Args:
+        family: Family object, with the child set to the proband
+        provenance: tuple of (checksum, basename, date) tuples for the child,
+            mother and father
+
+    Returns:
+        list of [path, size, modification time, checksum] for each VCF
+    """
+
+    members = [family.child]
+    if family.has_parents():
+        members += [family.mother, family.father]
+
+    inputs = []
+    for member, defs in zip(members, provenance):
+        path = member.get_path()
+        stat = os.stat(path)
+        inputs.append([path, stat.st_size, stat.st_mtime_ns, defs[0]])
+
+    return inputs
+
+def inputs_unchanged(inputs):
+    """ check that the VCFs for a finished proband haven't changed
+
+    We only need to hash a VCF again if its size or modification time differ.
+    """
+
+    for path, size, mtime, checksum in inputs:
+        if not os.path.exists(path):
+            return False
+
+        stat = os.stat(path)
+        if stat.st_size == size and stat.st_mtime_ns == mtime:
+            continue
+
+        if stat.st_size != size or get_file_checksum(path) != checksum:
+            return False
+
+    return True
+
+
+class RunManifest(object):
+    """ records the probands that have been written to the output
+    """
+
+    def __init__(self, output_path, config_hash):
+        """ initialise the manifest
+
+        Args:
+            output_path: path to the tabular output, the manifest is kept
+                alongside this.
+            config_hash: hash of the options affecting the output
+        """
+
+        self.output_path = output_path
+        self.path = output_path + ".manifest"
+        self.config_hash = config_hash
+        self.completed = set()
+
+    def read_entries(self):
+        """ read the entries from an existing manifest
+
+        Returns:
+            list of proband entries, or an empty list if the manifest is
+            missing, or was made with a different configuration.
+        """
+
+        if not os.path.exists(self.path):
+            return []
+
+        entries = []
+        with open(self.path, "r") as handle:
+            for line in handle:
+                # a run can die while appending the last line
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+
+        if len(entries) == 0 or entries[0].get("config") != self.config_hash:
+            logging.warning("the options differ from the earlier run, so we " \
+                "can't resume from " + self.path)
+            return []
+
+        return entries[1:]
+
+    def resume(self, probands):
+        """ find the finished probands, and truncate the output after them
+
+        Args:
+            probands: list of Family objects, one per affected proband, in the
+                order they are analysed.
+
+        Returns:
+            True if the output can be resumed, or False if the run needs to
+            start from scratch.
+        """
+
+        entries = self.read_entries()
+
+        size = 0
+        if os.path.exists(self.output_path):
+            size = os.path.getsize(self.output_path)
+
+        # keep the entries which match the start of the current run
+        kept = []
+        for entry, family in zip(entries, probands):
+            if entry["proband"] != get_proband_key(family) or \
+                    entry["offset"] > size or not inputs_unchanged(entry["inputs"]):
+                break
+            kept.append(entry)
+
+        self.write(kept)
+        if len(kept) == 0:
+            return False
+
+        # drop any results written after the last finished proband
+        with open(self.output_path, "r+") as handle:
+            handle.truncate(kept[-1]["offset"])
+
+        self.completed = set([entry["proband"] for entry in kept])
+        logging.info("resuming after " + str(len(kept)) + " finished probands")
+
+        return True
+
+    def write(self, entries):
+        """ atomically replace the manifest with the given entries
+        """
+
+        temp = self.path + ".tmp"
+        with open(temp, "w") as handle:
+            handle.write(json.dumps({"config": self.config_hash}) + "\n")
+            for entry in entries:
+                handle.write(json.dumps(entry, sort_keys=True) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        os.replace(temp, self.path)
+
+    def is_complete(self, family):
+        """ check if the current proband in a family was already finished
+        """
+
+        return get_proband_key(family) in self.completed
+
+    def add_proband(self, family, provenance):
+        """ record that a proband's results have been written to the output
+
+        Args:
+            family: Family object, with the child set to the proband
+            provenance: tuple of VCF provenance details for the trio
+        """
+
+        # make sure the results are on disk before they are recorded as done
+        with open(self.output_path, "a") as handle:
+            os.fsync(handle.fileno())
+        offset = os.path.getsize(self.output_path)
+
+        entry = {"proband": get_proband_key(family), "offset": offset,
+            "inputs": get_trio_inputs(family, provenance)}
+
+        with open(self.path, "a") as handle:
+            handle.write(json.dumps(entry, sort_keys=True) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        self.completed.add(entry["proband"])
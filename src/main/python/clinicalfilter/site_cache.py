@@ -0,0 +1,179 @@
+""" a cache of the annotations parsed for VCF sites, shared across trios
+
+Parsing a SNV's INFO field (splitting the key-value pairs, picking the most
+severe consequence for multiple alts), checking the filters, and finding the
+overlapping known genes only depend on the VCF line's site, alleles, FILTER and
+INFO fields, not on the sample. The same sites recur in the parents of a trio,
+in other probands, and when a child's variant is constructed again after
+passing the filters, so we keep the parsed annotations for recent sites.
+
+The cache is bounded, evicting the least recently used sites first. It is
+shared by the threads and loaders which load trios, so it is locked.
+"""
+
+import collections
+import threading
+
+# the default number of sites to hold
+MAX_SITES = 50000
+
+# marks annotations which haven't been found yet
+MISSING = object()
+
+
+class SiteAnnotation(object):
+    """ the parsed annotations for a single site
+    """
+
+    __slots__ = ["info", "consequence", "gene", "passes", "known_gene"]
+
+    def __init__(self, var):
+        """ record the annotations from a variant which has parsed its INFO
+
+        Args:
+            var: SNV object, after add_info()
+        """
+
+        self.info = dict(var.info)
+        self.consequence = var.consequence
+        self.gene = var.gene
+        self.passes = MISSING
+        self.known_gene = MISSING
+
+    def apply(self, var):
+        """ set the annotations on a variant, in place of parsing its INFO
+
+        Each variant gets its own copy of the INFO dictionary, so changes to
+        one variant's INFO don't affect other variants at the site.
+        """
+
+        var.info = dict(self.info)
+        var.consequence = self.consequence
+        var.gene = self.gene
+        var.clear_derived_values()
+
+
+class SiteCache(object):
+    """ a bounded, least recently used cache of parsed site annotations
+    """
+
+    def __init__(self, max_sites=MAX_SITES):
+        """ initialise the cache
+
+        Args:
+            max_sites: maximum number of sites to hold
+        """
+
+        self.max_sites = max_sites
+        self.sites = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_key(self, line):
+        """ get the key for a VCF line
+
+        Args:
+            line: list of elements of a VCF line
+        """
+
+        return (line[0], line[1], line[3], line[4], line[6], line[7])
+
+    def get(self, line):
+        """ get the annotations for a VCF line, and count the hit or miss
+
+        Returns:
+            SiteAnnotation, or None if the site isn't in the cache
+        """
+
+        key = self.get_key(line)
+        with self.lock:
+            entry = self.sites.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.sites.move_to_end(key)
+
+        return entry
+
+    def peek(self, line):
+        """ get the annotations for a VCF line, without counting a hit or miss
+        """
+
+        with self.lock:
+            return self.sites.get(self.get_key(line))
+
+    def add(self, line, entry):
+        """ add the annotations for a VCF line, evicting the oldest site if full
+        """
+
+        key = self.get_key(line)
+        with self.lock:
+            self.sites[key] = entry
+            if len(self.sites) > self.max_sites:
+                self.sites.popitem(last=False)
+                self.evictions += 1
+
+    def add_info(self, var, line):
+        """ set the INFO annotations on a SNV, using the cache if we can
+
+        Args:
+            var: SNV object, before the INFO has been added
+            line: list of elements of the SNV's VCF line
+        """
+
+        entry = self.get(line)
+        if entry is None:
+            var.add_info(line[7])
+            self.add(line, SiteAnnotation(var))
+        else:
+            entry.apply(var)
+
+    def passes_filters(self, var, line):
+        """ check if a SNV passes the filters, using the cached verdict if we can
+        """
+
+        entry = self.peek(line)
+        if entry is None:
+            return var.passes_filters()
+
+        if entry.passes is MISSING:
+            entry.passes = var.passes_filters()
+
+        return entry.passes
+
+    def set_gene_from_known_gene_overlap(self, var, line):
+        """ set the gene for a SNV from the known genes it overlaps, using the
+        cached genes if we can
+        """
+
+        entry = self.peek(line)
+        if entry is None:
+            var.set_gene_from_known_gene_overlap()
+            return
+
+        if entry.known_gene is MISSING:
+            var.set_gene_from_known_gene_overlap()
+            entry.known_gene = var.gene
+        else:
+            var.gene = entry.known_gene
+
+    def get_stats(self):
+        """ get the counts of hits, misses and evictions
+
+        Returns:
+            dictionary of counts, with the hit rate (or None before any lookups)
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = None
+            if lookups > 0:
+                hit_rate = self.hits / float(lookups)
+
+            return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "sites": len(self.sites),
+                "hit_rate": hit_rate}
@@ -0,0 +1,101 @@
+""" find the DECIPHER syndrome regions overlapping CNVs
+
+The syndrome regions are held in an IntervalIndex, with integer coordinates,
+and the region's copy number as the value. open_cnv_regions() builds the index
+once when the regions are loaded, so checking a CNV only looks at the regions
+near the CNV, rather than converting and comparing every region for every CNV.
+The index can be shared by anything that annotates CNVs, such as the
+inheritance checks for each proband, or a pass over the CNVs of a cohort.
+"""
+
+from clinicalfilter.interval_index import IntervalIndex
+
+def index_cnv_regions(cnv_regions):
+    """ make an index of syndrome regions
+
+    Args:
+        cnv_regions: dictionary of copy numbers, indexed by (chrom, start, end)
+            tuples, or an IntervalIndex of syndrome regions, which is used as
+            it is.
+
+    Returns:
+        IntervalIndex of the regions, with integer copy numbers as values
+    """
+
+    if isinstance(cnv_regions, IntervalIndex):
+        return cnv_regions
+
+    index = IntervalIndex()
+    for (chrom, start, end), copy_number in cnv_regions.items():
+        index.add(chrom, start, end, int(copy_number))
+
+    # sort the regions now, since the index can be shared between threads
+    index.build()
+
+    return index
+
+def has_enough_overlap(start, end, region_start, region_end):
+    """ finds if a CNV and another chrom region share sufficient overlap
+
+    Args:
+        start: start position of the CNV
+        end: end position of the CNV
+        region_start: start position of the region
+        region_end: end position of the region
+
+    Returns:
+        True/False for whether the overlap is more than 1% of the CNV, and
+        more than 1% of the region.
+    """
+
+    # find the point where the overlap starts
+    overlap_start = region_start
+    if region_start <= start <= region_end:
+        overlap_start = start
+
+    # find the point where the overlap ends
+    overlap_end = region_end
+    if region_start <= end <= region_end:
+        overlap_end = end
+
+    distance = (overlap_end - overlap_start) + 1
+
+    # adjust the positions before we try to divide by zero, if the "region"
+    # is actually a SNV
+    if end == start:
+        start -= 1
+    if region_end == region_start:
+        region_start -= 1
+
+    forward = float(distance)/(abs(end - start) + 1)
+    reverse = float(distance)/(abs(region_end - region_start) + 1)
+
+    # determine whether there is sufficient overlap
+    return forward > 0.01 and reverse > 0.01
+
+def find_syndrome_regions(cnv_regions, chrom, start, end, copy_number=None):
+    """ find the syndrome regions which a CNV sufficiently overlaps
+
+    Args:
+        cnv_regions: IntervalIndex of syndrome regions, from index_cnv_regions()
+        chrom: chromosome of the CNV
+        start: start position of the CNV
+        end: end position of the CNV
+        copy_number: copy number of the CNV, to only find regions with the
+            same copy number, or None to find regions with any copy number.
+
+    Returns:
+        list of (start, end, copy number) tuples for the regions, in the order
+        the regions were loaded.
+    """
+
+    regions = []
+    for region_start, region_end, region_copy_number in \
+            cnv_regions.find_overlaps(chrom, start, end):
+        if copy_number is not None and copy_number != region_copy_number:
+            continue
+
+        if has_enough_overlap(start, end, region_start, region_end):
+            regions.append((region_start, region_end, region_copy_number))
+
+    return regions
@@ -0,0 +1,143 @@
+""" trace the filtering decisions for variants at chosen positions
+
+Tracing takes a set of (chrom, position) targets, and as a variant at a target
+passes through the analysis, each stage records its decision. The stages are:
+    filters: the SNV or CNV filters on the child's VCF line
+    de_novo: the de novo checks, for variants with de novo genotypes
+    gene: whether the variant lies in a gene
+    inheritance: the inheritance checks for each gene of the variant
+    post_inheritance: the filters on the candidates from the inheritance
+        checks, including the final decision for variants which are reported
+
+Each decision is written as a line of JSON, with the proband ID, chromosome,
+position, stage and decision (pass or fail), and optionally the reason and
+other details for the decision. Checking a variant is a single set lookup, and
+when nothing is traced the tracer is None, so the analysis only tests for None
+(or not at all, for the SNV filters, where the traced method is swapped in).
+
+Records are appended to the output file, so trios loaded in separate threads
+or worker processes can share a single trace file. When analysing regions in
+parallel, a region which is combined with the next region (to cover a CNV) is
+analysed again, so its records are repeated.
+"""
+
+import json
+import sys
+import threading
+
+def open_trace_positions(path):
+    """ load the positions to trace
+
+    Args:
+        path: path to a file with a chromosome and position on each line,
+            separated by whitespace, or as chrom:position. Blank lines, and
+            lines starting with "#", are skipped.
+
+    Returns:
+        set of (chrom, position) tuples
+    """
+
+    positions = set()
+    with open(path, "r") as handle:
+        for line in handle:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+
+            fields = line.replace(":", " ").split()
+            if len(fields) < 2:
+                raise ValueError("can't find the chromosome and position in "
+                    "line '" + line + "' of " + path)
+
+            positions.add((fields[0], int(fields[1])))
+
+    return positions
+
+
+class Tracer(object):
+    """ records the decisions at each analysis stage for the traced positions
+    """
+
+    def __init__(self, positions, path=None):
+        """ initialise the tracer
+
+        Args:
+            positions: iterable of (chrom, position) tuples to trace
+            path: path to append the trace records to, or None to write them
+                to standard output
+        """
+
+        self.positions = frozenset((str(chrom), int(pos)) for chrom, pos in positions)
+        self.path = path
+
+        # the proband is set separately in each thread, since trios can be
+        # loaded in background threads while another trio is analysed
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def is_traced(self, chrom, pos):
+        """ check if a position is traced
+        """
+
+        return (chrom, pos) in self.positions
+
+    def set_proband(self, proband_id):
+        """ set the proband for the records from the current thread
+        """
+
+        self.local.proband = proband_id
+
+    def get_proband(self):
+        """ get the proband for the records from the current thread
+        """
+
+        return getattr(self.local, "proband", None)
+
+    def log(self, chrom, pos, stage, decision, reason=None, details=None):
+        """ write a record of the decision at a stage, for a traced position
+
+        Args:
+            chrom: chromosome of the variant
+            pos: position of the variant
+            stage: name of the analysis stage
+            decision: "pass" or "fail"
+            reason: text for the reason for the decision, or None
+            details: dictionary of other values to record (which need to be
+                JSON serialisable), or None
+        """
+
+        if not self.is_traced(chrom, pos):
+            return
+
+        record = {"proband": self.get_proband(), "chrom": chrom, "pos": pos,
+            "stage": stage, "decision": decision}
+        if reason is not None:
+            record["reason"] = reason
+        if details is not None:
+            record.update(details)
+
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self.lock:
+            if self.path is None:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                with open(self.path, "a") as handle:
+                    handle.write(line)
+
+    def log_variant(self, var, stage, decision, reason=None, details=None):
+        """ write a record of the decision at a stage, for a traced variant
+
+        Args:
+            var: Variant or TrioGenotypes object
+            stage: name of the analysis stage
+            decision: "pass" or "fail"
+            reason: text for the reason for the decision, or None
+            details: dictionary of other values to record, or None
+        """
+
+        self.log(var.get_chrom(), var.get_position(), stage, decision, reason,
+            details)
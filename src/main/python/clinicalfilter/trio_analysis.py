@@ -0,0 +1,159 @@
+""" find candidate variants for a single trio, using the trio's inheritance
+
+This is shared by the ClinicalFilter, which runs through the families in a PED
+file, and the daemon, which analyses trios as they are requested. Classes using
+this need to define self.family, self.known_genes, self.cnv_regions and
+self.tracer (a Tracer object for the positions to trace, or None).
+"""
+
+import logging
+
+from clinicalfilter.inheritance import Allosomal, Autosomal
+
+class TrioAnalysis(object):
+    """ finds the variants in a trio that fit the inheritance models
+    """
+    
+    def find_candidates(self, variants):
+        """ find the candidate variants in each gene for a single trio
+        
+        Args:
+            variants: list of TrioGenotypes objects
+        
+        Returns:
+            list of (variant, check, inheritance) tuples, which can include
+            duplicates for variants checked in more than one gene.
+        """
+        
+        # organise variants by gene, then find variants that fit
+        # different inheritance models
+        genes_dict = self.create_gene_dict(variants)
+        found_vars = []
+        for gene in genes_dict:
+            gene_vars = genes_dict[gene]
+            found_vars += self.find_variants(gene_vars, gene)
+        
+        return found_vars
+    
+    def create_gene_dict(self, variants):
+        """creates dictionary of variants indexed by gene
+        
+        Args:
+            variants: list of TrioGenotypes objects
+        
+        Returns:
+            dictionary of variants indexed by HGNC symbols
+        """
+        
+        # organise the variants into entries for each gene
+        genes_dict = {}
+        for var in variants:
+            # cnvs can span mulitple genes, so we need to check each gene
+            # separately, and then collapse duplicates later
+            if var.is_cnv():
+                for gene in var.child.get_genes():
+                    if gene not in genes_dict:
+                        genes_dict[gene] = []
+                    # add the variant to the gene entry
+                    genes_dict[gene].append(var)
+                continue
+            # make sure that gene is in genes_dict
+            if var.get_gene() not in genes_dict:
+                genes_dict[var.get_gene()] = []
+            
+            # add the variant to the gene entry
+            genes_dict[var.get_gene()].append(var)
+        
+        return genes_dict
+        
+    def find_variants(self, variants, gene):
+        """ finds variants that fit inheritance models
+        
+        Args:
+            variants: list of TrioGenotype objects
+            gene: gene ID as string
+        
+        Returns:
+            list of variants that pass inheritance checks
+        """
+        
+        # get the inheritance for the gene (monoalleleic, biallelic, hemizygous
+        # etc), but allow for times when we haven't specified a list of genes
+        # to use
+        gene_inh = None
+        if self.known_genes is not None and gene in self.known_genes:
+            gene_inh = self.known_genes[gene]["inh"]
+        
+        # ignore intergenic variants
+        if gene is None:
+            if self.tracer is not None:
+                for var in variants:
+                    self.tracer.log_variant(var, "gene", "fail",
+                        "lacks HGNC/gene symbol")
+            return []
+        
+        logging.debug(self.family.child.get_id() + " " + gene + " " + \
+            str(variants) + " " + str(gene_inh))
+        chrom_inheritance = variants[0].get_inheritance_type()
+        
+        if chrom_inheritance == "autosomal":
+            finder = Autosomal(variants, self.family, self.known_genes, gene_inh, self.cnv_regions)
+        elif chrom_inheritance in ["XChrMale", "XChrFemale", "YChrMale"]:
+            finder = Allosomal(variants, self.family, self.known_genes, gene_inh, self.cnv_regions)
+        
+        candidates = finder.get_candidate_variants()
+        
+        if self.tracer is not None:
+            self.trace_candidates(variants, gene, candidates)
+        
+        return candidates
+    
+    def trace_candidates(self, variants, gene, candidates):
+        """ record the inheritance checks of a gene's variants for tracing
+        
+        Args:
+            variants: list of TrioGenotypes objects for the gene
+            gene: gene ID as string
+            candidates: list of (variant, check, inheritance) tuples, for the
+                variants which passed the inheritance checks
+        """
+        
+        for var in variants:
+            matches = [x for x in candidates if x[0] is var]
+            if len(matches) == 0:
+                self.tracer.log_variant(var, "inheritance", "fail", None,
+                    {"gene": gene})
+            for match, check, inh in matches:
+                self.tracer.log_variant(var, "inheritance", "pass", None,
+                    {"gene": gene, "check": check, "inheritance": inh})
+    
+    def exclude_duplicates(self, variants):
+        """ rejig variants included under multiple inheritance mechanisms
+        
+        Args:
+            variants: list of candidate variants
+        
+        Returns:
+            list of (variant, check_type, inheritance) tuples, with duplicates
+            excluded, and originals modified to show both mechanisms
+        """
+        
+        unique_vars = {}
+        for variant in variants:
+            key = variant[0].child.get_key()
+            if key not in unique_vars:
+                unique_vars[key] = list(variant)
+            else:
+                result = variant[1]
+                inh = variant[2]
+                
+                # append the check type and inheritance type to the first
+                # instance of the variant
+                if result not in unique_vars[key][1]:
+                    unique_vars[key][1] += "," + result
+                if inh not in unique_vars[key][2]:
+                    unique_vars[key][2] += "," +  inh
+        
+        unique_vars = [tuple(unique_vars[x]) for x in unique_vars]
+        
+        return unique_vars
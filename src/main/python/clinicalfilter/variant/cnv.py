@@ -144,22 +144,25 @@ class CNV(Variant, VariantInfo):
             boolean value for whether the variant passes the filters
         """
         
+        track_variant = self.tracer is not None and \
+            self.tracer.is_traced(self.get_chrom(), self.get_position())
+        
         # some CNVs are on female Y chrom, which give errors, fail those CNVs
         try:
             self.set_genotype()
-        except ValueError:
+        except ValueError as error:
+            if track_variant:
+                self.tracer.log_variant(self, "filters", "fail", str(error))
             return False
         
-        track_variant = False
-        if self.get_chrom() == self.debug_chrom and self.get_position() == self.debug_pos:
-            track_variant = True
-        
         passes = True
         if "CONVEX" in self.info and "CNSOLIDATE" not in self.info:
             # currently return false for all exome-only CNVs, undergoing testing
             filt = ExomeCNV(self)
             # passes = filt.filter_cnv(track_variant)
             passes = False
+            if track_variant:
+                self.tracer.log_variant(self, "filters", "fail", "exome-only CNV")
         elif "CNSOLIDATE" in self.info:
             filt = ACGH_CNV(self)
             passes = filt.filter_cnv(track_variant)
@@ -168,9 +171,13 @@ class CNV(Variant, VariantInfo):
             passes = filt.filter_cnv(track_variant)
         else:
             if track_variant:
-                print("CNV is not an aCGH or exome CNV")
+                self.tracer.log_variant(self, "filters", "fail",
+                    "CNV is not an aCGH or exome CNV")
             passes = False
         
+        if track_variant and passes:
+            self.tracer.log_variant(self, "filters", "pass")
+        
         return passes
     
     def is_het(self):
@@ -19,27 +19,35 @@ class ACGH_CNV(object):
         if self.fails_mad_ratio():
             passes = False
             if track_variant:
-                print("failed mad ratio", self.cnv.info["MEANLR2"], self.cnv.info["MADL2R"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "mad ratio", {"MEANLR2": self.cnv.info["MEANLR2"],
+                    "MADL2R": self.cnv.info["MADL2R"]})
         elif self.fails_wscore():
             passes = False
             if track_variant:
-                print("failed wscore", self.cnv.info["WSCORE"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "wscore", {"WSCORE": self.cnv.info["WSCORE"]})
         elif self.fails_callp():
             passes = False
             if track_variant:
-                print("failed callp", self.cnv.info["CALLP"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "callp", {"CALLP": self.cnv.info["CALLP"]})
         elif self.fails_commmon_forwards():
             passes = False
             if track_variant:
-                print("failed commonforwards", self.cnv.info["COMMONFORWARDS"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "commonforwards",
+                    {"COMMONFORWARDS": self.cnv.info["COMMONFORWARDS"]})
         elif self.fails_meanlr2():
             passes = False
             if track_variant:
-                print("failed meanlr2", self.cnv.info["MEANLR2"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "meanlr2", {"MEANLR2": self.cnv.info["MEANLR2"]})
         elif self.fails_no_exons():
             passes = False
             if track_variant:
-                print("failed no exons", self.cnv.info["NUMBEREXONS"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "no exons", {"NUMBEREXONS": self.cnv.info["NUMBEREXONS"]})
         
         return passes
     
@@ -20,19 +20,26 @@ class ExomeCNV(object):
         if self.fails_convex_score():
             passes = False
             if track_variant:
-                print("failed CONVEX score", self.cnv.info["CONVEX"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "CONVEX score", {"CONVEX": self.cnv.info["CONVEX"]})
         elif self.fails_population_frequency():
             passes = False
             if track_variant:
-                print("failed pop freq", self.cnv.info["RC50INTERNALFREQ"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "pop freq",
+                    {"RC50INTERNALFREQ": self.cnv.info["RC50INTERNALFREQ"]})
         elif self.fails_mad_ratio():
             passes = False
             if track_variant:
-                print("failed mad ratio", self.cnv.info["MEANLR2"], self.cnv.info["MADL2R"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "mad ratio", {"MEANLR2": self.cnv.info["MEANLR2"],
+                    "MADL2R": self.cnv.info["MADL2R"]})
         elif self.fails_commmon_forwards():
             passes = False
             if track_variant:
-                print("failed commonforwards", self.cnv.info["COMMONFORWARDS"])
+                self.cnv.tracer.log_variant(self.cnv, "filters", "fail",
+                    "commonforwards",
+                    {"COMMONFORWARDS": self.cnv.info["COMMONFORWARDS"]})
         # elif self.fails_no_exons():
         #     passes = False
         #     if track_variant:
@@ -86,3 +93,5 @@ class ExomeCNV(object):
         else:
             raise ValueError("Shouldn't reach here")
         
+        self.cnv.clear_derived_values()
+        
@@ -39,11 +39,31 @@ class VariantInfo(object):
     populations = set(["AFR_AF", "AMR_AF", "ASN_AF", "DDD_AF", "EAS_AF", \
         "ESP_AF", "EUR_AF", "MAX_AF", "SAS_AF", "UK10K_cohort_AF"])
     
-    # create static variables (which will be set externally before any class
-    # objects are created)
+    # defaults for the known genes, excluded genes and tracer, which loaders
+    # set on each variant (see LoadVCFs.configure_variant())
     known_genes = None
-    debug_chrom = None
-    debug_pos = None
+    excluded_genes = None
+    
+    # Tracer object for the positions to trace the filtering of, or None
+    tracer = None
+    
+    # values derived from the INFO, which are stored once a variant has passed
+    # the filters (see finalise_info())
+    derived = None
+    
+    def __getstate__(self):
+        """ drop the loader's settings when pickling the variant
+        
+        Variants from region workers are pickled back to the main process,
+        where they only need their values, not the known genes (which are
+        large) or the tracer (which holds locks, so can't be pickled).
+        """
+        
+        state = dict(self.__dict__)
+        for name in ["known_genes", "excluded_genes", "tracer", "passes_filters"]:
+            state.pop(name, None)
+        
+        return state
     
     def add_info(self, info_values):
         """Parses the INFO column from VCF files.
@@ -53,6 +73,7 @@ class VariantInfo(object):
             tags: the tags dict
         """
         
+        self.clear_derived_values()
         for item in info_values.split(";"):
             if "=" in item:
                 try:
@@ -68,6 +89,28 @@ class VariantInfo(object):
         self.set_consequence()
         self.set_gene_from_info()
     
+    def finalise_info(self):
+        """ stores the values derived from the INFO, once the INFO is complete
+        
+        The maximum allele frequency, the range of CNVs, and whether the
+        consequence is loss-of-function or missense are checked by the
+        filters, the inheritance checks and the output, so once a variant has
+        passed the filters we store them, rather than parsing the INFO again
+        for every check. Anything which changes the INFO or consequence
+        afterwards needs to call clear_derived_values().
+        """
+        
+        self.derived = None
+        self.derived = {"max_af": self.find_max_allele_frequency(),
+            "range": self.get_range(), "lof": self.is_lof(),
+            "missense": self.is_missense()}
+    
+    def clear_derived_values(self):
+        """ removes the stored values, after the INFO or consequence changes
+        """
+        
+        self.derived = None
+    
     def has_info(self):
         """ checks if the INFO field has been parsed and added to the object
         """
@@ -78,6 +121,9 @@ class VariantInfo(object):
         """ gets the range for the CNV
         """
         
+        if self.derived is not None:
+            return self.derived["range"]
+        
         start_position = self.get_position()
         
         if self.is_cnv():
@@ -167,6 +213,7 @@ class VariantInfo(object):
                 self.info["ENST"] = enst
         
         self.consequence = cq
+        self.clear_derived_values()
         
     def correct_multiple_alt(self, cq):
         """ gets correct consequence, HGNC and ensembl IDs for multiple alt vars
@@ -241,12 +288,18 @@ class VariantInfo(object):
         """ checks if a variant has a loss-of-function consequence
         """
         
+        if self.derived is not None:
+            return self.derived["lof"]
+        
         return self.consequence in self.lof_consequences
     
     def is_missense(self):
         """ checks if a variant has a missense-styled consequence
         """
         
+        if self.derived is not None:
+            return self.derived["missense"]
+        
         return self.consequence in self.missense_consequences
     
     def get_allele_frequency(self, values):
@@ -323,6 +376,9 @@ class VariantInfo(object):
             variant record
         """
         
+        if self.derived is not None:
+            return self.derived["max_af"]
+        
         max_freq = None
         # check all the populations with MAF values recorded for the variant 
         # (typically the 1000 Genomes populations (AFR_AF, EUR_AF etc), any
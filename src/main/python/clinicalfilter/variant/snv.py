@@ -179,11 +179,14 @@ class SNV(Variant, VariantInfo):
         
         return pass_value
     
-    def passes_filters_with_debug(self):
+    # keep the untraced method, to restore passes_filters() after tracing
+    passes_filters_without_trace = passes_filters
+    
+    def passes_filters_with_trace(self):
         """Checks whether a VCF record passes user defined criteria.
         
-        This method replaces passes_filters() when we specify a chromosome and
-        position for debugging the filtering.
+        This method replaces passes_filters() when we trace the filtering of
+        variants at some positions, so the filtering isn't slowed otherwise.
             
         Returns:
             boolean value for whether the variant passes the filters
@@ -191,18 +194,21 @@ class SNV(Variant, VariantInfo):
         
         pass_value, key = self.check_filters()
         
-        if pass_value == False and self.get_position() == self.debug_pos:
-            
-            if key == "MAF":
-                value = self.find_max_allele_frequency()
-            elif key == "consequence":
-                value = self.consequence
-            elif key == "FILTER":
-                value = self.filter
-            elif key == "HGNC":
-                value = "not in a known gene"
-            
-            print("failed {0}: {1}".format(key, value))
+        if self.tracer.is_traced(self.get_chrom(), self.get_position()):
+            if pass_value:
+                self.tracer.log_variant(self, "filters", "pass")
+            else:
+                if key == "MAF":
+                    value = self.find_max_allele_frequency()
+                elif key == "consequence":
+                    value = self.consequence
+                elif key == "FILTER":
+                    value = self.filter
+                elif key == "HGNC":
+                    value = "not in a known gene"
+                
+                self.tracer.log_variant(self, "filters", "fail", key,
+                    {"value": value})
         
         return pass_value
     
@@ -0,0 +1,536 @@
+""" indexes for fetching the VCF lines within a genomic region
+
+We can fetch regions from two sorts of VCF files:
+    bgzipped VCFs with a tabix index (path + ".tbi"), where we use the tabix
+        bins and linear index to find the compressed blocks for a region.
+    uncompressed VCFs, which we scan once to record the byte offset of every
+        Nth line, plus the span of any CNV lines (so we can find CNVs which
+        start before a region, but extend into it). The scan can be cached in
+        a file next to the VCF (path + ".cfidx"), which is used while the VCF's
+        size and modification time are unchanged.
+
+Both index types give the lines that overlap a region, ordered as in the VCF.
+"""
+
+import os
+import io
+import re
+import json
+import gzip
+import zlib
+import bisect
+import struct
+
+# the maximum position that tabix can index
+MAX_POSITION = 1 << 29
+
+# the INFO END field of CNVs
+END_PATTERN = re.compile("(?:^|;)END=([0-9]+)")
+
+# the suffix for the cached index of an uncompressed VCF
+PLAIN_INDEX_SUFFIX = ".cfidx"
+
+
+def get_record_end(fields):
+    """ find the last position covered by a VCF line
+
+    Args:
+        fields: list of at least the first eight elements of a VCF line
+
+    Returns:
+        last position of the record, from the INFO END field if present (as
+        for CNVs), otherwise from the length of the reference allele.
+    """
+
+    match = END_PATTERN.search(fields[7])
+    if match is not None:
+        return int(match.group(1))
+
+    return int(fields[1]) + len(fields[3]) - 1
+
+def open_vcf_index(path, cache=False):
+    """ get an index for a VCF file, if the VCF can be fetched by region
+
+    Args:
+        path: path to VCF file
+        cache: whether to load the index for an uncompressed VCF from the file
+            next to the VCF, and to write the index there if it is missing or
+            out of date.
+
+    Returns:
+        TabixIndex for bgzipped VCFs with a tabix index, PlainVCFIndex for
+        uncompressed VCFs, or None if we cannot fetch regions from the VCF (eg
+        gzipped VCFs without an index, or unsorted VCFs).
+    """
+
+    extension = os.path.splitext(path)[1]
+
+    index = None
+    if extension == ".gz" and os.path.exists(path + ".tbi"):
+        index = TabixIndex(path)
+    elif extension in [".vcf", ".txt"] and cache:
+        index = open_plain_index(path)
+    elif extension in [".vcf", ".txt"]:
+        index = PlainVCFIndex(path)
+
+    if index is not None and not index.is_valid():
+        index = None
+
+    return index
+
+def open_plain_index(path):
+    """ get the index for an uncompressed VCF, using the cache next to the VCF
+
+    Args:
+        path: path to uncompressed VCF
+
+    Returns:
+        PlainVCFIndex, loaded from the cache if the cache matches the VCF's
+        current size and modification time, otherwise from scanning the VCF.
+    """
+
+    cache_path = path + PLAIN_INDEX_SUFFIX
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime_ns]
+
+    try:
+        with open(cache_path, "r") as handle:
+            cached = json.load(handle)
+        if cached["key"] == key:
+            return PlainVCFIndex(path, cached=cached)
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    index = PlainVCFIndex(path)
+
+    # write to a temporary file first, since other processes might be writing
+    # or reading the cache for the same VCF
+    temp_path = cache_path + "." + str(os.getpid())
+    try:
+        with open(temp_path, "w") as handle:
+            json.dump(index.get_cache(key), handle)
+        os.replace(temp_path, cache_path)
+    except (IOError, OSError):
+        # we can still use the index if the VCF's folder isn't writable
+        pass
+
+    return index
+
+def is_bgzf(path):
+    """ check if a file is BGZF compressed, from the header of the first block
+
+    BGZF blocks are gzip members with an extra field, where the first extra
+    subfield is "BC", holding the size of the block.
+    """
+
+    with open(path, "rb") as handle:
+        header = handle.read(18)
+
+    return len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and \
+        header[12:14] == b"BC"
+
+def read_bgzf_block(handle):
+    """ read the BGZF block from the current position of a file
+
+    Args:
+        handle: file handle for a BGZF file, opened in binary mode, positioned
+            at the start of a block
+
+    Returns:
+        tuple of (raw deflate data, total size of the block), or None at the
+        end of the file
+    """
+
+    header = handle.read(18)
+    if len(header) < 18:
+        return None
+
+    # the total block size is held in the BC extra subfield, which
+    # immediately follows the fixed gzip header in BGZF files
+    block_size = struct.unpack("<H", header[16:18])[0] + 1
+    extra_size = struct.unpack("<H", header[10:12])[0]
+    body = handle.read(block_size - 18)
+
+    return body[extra_size - 6:-8], block_size
+
+
+class BgzfReader(object):
+    """ reads lines from a BGZF file, starting at tabix virtual offsets
+
+    A BGZF file is a series of gzip blocks, each less than 64 kb. A virtual
+    offset is the compressed offset of a block shifted left 16 bits, plus the
+    offset of a position within the uncompressed block.
+    """
+
+    def __init__(self, path):
+        self.handle = open(path, "rb")
+        self.block_offset = 0
+        self.next_block_offset = 0
+        self.data = b""
+        self.within = 0
+
+    def close(self):
+        self.handle.close()
+
+    def load_block(self, offset):
+        """ decompress the BGZF block which starts at a compressed offset
+
+        Args:
+            offset: offset of the block in the compressed file
+        """
+
+        self.handle.seek(offset)
+        block = read_bgzf_block(self.handle)
+
+        self.block_offset = offset
+        self.within = 0
+        if block is None:
+            # we have reached the end of the file
+            self.data = b""
+            self.next_block_offset = offset
+            return
+
+        compressed, block_size = block
+        self.data = zlib.decompress(compressed, -15)
+        self.next_block_offset = offset + block_size
+
+    def seek(self, virtual_offset):
+        """ move to a virtual offset in the file
+        """
+
+        self.load_block(virtual_offset >> 16)
+        self.within = virtual_offset & 0xFFFF
+
+    def tell(self):
+        """ get the virtual offset for the start of the next line
+        """
+
+        # if we are at the end of a block, the next line starts in the next
+        # block, so make sure we report the offset within that block
+        while self.within >= len(self.data) and self.next_block_offset != self.block_offset:
+            self.load_block(self.next_block_offset)
+
+        return (self.block_offset << 16) | self.within
+
+    def readline(self):
+        """ read the next line from the file, as bytes
+        """
+
+        parts = []
+        while True:
+            end = self.data.find(b"\n", self.within)
+            if end != -1:
+                parts.append(self.data[self.within:end + 1])
+                self.within = end + 1
+                break
+
+            parts.append(self.data[self.within:])
+            self.within = len(self.data)
+            if self.next_block_offset == self.block_offset:
+                break
+            self.load_block(self.next_block_offset)
+
+        return b"".join(parts)
+
+
+def reg2bins(start, end):
+    """ find the tabix bins which could hold records overlapping a region
+
+    Args:
+        start: zero-based start of the region
+        end: zero-based, exclusive end of the region
+
+    Returns:
+        list of bin numbers
+    """
+
+    end -= 1
+    bins = [0]
+    for shift, offset in [(26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)]:
+        bins += range(offset + (start >> shift), offset + (end >> shift) + 1)
+
+    return bins
+
+
+class TabixIndex(object):
+    """ fetches regions from a bgzipped VCF, using the tabix index
+    """
+
+    def __init__(self, path):
+        """ load the tabix index for a bgzipped VCF
+
+        Args:
+            path: path to bgzipped VCF, with a tabix index at path + ".tbi"
+        """
+
+        self.path = path
+        self.chroms = []
+        self.bins = {}
+        self.linear = {}
+        self.valid = True
+
+        with gzip.open(path + ".tbi", "rb") as handle:
+            data = handle.read()
+
+        if data[:4] != b"TBI\x01":
+            self.valid = False
+            return
+
+        n_ref, file_format = struct.unpack("<ii", data[4:12])
+        name_length = struct.unpack("<i", data[32:36])[0]
+
+        # we only fetch from indexes made with the VCF preset
+        if file_format & 0xFFFF != 2:
+            self.valid = False
+            return
+
+        names = data[36:36 + name_length].split(b"\x00")
+        self.chroms = [x.decode("utf-8") for x in names if x != b""]
+
+        offset = 36 + name_length
+        for chrom in self.chroms:
+            bins = {}
+            n_bin = struct.unpack("<i", data[offset:offset + 4])[0]
+            offset += 4
+            for _ in range(n_bin):
+                bin_number, n_chunk = struct.unpack("<Ii", data[offset:offset + 8])
+                offset += 8
+                chunks = struct.unpack("<" + "Q" * (2 * n_chunk),
+                    data[offset:offset + 16 * n_chunk])
+                offset += 16 * n_chunk
+
+                # skip the pseudo-bin, which holds metadata, not records
+                if bin_number != 37450:
+                    bins[bin_number] = list(zip(chunks[::2], chunks[1::2]))
+
+            n_intv = struct.unpack("<i", data[offset:offset + 4])[0]
+            offset += 4
+            linear = struct.unpack("<" + "Q" * n_intv, data[offset:offset + 8 * n_intv])
+            offset += 8 * n_intv
+
+            self.bins[chrom] = bins
+            self.linear[chrom] = linear
+
+    def is_valid(self):
+        return self.valid
+
+    def get_chunks(self, chrom, start, end):
+        """ find the merged file chunks that might hold records in a region
+
+        Args:
+            chrom: chromosome to fetch
+            start: one-based start of the region
+            end: one-based, inclusive end of the region, or None to fetch to
+                the end of the chromosome
+
+        Returns:
+            list of (start, end) virtual offset tuples
+        """
+
+        if chrom not in self.bins:
+            return []
+
+        if end is None:
+            end = MAX_POSITION
+
+        begin = start - 1
+
+        # the linear index gives the smallest offset of a record overlapping
+        # each 16 kb window, so we can skip chunks ending before that offset
+        linear = self.linear[chrom]
+        min_offset = 0
+        if len(linear) > 0:
+            min_offset = linear[min(begin >> 14, len(linear) - 1)]
+
+        chunks = []
+        for bin_number in reg2bins(begin, end):
+            for chunk in self.bins[chrom].get(bin_number, []):
+                if chunk[1] > min_offset:
+                    chunks.append((max(chunk[0], min_offset), chunk[1]))
+
+        chunks.sort()
+        merged = []
+        for chunk in chunks:
+            if len(merged) > 0 and chunk[0] <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk[1]))
+            else:
+                merged.append(chunk)
+
+        return merged
+
+    def fetch(self, chrom, start, end):
+        """ get the lines for records overlapping a region
+
+        Args:
+            chrom: chromosome to fetch
+            start: one-based start of the region
+            end: one-based, inclusive end of the region, or None to fetch to
+                the end of the chromosome
+
+        Returns:
+            iterator of VCF lines (as strings)
+        """
+
+        reader = BgzfReader(self.path)
+        try:
+            for chunk_start, chunk_end in self.get_chunks(chrom, start, end):
+                reader.seek(chunk_start)
+                while reader.tell() < chunk_end:
+                    line = reader.readline()
+                    if len(line) == 0:
+                        break
+
+                    line = line.decode("latin_1")
+                    fields = line.split("\t", 8)
+                    if fields[0] != chrom:
+                        continue
+                    if end is not None and int(fields[1]) > end:
+                        break
+                    if get_record_end(fields) < start:
+                        continue
+
+                    yield line
+        finally:
+            reader.close()
+
+
+class PlainVCFIndex(object):
+    """ fetches regions from an uncompressed VCF, using byte offsets
+    """
+
+    def __init__(self, path, spacing=1000, cached=None):
+        """ scan through a VCF to record the byte offsets of lines
+
+        Args:
+            path: path to uncompressed VCF
+            spacing: number of lines between recorded offsets
+            cached: dictionary of a previous scan of the VCF, from get_cache(),
+                or None to scan the VCF
+        """
+
+        self.path = path
+        self.chroms = []
+        self.positions = {}
+        self.offsets = {}
+        self.cnvs = {}
+        self.valid = True
+
+        if cached is not None:
+            self.chroms = cached["chroms"]
+            self.positions = cached["positions"]
+            self.offsets = cached["offsets"]
+            self.cnvs = dict((chrom, [tuple(x) for x in cnvs])
+                for chrom, cnvs in cached["cnvs"].items())
+            self.valid = cached["valid"]
+            return
+
+        with open(path, "rb") as handle:
+            offset = 0
+            chrom = None
+            previous = 0
+            count = 0
+            for line in handle:
+                line_offset = offset
+                offset += len(line)
+                if line.startswith(b"#"):
+                    continue
+
+                fields = line.split(b"\t", 5)
+                position = int(fields[1])
+                if fields[0] != chrom:
+                    chrom = fields[0]
+                    key = chrom.decode("latin_1")
+                    if key in self.positions:
+                        # the VCF is not sorted by chromosome
+                        self.valid = False
+                        return
+                    self.chroms.append(key)
+                    self.positions[key] = []
+                    self.offsets[key] = []
+                    self.cnvs[key] = []
+                    previous = 0
+                    count = 0
+
+                if position < previous:
+                    # the VCF is not sorted by position
+                    self.valid = False
+                    return
+                previous = position
+
+                if count % spacing == 0:
+                    self.positions[key].append(position)
+                    self.offsets[key].append(line_offset)
+                count += 1
+
+                # record the span of CNVs, since they can extend into later
+                # regions of the chromosome
+                if fields[4] in [b"<DUP>", b"<DEL>"]:
+                    info = fields[5].split(b"\t")[2].decode("latin_1")
+                    match = END_PATTERN.search(info)
+
+                    # CNVs without an END field are treated as 10 kb long
+                    end = position + 10000
+                    if match is not None:
+                        end = int(match.group(1))
+                    self.cnvs[key].append((position, end, line_offset))
+
+    def is_valid(self):
+        return self.valid
+
+    def get_cache(self, key):
+        """ get the scan of the VCF as a dictionary, for caching as JSON
+
+        Args:
+            key: list of the VCF's size and modification time, which the cache
+                needs to match to be used
+
+        Returns:
+            dictionary of the recorded offsets, which can be passed back to
+            the constructor.
+        """
+
+        return {"key": key, "chroms": self.chroms, "positions": self.positions,
+            "offsets": self.offsets, "cnvs": self.cnvs, "valid": self.valid}
+
+    def fetch(self, chrom, start, end):
+        """ get the lines for records overlapping a region
+
+        Args:
+            chrom: chromosome to fetch
+            start: one-based start of the region
+            end: one-based, inclusive end of the region, or None to fetch to
+                the end of the chromosome
+
+        Returns:
+            iterator of VCF lines (as strings)
+        """
+
+        if chrom not in self.positions:
+            return
+
+        handle = io.open(self.path, "r", encoding="latin_1")
+        try:
+            # first get the CNVs which start before the region, but overlap it
+            for cnv_start, cnv_end, offset in self.cnvs[chrom]:
+                if cnv_start >= start:
+                    break
+                if cnv_end >= start:
+                    handle.seek(offset)
+                    yield handle.readline()
+
+            # then start from the last recorded line before the region
+            index = max(bisect.bisect_left(self.positions[chrom], start) - 1, 0)
+            handle.seek(self.offsets[chrom][index])
+            for line in handle:
+                fields = line.split("\t", 2)
+                if fields[0] != chrom:
+                    break
+                position = int(fields[1])
+                if position < start:
+                    continue
+                if end is not None and position > end:
+                    break
+
+                yield line
+        finally:
+            handle.close()
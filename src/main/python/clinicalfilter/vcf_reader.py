@@ -0,0 +1,291 @@
+""" readers which give the variant lines of VCF files as bytes
+
+Most VCF lines are rejected after looking at a few fields (eg the parents'
+lines which aren't at any of the child's sites), so we read the lines as
+bytes, and only decode the lines which we keep.
+"""
+
+import os
+import mmap
+import zlib
+
+from clinicalfilter.vcf_index import is_bgzf, read_bgzf_block
+
+# the number of bytes to split into lines at a time
+CHUNK_SIZE = 1 << 20
+
+# the number of compressed bytes to read at a time from gzipped VCFs
+GZIP_CHUNK_SIZE = 1 << 18
+
+# zlib window bits for decompressing a gzip member (with its header)
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# the number of BGZF blocks (each up to 64 kb) to decompress per thread at a
+# time
+BLOCKS_PER_THREAD = 4
+
+
+def iterate_gzip_data(handle, chunk_size=GZIP_CHUNK_SIZE):
+    """ iterate through the decompressed data of a gzip file, in large chunks
+
+    Gzip files can have several members, one after another (eg BGZF files,
+    which are a series of small members, or files which were concatenated),
+    so once a member ends, we start decompressing the next member from the
+    remaining data.
+
+    Args:
+        handle: file handle for a gzip file, opened in binary mode
+        chunk_size: number of compressed bytes to read at a time
+
+    Returns:
+        iterator of decompressed chunks, as bytes
+    """
+
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    started = False
+    while True:
+        compressed = handle.read(chunk_size)
+        if len(compressed) == 0:
+            break
+
+        while len(compressed) > 0:
+            if not started:
+                # gzip files can be padded with null bytes after a member
+                compressed = compressed.lstrip(b"\x00")
+                if len(compressed) == 0:
+                    break
+                started = True
+
+            data = decompressor.decompress(compressed)
+            if len(data) > 0:
+                yield data
+
+            compressed = b""
+            if decompressor.eof:
+                compressed = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                started = False
+
+    if started:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+def inflate_block(compressed):
+    """ decompress the raw deflate data of a BGZF block
+    """
+
+    return zlib.decompress(compressed, -15)
+
+def iterate_bgzf_data(handle, pool, threads):
+    """ iterate through the decompressed data of a BGZF file, using threads
+
+    BGZF blocks are compressed independently, so we can decompress a batch of
+    blocks at once in a pool of threads (zlib releases the GIL while it
+    decompresses). The next batch is decompressed while the current batch is
+    split into lines, and the batches are given in file order.
+
+    Args:
+        handle: file handle for a BGZF file, opened in binary mode
+        pool: ThreadPool to decompress the blocks in
+        threads: number of threads in the pool
+
+    Returns:
+        iterator of decompressed chunks, as bytes
+    """
+
+    batch_size = threads * BLOCKS_PER_THREAD
+
+    pending = None
+    while True:
+        batch = []
+        while len(batch) < batch_size:
+            block = read_bgzf_block(handle)
+            if block is None:
+                break
+            batch.append(block[0])
+
+        current = None
+        if len(batch) > 0:
+            current = pool.map_async(inflate_block, batch)
+
+        if pending is not None:
+            yield b"".join(pending.get())
+
+        if current is None:
+            break
+        pending = current
+
+def split_lines(chunks):
+    """ split chunks of data into batches of lines, without the header
+
+    Args:
+        chunks: iterator of chunks of data from a VCF, as bytes
+
+    Returns:
+        iterator of lists of lines, as bytes without the newlines. The lines
+        start after the header lines.
+    """
+
+    in_header = True
+    remainder = b""
+    for data in chunks:
+        lines = (remainder + data).split(b"\n")
+        remainder = lines.pop()
+
+        if in_header:
+            lines = drop_header(lines)
+            if len(lines) == 0:
+                continue
+            in_header = False
+
+        if len(lines) > 0:
+            yield lines
+
+    if len(remainder) > 0 and not (in_header and remainder.startswith(b"#")):
+        yield [remainder]
+
+def drop_header(lines):
+    """ drop the header lines from the start of a list of lines
+
+    Returns:
+        list of the lines after the header, which is empty if every line is
+        a header line.
+    """
+
+    for i, line in enumerate(lines):
+        if not line.startswith(b"#"):
+            return lines[i:]
+
+    return []
+
+
+class MappedVCF(object):
+    """ reads the variant lines of an uncompressed VCF, through a memory map
+
+    We find the end of the header once, when the VCF is opened, then iterate
+    from that offset, splitting the lines from the mapped file.
+    """
+
+    def __init__(self, path):
+        """ map the VCF, and find where the header ends
+
+        Args:
+            path: path to uncompressed VCF file
+        """
+
+        self.handle = open(path, "rb")
+
+        # empty files can't be mapped
+        self.data = b""
+        if os.fstat(self.handle.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.header_end = self.find_header_end()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.handle.close()
+
+    def find_header_end(self):
+        """ find the offset of the first line after the header
+
+        Returns:
+            offset of the first variant line, or the file size if the VCF only
+            has a header.
+        """
+
+        offset = 0
+        while self.data[offset:offset + 1] == b"#":
+            end = self.data.find(b"\n", offset)
+            if end == -1:
+                return len(self.data)
+            offset = end + 1
+
+        return offset
+
+    def __iter__(self):
+        """ iterate through the variant lines, as bytes without the newlines
+
+        We split the lines from large chunks of the file at a time, since
+        splitting a chunk is much quicker than finding each line end in turn.
+        """
+
+        data = self.data
+        size = len(data)
+        start = self.header_end
+        while start < size:
+            # end the chunk at the last complete line within the chunk size,
+            # or at the end of the first line, if that is longer
+            end = size
+            if start + CHUNK_SIZE < size:
+                end = data.rfind(b"\n", start, start + CHUNK_SIZE) + 1
+                if end == 0:
+                    end = data.find(b"\n", start + CHUNK_SIZE) + 1
+                    if end == 0:
+                        end = size
+
+            lines = data[start:end].split(b"\n")
+            if lines[-1] == b"":
+                lines.pop()
+
+            for line in lines:
+                yield line
+
+            start = end
+
+
+class GzipVCF(object):
+    """ reads the variant lines of a gzipped VCF, as bytes
+
+    Iterating through gzip.open() in text mode passes every line through the
+    GzipFile and TextIOWrapper layers. Instead we decompress large chunks
+    with zlib, and split each chunk into lines at once.
+
+    BGZF files can be decompressed a batch of blocks at a time in a pool of
+    threads, which keeps the lines in file order.
+    """
+
+    def __init__(self, path, chunk_size=GZIP_CHUNK_SIZE, pool=None, threads=1):
+        """ open the VCF
+
+        Args:
+            path: path to gzipped VCF file (including BGZF files)
+            chunk_size: number of compressed bytes to read at a time
+            pool: ThreadPool for decompressing the blocks of BGZF files in
+                parallel, or None to decompress serially. Other gzip files
+                are always decompressed serially.
+            threads: number of threads in the pool
+        """
+
+        self.handle = open(path, "rb")
+        self.chunk_size = chunk_size
+        self.pool = pool
+        self.threads = threads
+
+        if self.pool is not None and not is_bgzf(path):
+            self.pool = None
+
+    def close(self):
+        self.handle.close()
+
+    def iterate_batches(self):
+        """ iterate through batches of the variant lines
+
+        Returns:
+            iterator of lists of lines, as bytes without the newlines
+        """
+
+        if self.pool is not None:
+            chunks = iterate_bgzf_data(self.handle, self.pool, self.threads)
+        else:
+            chunks = iterate_gzip_data(self.handle, self.chunk_size)
+
+        return split_lines(chunks)
+
+    def __iter__(self):
+        """ iterate through the variant lines, as bytes without the newlines
+        """
+
+        for batch in self.iterate_batches():
+            for line in batch:
+                yield line
@@ -0,0 +1,285 @@
+""" a queue of families shared between workers on different nodes
+
+Workers on any number of nodes share a SQLite database on a shared filesystem.
+Each worker claims a family at a time from the database, analyses it, and
+marks it done, so faster nodes take more families, and nodes can join a run
+late. A claimed family holds a lease, which the worker renews while it analyses
+the family. If a worker dies, its lease expires and the family returns to the
+queue for another worker, until the family has been attempted too many times.
+
+Usage (on each node):
+
+python clinical_filter.py \\
+    --worker /shared/cohort.queue.db \\
+    --ped /shared/cohort.ped \\
+    --output /shared/clinical_reporting.txt \\
+    --known-genes known_genes.txt
+
+SQLite relies on file locks, so the shared filesystem needs to support POSIX
+locks across nodes (eg Lustre mounted with flock, or NFSv4).
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def get_worker_id():
+    """ get an ID for the current worker, which is unique across nodes
+    """
+
+    return socket.gethostname() + ":" + str(os.getpid())
+
+def estimate_cost(family):
+    """ estimate the cost of analysing a family from the size of its VCFs
+
+    Args:
+        family: Family object
+
+    Returns:
+        total size of the family's VCFs in bytes
+    """
+
+    cost = 0
+    for person in family.children + [family.mother, family.father]:
+        if person is not None and os.path.exists(person.get_path()):
+            cost += os.path.getsize(person.get_path())
+
+    return cost
+
+
+class WorkQueue(object):
+    """ claims families from a SQLite database shared by the workers
+    """
+
+    def __init__(self, path, lease=600, max_attempts=3, timeout=60):
+        """ open (and create if needed) the queue database
+
+        Args:
+            path: path to the SQLite database
+            lease: seconds a worker holds a family for, before other workers
+                can claim it. Workers renew the lease while they analyse the
+                family.
+            max_attempts: number of times a family can be claimed, before we
+                mark it as failed.
+            timeout: seconds to wait for other workers to release the database
+        """
+
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+        # we manage the transactions ourselves, so that claims are atomic
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("CREATE TABLE IF NOT EXISTS families (family_id TEXT "
+            "PRIMARY KEY, status TEXT, worker TEXT, lease_expires REAL, "
+            "attempts INTEGER, cost INTEGER, result TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS merges (name TEXT PRIMARY "
+            "KEY, worker TEXT)")
+
+    def get_poll_interval(self):
+        """ get the seconds to wait before checking for expired leases
+        """
+
+        return min(5.0, self.lease / 4.0)
+
+    def add_families(self, families):
+        """ add families to the queue, unless an earlier worker added them
+
+        If any families are new to the queue (eg a PED file extended after an
+        earlier run finished), the outputs need merging again, so we clear the
+        claim on the merge.
+
+        Args:
+            families: dictionary of Family objects, indexed by family ID
+        """
+
+        rows = [(family_id, PENDING, 0, estimate_cost(families[family_id]))
+            for family_id in sorted(families)]
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.db.executemany("INSERT OR IGNORE INTO families "
+                "(family_id, status, attempts, cost) VALUES (?, ?, ?, ?)", rows)
+            if cursor.rowcount > 0:
+                self.db.execute("DELETE FROM merges")
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+
+        self.db.execute("COMMIT")
+
+    def claim(self, worker):
+        """ claim the largest pending family, or a family with an expired lease
+
+        Args:
+            worker: ID for the worker claiming the family
+
+        Returns:
+            ID of the claimed family, or None if no family can be claimed
+        """
+
+        now = time.time()
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # families whose workers keep dying don't get claimed again
+            self.db.execute("UPDATE families SET status = ? WHERE status = ? "
+                "AND lease_expires < ? AND attempts >= ?",
+                (FAILED, RUNNING, now, self.max_attempts))
+
+            row = self.db.execute("SELECT family_id FROM families WHERE "
+                "status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY cost DESC, family_id LIMIT 1",
+                (PENDING, RUNNING, now)).fetchone()
+
+            if row is not None:
+                self.db.execute("UPDATE families SET status = ?, worker = ?, "
+                    "lease_expires = ?, attempts = attempts + 1 WHERE "
+                    "family_id = ?", (RUNNING, worker, now + self.lease, row[0]))
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+
+        self.db.execute("COMMIT")
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def renew(self, family_id, worker):
+        """ extend the lease on a family, if the worker still holds it
+
+        Returns:
+            True/False for whether the worker still holds the family
+        """
+
+        cursor = self.db.execute("UPDATE families SET lease_expires = ? WHERE "
+            "family_id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease, family_id, worker, RUNNING))
+
+        return cursor.rowcount == 1
+
+    def complete(self, family_id, worker, result):
+        """ mark a family as done, if the worker still holds it
+
+        Args:
+            family_id: ID of the family
+            worker: ID of the worker
+            result: path to the family's output
+
+        Returns:
+            True/False for whether the worker still held the family
+        """
+
+        cursor = self.db.execute("UPDATE families SET status = ?, result = ? "
+            "WHERE family_id = ? AND worker = ? AND status = ?",
+            (DONE, result, family_id, worker, RUNNING))
+
+        return cursor.rowcount == 1
+
+    def release(self, family_id, worker):
+        """ return a family that failed to the queue, so it can be retried
+
+        Families which have used all their attempts are marked as failed.
+        """
+
+        self.db.execute("UPDATE families SET status = CASE WHEN attempts >= ? "
+            "THEN ? ELSE ? END, lease_expires = NULL WHERE family_id = ? "
+            "AND worker = ? AND status = ?",
+            (self.max_attempts, FAILED, PENDING, family_id, worker, RUNNING))
+
+    def is_finished(self):
+        """ check if every family is done, or has failed
+        """
+
+        row = self.db.execute("SELECT COUNT(*) FROM families WHERE status IN "
+            "(?, ?)", (PENDING, RUNNING)).fetchone()
+
+        return row[0] == 0
+
+    def claim_merge(self, worker):
+        """ claim the merge of the family outputs, which only one worker does
+
+        Returns:
+            True if this worker should merge the outputs
+        """
+
+        cursor = self.db.execute("INSERT OR IGNORE INTO merges (name, worker) "
+            "VALUES (?, ?)", ("output", worker))
+
+        return cursor.rowcount == 1
+
+    def get_results(self):
+        """ get the output paths for the finished families, in family order
+        """
+
+        rows = self.db.execute("SELECT result FROM families WHERE status = ? "
+            "ORDER BY family_id", (DONE, ))
+
+        return [row[0] for row in rows]
+
+    def get_failed(self):
+        """ get the IDs of the families which failed every attempt
+        """
+
+        rows = self.db.execute("SELECT family_id FROM families WHERE status = ? "
+            "ORDER BY family_id", (FAILED, ))
+
+        return [row[0] for row in rows]
+
+    def close(self):
+        """ close the connection to the database
+        """
+
+        self.db.close()
+
+
+class LeaseHeartbeat(object):
+    """ renews the lease on a family in a background thread
+    """
+
+    def __init__(self, path, family_id, worker, lease):
+        """ start renewing the lease
+
+        Args:
+            path: path to the SQLite database
+            family_id: ID of the family the worker holds
+            worker: ID of the worker
+            lease: seconds the lease lasts for, we renew three times per lease
+        """
+
+        self.path = path
+        self.family_id = family_id
+        self.worker = worker
+        self.lease = lease
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """ renew the lease until we are stopped
+        """
+
+        # SQLite connections can't be shared between threads, so we use our own
+        queue = WorkQueue(self.path, self.lease)
+        while not self.stopped.wait(self.lease / 3.0):
+            if not queue.renew(self.family_id, self.worker):
+                break
+        queue.close()
+
+    def stop(self):
+        """ stop renewing the lease
+        """
+
+        self.stopped.set()
+        self.thread.join()
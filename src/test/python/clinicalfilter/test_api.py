@@ -0,0 +1,177 @@
+""" unit testing of the python API for analysing trios
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+
+from clinicalfilter.api import analyse_families, TrioAnalyser
+from clinicalfilter.ped import Family
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.variant.cnv import CNV
+from clinicalfilter.trace import Tracer
+
+HEADER = "##fileformat=VCFv4.1\n" \
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"
+
+
+class TestApiPy(unittest.TestCase):
+    """ test analysing trios through the API
+    """
+
+    def setUp(self):
+        """ make a temporary directory, with families of single probands
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.known_genes = {"ATRX": {"inh": {"Monoallelic": set(["Loss of function"])},
+            "status": set(["Confirmed DD Gene"]), "start": 100, "end": 200,
+            "chrom": "1"}}
+
+        lof = "CQ=stop_gained;HGNC=ATRX;MAX_AF=0.0001"
+        missense = "CQ=missense_variant;HGNC=OTHER;MAX_AF=0.0001"
+
+        self.families = {}
+        for family_id, info, pos in [("fam1", lof, "150"), ("fam2", missense, "5000")]:
+            path = os.path.join(self.temp_dir, family_id + ".vcf")
+            with open(path, "w") as handle:
+                handle.write(HEADER + "1\t" + pos + "\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n")
+
+            family = Family(family_id)
+            family.add_child(family_id + "_child", path, "2", "F")
+            self.families[family_id] = family
+
+        SNV.known_genes = None
+        CNV.known_genes = None
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def test_analyse_families(self):
+        """ check that we get the candidates for each proband
+        """
+
+        results = list(analyse_families(self.families, self.known_genes, set()))
+
+        self.assertEqual([x[0].child.get_id() for x in results],
+            ["fam1_child", "fam2_child"])
+
+        family, candidates = results[0]
+        self.assertEqual(len(candidates), 1)
+        var, check, inheritance = candidates[0]
+        self.assertEqual(var.get_gene(), "ATRX")
+        self.assertEqual(inheritance, "Monoallelic")
+
+        # the missense variant isn't in a known gene
+        self.assertEqual(results[1][1], [])
+
+        # the original families are unchanged
+        for family in self.families.values():
+            self.assertIsNone(family.child)
+            self.assertFalse(family.children[0].is_analysed())
+
+        # we can also analyse lists of families
+        results = list(analyse_families(list(self.families.values()),
+            self.known_genes, set()))
+        self.assertEqual(len(results), 2)
+
+    def test_analyse_families_lazily(self):
+        """ check that we analyse probands as they are requested
+        """
+
+        results = analyse_families(self.families, None, None)
+        family, candidates = next(results)
+        self.assertEqual(family.family_id, "fam1")
+
+        # without known genes, the missense variant is a candidate
+        family, candidates = next(results)
+        self.assertEqual(len(candidates), 1)
+
+        with self.assertRaises(StopIteration):
+            next(results)
+
+    def test_variant_classes_unchanged(self):
+        """ check that analysing trios doesn't change the variant classes
+        """
+
+        names = ["known_genes", "excluded_genes", "tracer", "passes_filters"]
+        before = [(name, cls.__dict__.get(name, "unset")) for cls in [SNV, CNV]
+            for name in names]
+
+        results = analyse_families(self.families, self.known_genes, set(),
+            debug_chrom="1", debug_pos=150)
+        family, candidates = next(results)
+        self.assertEqual(len(candidates), 1)
+
+        after = [(name, cls.__dict__.get(name, "unset")) for cls in [SNV, CNV]
+            for name in names]
+        self.assertEqual(after, before)
+
+    def test_concurrent_analysers(self):
+        """ check that analysers with different known genes can run in threads
+        """
+
+        # write a proband with a LoF variant in each of many genes, and split
+        # the genes between two known genes lists
+        lines = []
+        gene_lists = [{}, {}]
+        for i in range(200):
+            gene = "GENE" + str(i)
+            start = 1000 + i * 1000
+            gene_lists[i % 2][gene] = {"inh": {"Monoallelic":
+                set(["Loss of function"])}, "status": set(["Confirmed DD Gene"]),
+                "start": start, "end": start + 500, "chrom": "1"}
+            lines.append("1\t" + str(start + 100) + "\t.\tA\tG\t50\tPASS\t" \
+                "CQ=stop_gained;HGNC=" + gene + ";MAX_AF=0.0001\tGT\t0/1\n")
+
+        path = os.path.join(self.temp_dir, "many.vcf")
+        with open(path, "w") as handle:
+            handle.write(HEADER + "".join(lines))
+
+        family = Family("many")
+        family.add_child("many_child", path, "2", "F")
+        family.set_child()
+
+        def get_genes(known_genes):
+            candidates = TrioAnalyser(known_genes, set()).analyse(family)
+            return sorted(var.get_gene() for var, check, inheritance in candidates)
+
+        expected = [get_genes(x) for x in gene_lists]
+        self.assertEqual(expected, [sorted(x) for x in gene_lists])
+
+        results = {}
+        errors = []
+        def run(index, known_genes):
+            try:
+                for attempt in range(5):
+                    results[(index, attempt)] = get_genes(known_genes)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(i, gene_lists[i]))
+            for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for (index, attempt), genes in results.items():
+            self.assertEqual(genes, expected[index])
+
+    def test_pp_filter(self):
+        """ check that we need a PP_DNM threshold between 0 and 1
+        """
+
+        with self.assertRaises(ValueError):
+            TrioAnalyser(pp_filter=1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+""" unit testing of clustering CNVs across a cohort
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.variant.cnv import CNV
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trio_genotypes import TrioGenotypes
+from clinicalfilter.cnv_clusters import CNVClusters, get_cnvs
+
+
+class TestCnvClustersPy(unittest.TestCase):
+    """ test clustering overlapping, similar-sized CNVs
+    """
+
+    def setUp(self):
+        """ make a temporary directory
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def cnv(self, start, end, cnv_type="DEL", chrom="1", gene=None):
+        """ make a CNV dictionary
+        """
+
+        return {"chrom": chrom, "start": start, "end": end, "type": cnv_type,
+            "gene": gene}
+
+    def test_get_cnvs(self):
+        """ check that we get the CNVs from a proband's variants
+        """
+
+        cnv = CNV("1", "15000000", ".", "A", "<DUP>", "PASS")
+        cnv.add_info("HGNC=TEST;END=16000000")
+        cnv.add_format("INHERITANCE:DP", "unknown:50")
+        cnv.set_gender("F")
+        cnv.set_genotype()
+
+        snv = SNV("1", "15000000", ".", "A", "G", "PASS")
+        snv.add_info("HGNC=TEST;CQ=missense_variant")
+        snv.add_format("GT", "0/1")
+        snv.set_gender("F")
+        snv.set_genotype()
+
+        variants = [TrioGenotypes(cnv), TrioGenotypes(snv)]
+        self.assertEqual(get_cnvs(variants), [self.cnv(15000000, 16000000,
+            "DUP", gene="TEST")])
+
+    def test_get_clusters(self):
+        """ check that we link overlapping CNVs with similar sizes and types
+        """
+
+        clusters = CNVClusters()
+        clusters.add_proband("fam1", "child1", [self.cnv(1000000, 2000000),
+            self.cnv(5000000, 5100000)])
+        clusters.add_proband("fam2", "child2", [self.cnv(1010000, 2005000)])
+        # the first CNV is too small to match the first cluster, and the
+        # second CNV is a duplication
+        clusters.add_proband("fam3", "child3", [self.cnv(1500000, 1600000),
+            self.cnv(1000000, 2000000, "DUP")])
+        # only overlaps the second proband's CNV, but still joins the cluster
+        clusters.add_proband("fam4", "child4", [self.cnv(1011000, 2020000)])
+        clusters.add_proband("fam5", "child5", [self.cnv(1000000, 2000000, chrom="2")])
+
+        found = [[clusters.cnvs[i][0] for i in x] for x in clusters.get_clusters()]
+        self.assertEqual(found, [["child1", "child2", "child4"], ["child3"],
+            ["child3"], ["child1"], ["child5"]])
+
+    def test_write_summary(self):
+        """ check the table of clusters
+        """
+
+        clusters = CNVClusters()
+        clusters.add_proband("fam1", "child1", [self.cnv(1000000, 2000000, gene="A,B")])
+        clusters.add_proband("fam2", "child2", [self.cnv(5000000, 5100000)])
+        clusters.add_proband("fam3", "child3", [self.cnv(1010000, 2005000, gene="C")])
+
+        path = os.path.join(self.temp_dir, "clusters.txt")
+        clusters.write_summary(path)
+
+        with open(path) as handle:
+            self.assertEqual(handle.read(),
+                "chrom\tstart\tend\ttype\tcnvs\tcarriers\tproband_ids\tgenes\n"
+                "1\t1000000\t2005000\tDEL\t2\t2\tchild1,child3\tA,B,C\n"
+                "1\t5000000\t5100000\tDEL\t1\t1\tchild2\t\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
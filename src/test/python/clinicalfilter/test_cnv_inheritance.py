@@ -5,6 +5,7 @@ import unittest
 from clinicalfilter.ped import Family
 from clinicalfilter.variant.cnv import CNV
 from clinicalfilter.inheritance import CNVInheritance
+from clinicalfilter.syndrome_regions import index_cnv_regions
 from clinicalfilter.trio_genotypes import TrioGenotypes
 
 
@@ -394,6 +395,10 @@ class TestCNVInheritancePy(unittest.TestCase):
         # overlap region is sufficient, we return True
         syndrome_regions[("1", "1000", "2000")] = "1"
         self.assertTrue(self.inh.check_cnv_region_overlap(syndrome_regions))
+        
+        # check that we can use an index of the regions
+        regions = index_cnv_regions(syndrome_regions)
+        self.assertTrue(self.inh.check_cnv_region_overlap(regions))
     
     def test_has_enough_overlap(self):
         """ test that has_enough_overlap() works correctly
@@ -0,0 +1,98 @@
+""" unit testing of collecting and merging summaries across a cohort
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.cohort_summary import merge_summaries, merge_values
+from clinicalfilter.recurrence import DeNovoRecurrence
+
+
+class TestCohortSummaryPy(unittest.TestCase):
+    """ test loading and merging the counts files for cohort summaries
+    """
+
+    def setUp(self):
+        """ make a temporary directory
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def de_novo(self, pos, gene):
+        """ make a de novo dictionary
+        """
+
+        return {"chrom": "1", "pos": pos, "ref": "A", "alt": "G", "gene": gene,
+            "consequence": "missense_variant", "class": "missense"}
+
+    def test_load(self):
+        """ check loading counts files, with a partial line at the end
+        """
+
+        path = os.path.join(self.temp_dir, "counts.txt")
+        first = DeNovoRecurrence(path)
+        first.add_proband("fam1", "child1", [self.de_novo(100, "GENE1")])
+        first.add_proband("fam2", "child2", [self.de_novo(100, "GENE1")])
+        with open(path, "a") as handle:
+            handle.write('{"de_novos": [{"ch')
+
+        recurrence = DeNovoRecurrence()
+        recurrence.load(path)
+        self.assertEqual(recurrence.genes["GENE1"]["probands"], set(["child1", "child2"]))
+
+        # we can restrict the probands, eg to those finished before resuming
+        recurrence = DeNovoRecurrence()
+        recurrence.load(path, keep=set([("fam2", "child2")]))
+        self.assertEqual(recurrence.genes["GENE1"]["probands"], set(["child2"]))
+
+        # missing files are skipped
+        recurrence.load(os.path.join(self.temp_dir, "missing.txt"))
+
+    def test_merge_summaries(self):
+        """ check that we merge the counts from separate processes
+        """
+
+        paths = []
+        for i in range(3):
+            paths.append(os.path.join(self.temp_dir, "counts." + str(i)))
+            part = DeNovoRecurrence(paths[-1])
+            part.add_proband("fam" + str(i), "child" + str(i),
+                [self.de_novo(100, "GENE1")])
+
+        output = os.path.join(self.temp_dir, "summary.txt")
+        recurrence = merge_summaries(DeNovoRecurrence, paths, output)
+
+        self.assertEqual(len(recurrence.genes["GENE1"]["probands"]), 3)
+        self.assertTrue(os.path.exists(output + ".sites"))
+
+        # the merged counts can be merged again
+        again = DeNovoRecurrence()
+        again.load(output + ".counts")
+        self.assertEqual(again.entries, recurrence.entries)
+
+    def test_add_proband_without_values(self):
+        """ check that probands without values aren't counted
+        """
+
+        recurrence = DeNovoRecurrence()
+        recurrence.add_proband("fam1", "child1", None)
+        self.assertEqual(recurrence.entries, [])
+
+    def test_merge_values(self):
+        """ check that we merge a proband's values from each region
+        """
+
+        self.assertEqual(merge_values([[1, 2], [], [3]]), [1, 2, 3])
+        self.assertEqual(merge_values([[1, 2], None]), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
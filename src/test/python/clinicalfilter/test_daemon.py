@@ -0,0 +1,174 @@
+""" unit testing of the daemon, which analyses trios as they are requested
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+
+from clinicalfilter.daemon import References, get_family, analyse_request, \
+    ForkingUnixServer, send_request
+
+GENES_HEADER = "gene\ttype\tmode\tmech\tstart\tstop\tchr\n"
+
+
+class TestDaemonPy(unittest.TestCase):
+    """ test the daemon's reference data, requests and socket server
+    """
+
+    def setUp(self):
+        """ make a temporary directory, with a known genes list
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.genes = self.write("genes.txt", GENES_HEADER +
+            "ATRX\tConfirmed DD Gene\tMonoallelic\tLoss of function\t100\t200\t1\n")
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, text):
+        """ write text to a file in the temporary directory
+        """
+
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w") as handle:
+            handle.write(text)
+
+        return path
+
+    def get_spec(self):
+        """ get a request for a trio, where the child has a loss-of-function variant
+        """
+
+        header = "##fileformat=VCFv4.1\n" \
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"
+        info = "CQ=stop_gained;HGNC=ATRX;MAX_AF=0.0001"
+        child = self.write("child.vcf", header +
+            "1\t150\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n")
+        mother = self.write("mother.vcf", header)
+        father = self.write("father.vcf", header)
+
+        return {"family_id": "fam1",
+            "child": {"id": "child1", "path": child, "sex": "F"},
+            "mother": {"id": "mom1", "path": mother},
+            "father": {"id": "dad1", "path": father}}
+
+    def test_get_family(self):
+        """ check that we make families from requests
+        """
+
+        family = get_family(self.get_spec())
+        self.assertEqual(family.family_id, "fam1")
+        self.assertEqual(family.child.get_id(), "child1")
+        self.assertTrue(family.child.is_affected())
+        self.assertEqual(family.mother.get_gender(), "2")
+        self.assertEqual(family.father.get_affected_status(), "1")
+
+        # requests need a child, with a sex, and either both parents or none
+        spec = self.get_spec()
+        del spec["child"]
+        with self.assertRaises(ValueError):
+            get_family(spec)
+
+        spec = self.get_spec()
+        del spec["child"]["sex"]
+        with self.assertRaises(ValueError):
+            get_family(spec)
+
+        spec = self.get_spec()
+        del spec["father"]
+        with self.assertRaises(ValueError):
+            get_family(spec)
+
+        spec = self.get_spec()
+        spec["mother"]["sex"] = "M"
+        with self.assertRaises(ValueError):
+            get_family(spec)
+
+    def test_references_reload(self):
+        """ check that we reload the reference data when the files change
+        """
+
+        references = References(genes=self.genes)
+        self.assertEqual(sorted(references.known_genes), ["ATRX"])
+        self.assertFalse(references.reload_if_stale())
+
+        self.write("genes.txt", GENES_HEADER +
+            "ATRX\tConfirmed DD Gene\tMonoallelic\tLoss of function\t100\t200\t1\n" +
+            "TTN\tConfirmed DD Gene\tBiallelic\tLoss of function\t300\t400\t2\n")
+        stat = os.stat(self.genes)
+        os.utime(self.genes, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertTrue(references.is_stale())
+        self.assertTrue(references.reload_if_stale())
+        self.assertEqual(sorted(references.known_genes), ["ATRX", "TTN"])
+        self.assertFalse(references.reload_if_stale())
+
+        # a missing file (eg while it is replaced) keeps the current data
+        os.remove(self.genes)
+        self.assertFalse(references.reload_if_stale())
+        self.assertEqual(sorted(references.known_genes), ["ATRX", "TTN"])
+
+    def test_analyse_request(self):
+        """ check that we analyse requests, and report invalid requests
+        """
+
+        references = References(genes=self.genes)
+
+        response, valid = analyse_request(references, '{"family_id": "fam1"}')
+        self.assertFalse(valid)
+        self.assertIn("error", response)
+
+        response, valid = analyse_request(references, "not json")
+        self.assertFalse(valid)
+
+        response, valid = analyse_request(references,
+            '{"family_id": "fam1", "child": {"id": "a", "path": "b", "sex": "F"}, ' \
+            '"options": {"unknown": 1}}')
+        self.assertFalse(valid)
+
+    def test_socket_requests(self):
+        """ check that we analyse trios sent to the daemon's socket
+        """
+
+        references = References(genes=self.genes)
+        path = os.path.join(self.temp_dir, "daemon.sock")
+        server = ForkingUnixServer(path, references, 2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        # the de novo checks need fields from denovogear, so leave out the
+        # parents, and check the child's variant alone
+        spec = self.get_spec()
+        del spec["mother"]
+        del spec["father"]
+
+        try:
+            response = send_request(path, spec)
+
+            spec = self.get_spec()
+            spec["child"]["path"] = os.path.join(self.temp_dir, "missing.vcf")
+            missing = send_request(path, spec)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertEqual(response["family_id"], "fam1")
+        self.assertEqual(response["proband"], "child1")
+        self.assertEqual(len(response["candidates"]), 1)
+        candidate = response["candidates"][0]
+        self.assertEqual(candidate["gene"], "ATRX")
+        self.assertEqual(candidate["position"], "150")
+        self.assertEqual(candidate["mom_aff"], "NA")
+
+        self.assertIn("error", missing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+""" unit testing of the incremental reanalysis after known genes changes
+"""
+
+import unittest
+import argparse
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.ped import Family
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.variant.cnv import CNV
+from clinicalfilter.incremental import get_site, get_changed_genes, \
+    is_site_affected, CandidateCache, IncrementalAnalysis
+from clinicalfilter.prefetch import get_probands
+from clinicalfilter.resume import get_trio_inputs, get_file_checksum
+
+GENES_HEADER = "gene\ttype\tmode\tmech\tstart\tstop\tchr\n"
+
+
+class TestIncrementalPy(unittest.TestCase):
+    """ test the incremental reanalysis
+    """
+
+    def setUp(self):
+        """ make a temporary directory for the files from earlier runs
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+        # make sure the variant classes don't use known genes from other tests
+        SNV.known_genes = None
+        CNV.known_genes = None
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, text):
+        """ write text to a file in the temporary directory
+        """
+
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w") as handle:
+            handle.write(text)
+
+        return path
+
+    def get_genes(self, lines):
+        """ make a known genes dictionary, as from open_known_genes()
+        """
+
+        genes = {}
+        for gene, inh, start, end, chrom in lines:
+            genes[gene] = {"inh": {inh: set(["Loss of function"])},
+                "status": set(["Confirmed DD Gene"]), "start": start, "end": end,
+                "chrom": chrom}
+
+        return genes
+
+    def test_get_site(self):
+        """ check that we get sites for candidates under any known genes list
+        """
+
+        var = SNV("1", "100", ".", "A", "G", "PASS")
+        var.add_info("HGNC=ATRX;CQ=missense_variant;MAX_AF=0.001")
+        self.assertEqual(get_site(var), ["1", 100, 100, ["ATRX"]])
+
+        # common variants, and variants without functional consequences
+        # aren't candidates
+        var = SNV("1", "100", ".", "A", "G", "PASS")
+        var.add_info("HGNC=ATRX;CQ=missense_variant;MAX_AF=0.1")
+        self.assertIsNone(get_site(var))
+
+        var = SNV("1", "100", ".", "A", "G", "PASS")
+        var.add_info("HGNC=ATRX;CQ=synonymous_variant")
+        self.assertIsNone(get_site(var))
+
+        # CNVs are always included, with every gene they span
+        var = CNV("1", "100", ".", "A", "<DEL>", "PASS")
+        var.add_info("END=5000;HGNC_ALL=ATRX,TTN")
+        self.assertEqual(get_site(var), ["1", 100, 5000, ["ATRX", "TTN"]])
+
+    def test_get_changed_genes(self):
+        """ check that we find added, removed and changed genes
+        """
+
+        old = self.get_genes([("ATRX", "Monoallelic", 100, 200, "1"),
+            ("TTN", "Biallelic", 300, 400, "2"), ("KMT2A", "Monoallelic", 500, 600, "3")])
+        new = self.get_genes([("ATRX", "Monoallelic", 100, 200, "1"),
+            ("TTN", "Monoallelic", 300, 400, "2"), ("ARID1B", "Monoallelic", 700, 800, "4")])
+
+        changed = get_changed_genes(old, set(["OLD"]), new, set(["OLD", "NEW"]))
+
+        self.assertEqual(changed, {"TTN": [("2", 300, 400), ("2", 300, 400)],
+            "KMT2A": [("3", 500, 600)], "ARID1B": [("4", 700, 800)], "NEW": []})
+
+    def test_is_site_affected(self):
+        """ check that sites are affected by overlapping or annotated genes
+        """
+
+        changed = {"TTN": [("2", 300, 400)], "NEW": []}
+        ranges = {"2": [(300, 400)]}
+
+        self.assertTrue(is_site_affected(["2", 350, 350, []], changed, ranges))
+        self.assertTrue(is_site_affected(["2", 100, 300, []], changed, ranges))
+        self.assertTrue(is_site_affected(["1", 100, 100, ["NEW"]], changed, ranges))
+        self.assertFalse(is_site_affected(["2", 401, 500, ["ATRX"]], changed, ranges))
+        self.assertFalse(is_site_affected(["1", 350, 350, []], changed, ranges))
+
+    def test_reuse(self):
+        """ check that we only reuse results for probands outside changed genes
+        """
+
+        old_genes = self.write("old_genes.txt", GENES_HEADER +
+            "ATRX\tConfirmed DD Gene\tMonoallelic\tLoss of function\t100\t200\t1\n" +
+            "TTN\tConfirmed DD Gene\tBiallelic\tLoss of function\t300\t400\t2\n")
+        new_genes = self.write("new_genes.txt", GENES_HEADER +
+            "ATRX\tConfirmed DD Gene\tMonoallelic\tLoss of function\t100\t200\t1\n" +
+            "TTN\tConfirmed DD Gene\tMonoallelic\tLoss of function\t300\t400\t2\n")
+
+        families = {}
+        for family_id in ["fam1", "fam2"]:
+            family = Family(family_id)
+            family.add_child(family_id + "_child", self.write(family_id + ".vcf",
+                family_id), "2", "F")
+            families[family_id] = family
+        probands = get_probands(families)
+
+        # write the output and cache from the earlier run
+        output = self.write("output.txt", "header\n")
+        options = argparse.Namespace(genes=old_genes, output=output, pp_filter=0.9)
+        cache = CandidateCache(os.path.join(self.temp_dir, "cache.txt"), options)
+        sites = {"fam1": [["1", 150, 150, ["ATRX"]]], "fam2": [["2", 350, 350, ["TTN"]]]}
+        for family in probands:
+            cache.start_proband()
+            with open(output, "a") as handle:
+                handle.write(family.family_id + "\n")
+            provenance = [(get_file_checksum(family.child.get_path()), "NA", "NA")]
+            cache.add_proband(family, get_trio_inputs(family, provenance),
+                sites[family.family_id])
+
+        options = argparse.Namespace(genes=new_genes, output="new_output.txt",
+            pp_filter=0.9, previous_genes=old_genes, previous_output=output,
+            previous_cache=cache.path)
+        known_genes = self.get_genes([("ATRX", "Monoallelic", 100, 200, "1"),
+            ("TTN", "Monoallelic", 300, 400, "2")])
+        incremental = IncrementalAnalysis(options, known_genes, set())
+
+        self.assertEqual(sorted(incremental.changed), ["TTN"])
+        entry = incremental.get_reusable(probands[0])
+        self.assertIsNotNone(entry)
+        self.assertIsNone(incremental.get_reusable(probands[1]))
+
+        new_output = self.write("new_output.txt", "header\n")
+        incremental.copy_results(entry, new_output)
+        with open(new_output) as handle:
+            self.assertEqual(handle.read(), "header\nfam1\n")
+
+        # if the earlier run used different options, nothing is reused
+        options.pp_filter = 0.5
+        incremental = IncrementalAnalysis(options, known_genes, set())
+        self.assertIsNone(incremental.get_reusable(probands[0]))
+
+        # and we need the known genes list that the earlier run used
+        options.previous_genes = new_genes
+        with self.assertRaises(ValueError):
+            IncrementalAnalysis(options, known_genes, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+""" unit testing of the IntervalIndex class
+"""
+
+import unittest
+import random
+
+from clinicalfilter.interval_index import IntervalIndex
+
+
+class TestIntervalIndexPy(unittest.TestCase):
+    """ test finding overlapping intervals
+    """
+
+    def test_find_overlaps(self):
+        """ check that we find the intervals overlapping a region
+        """
+
+        index = IntervalIndex([("1", 100, 200, "a"), ("1", "150", "400", "b"),
+            ("1", 500, 600, "c"), ("2", 100, 200, "d")])
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.find_overlaps("1", 180, 190),
+            [(100, 200, "a"), (150, 400, "b")])
+
+        # intervals which only share an end position overlap
+        self.assertEqual(index.find_overlaps("1", 400, 500),
+            [(150, 400, "b"), (500, 600, "c")])
+        self.assertEqual(index.find_overlaps("1", 401, 499), [])
+        self.assertEqual(index.find_overlaps("1", 1, 99), [])
+
+        # check chromosomes without intervals
+        self.assertEqual(index.find_overlaps("X", 100, 200), [])
+
+    def test_find_overlaps_order(self):
+        """ check that overlaps are in the order the intervals were added
+        """
+
+        index = IntervalIndex()
+        index.add("1", 300, 400, "a")
+        index.add("1", 100, 500, "b")
+        index.add("1", 200, 300, "c")
+
+        self.assertEqual([x[2] for x in index.find_overlaps("1", 300, 300)],
+            ["a", "b", "c"])
+        self.assertEqual([x[2] for x in index.get_intervals("1")],
+            ["b", "c", "a"])
+
+        # intervals added after a query are found by later queries
+        index.add("1", 250, 260, "d")
+        self.assertEqual([x[2] for x in index.find_overlaps("1", 255, 255)],
+            ["b", "c", "d"])
+
+    def test_find_overlaps_random(self):
+        """ check that we match checking every interval, for random intervals
+        """
+
+        rng = random.Random(1)
+        intervals = []
+        for i in range(500):
+            start = rng.randint(1, 100000)
+            intervals.append((rng.choice(["1", "2"]), start,
+                start + rng.randint(0, 5000), i))
+
+        index = IntervalIndex(intervals)
+        for i in range(200):
+            chrom = rng.choice(["1", "2"])
+            start = rng.randint(1, 100000)
+            end = start + rng.randint(0, 2000)
+
+            expected = [(x[1], x[2], x[3]) for x in intervals if x[0] == chrom \
+                and x[1] <= end and x[2] >= start]
+            self.assertEqual(index.find_overlaps(chrom, start, end), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@ from clinicalfilter.trio_genotypes import TrioGenotypes
 from clinicalfilter.match_cnvs import MatchCNVs
 from clinicalfilter.load_vcfs import LoadVCFs
 from clinicalfilter.ped import Family
+from clinicalfilter.trace import Tracer
 
 IS_PYTHON2 = sys.version_info[0] == 2
 IS_PYTHON3 = sys.version_info[0] == 3
@@ -138,31 +139,6 @@ class TestLoadVCFsPy(unittest.TestCase):
         # check that the header is returned correctly
         self.assertEqual(header, vcf[:4])
     
-    def test_exclude_header(self):
-        """ test that exclude_header() works correctly
-        """
-        
-        vcf = self.make_minimal_vcf()
-        
-        # make sure we drop the header, and only the header from the file
-        # check this by reading the file, and making sure the first line
-        # is the line we expect from the VCF
-        path = self.write_temp_vcf("temp.vcf", vcf)
-        handler = open(path, "r")
-        self.vcf_loader.exclude_header(handler)
-        self.assertEqual(handler.readline(), vcf[4])
-        handler.close()
-        
-        # also check for gzipped VCF files.
-        path = self.write_gzipped_vcf("temp.vcf.gz", vcf)
-        if IS_PYTHON2:
-            handler = gzip.open(path, "r")
-        elif IS_PYTHON3:
-            handler = gzip.open(path, "rt")
-        self.vcf_loader.exclude_header(handler)
-        self.assertEqual(handler.readline(), vcf[4])
-        handler.close()
-    
     def test_add_single_variant(self):
         """ test that add_single_variant() works correctly
         """
@@ -296,6 +272,65 @@ class TestLoadVCFsPy(unittest.TestCase):
         gender = "M"
         self.assertFalse(self.vcf_loader.include_variant(line, child_variants, gender))
     
+    def test_is_at_child_site(self):
+        """ check that is_at_child_site() finds parental lines at child sites
+        """
+        
+        self.vcf_loader.child_keys = set([("1", 100), ("X", 200, 300)])
+        
+        self.assertTrue(self.vcf_loader.is_at_child_site(b"1\t100\t.\tT\tA\t1000\tPASS\t.\tGT\t0/1"))
+        self.assertFalse(self.vcf_loader.is_at_child_site(b"1\t101\t.\tT\tA\t1000\tPASS\t.\tGT\t0/1"))
+        self.assertFalse(self.vcf_loader.is_at_child_site(b"2\t100\t.\tT\tA\t1000\tPASS\t.\tGT\t0/1"))
+        
+        # CNVs can overlap the child's CNVs from other sites, so we keep them
+        self.assertTrue(self.vcf_loader.is_at_child_site(b"X\t150\t.\tT\t<DEL>\t1000\tPASS\tEND=250\tGT\t0/1"))
+    
+    def test_has_functional_consequence(self):
+        """ check that has_functional_consequence() only rejects failing SNVs
+        """
+        
+        infos = {"CQ=missense_variant;HGNC=ATRX": True,
+            "HGNC=ATRX;CQ=stop_gained": True,
+            "CQ=synonymous_variant,stop_gained;HGNC=ATRX,ATRX;ENST=A,B": True,
+            "CQ=synonymous_variant;HGNC=ATRX": False,
+            "CQ=missense_variant_like;HGNC=ATRX": False,
+            "HGNC=ATRX;OTHER=missense_variant": False,
+            "HGNC=ATRX": False,
+            ".": False}
+        
+        for info, expected in infos.items():
+            alt = "A"
+            if "," in info.split(";")[0]:
+                alt = "A,C"
+            line = ["1", "100", ".", "T", alt, "1000", "PASS", info, "GT", "0/1"]
+            encoded = "\t".join(line).encode("latin_1")
+            
+            self.assertEqual(self.vcf_loader.has_functional_consequence(encoded), expected)
+            self.assertEqual(self.vcf_loader.has_functional_consequence(encoded + b"\r"), expected)
+            
+            # lines which are rejected would also fail the filters
+            if not expected:
+                var = self.vcf_loader.construct_variant(line, "M")
+                self.assertFalse(var.passes_filters())
+        
+        # CNVs are always kept
+        line = b"1\t100\t.\tT\t<DEL>\t1000\tPASS\tEND=200\tGT\t0/1"
+        self.assertTrue(self.vcf_loader.has_functional_consequence(line))
+    
+    def test_could_include(self):
+        """ check that could_include() checks the child's and parents' lines
+        """
+        
+        line = b"1\t100\t.\tT\tA\t1000\tPASS\tCQ=synonymous_variant\tGT\t0/1"
+        self.assertFalse(self.vcf_loader.could_include(line, False))
+        
+        self.vcf_loader.child_keys = set([("1", 100)])
+        self.assertTrue(self.vcf_loader.could_include(line, True))
+        
+        # all the child's lines are checked when tracing variants
+        loader = LoadVCFs(1, None, None, Tracer([("1", 100)]))
+        self.assertTrue(loader.could_include(line, False))
+    
     def test_filter_de_novos(self):
         """ check that filter_de_novos() works correctly
         """
@@ -341,8 +376,52 @@ class TestLoadVCFsPy(unittest.TestCase):
         
         self.assertEqual(self.vcf_loader.filter_de_novos(trio_variants, 0.9), trio_variants)
     
-    def test_debug_option(self):
-        """ test whether we can set up the class with the debug option
+    def test_load_trio_with_threads(self):
+        """ test that loading a trio with threads matches loading in turn
+        """
+        
+        header = self.make_minimal_vcf()[:4]
+        info = "CQ=missense_variant;HGNC=ATRX"
+        child = ["1\t100\t.\tT\tA\t1000\tPASS\t" + info + "\tGT\t0/1\n",
+            "1\t200\t.\tT\tA\t1000\tPASS\t" + info + "\tGT\t0/1\n",
+            "1\t300\t.\tT\tA\t1000\tPASS\t" + info + "\tGT\t0/1\n"]
+        mother = [child[0], "1\t150\t.\tT\tA\t1000\tPASS\t" + info + "\tGT\t0/1\n"]
+        father = [child[1], child[2]]
+        
+        family = Family("fam_id")
+        family.add_child("child", self.write_temp_vcf("child.vcf", header + child), "2", "F")
+        family.add_mother("mother", self.write_gzipped_vcf("mother.vcf.gz", header + mother), "1", "F")
+        family.add_father("father", self.write_temp_vcf("father.vcf", header + father), "1", "M")
+        family.set_child()
+        
+        results = []
+        for threads in [1, 3]:
+            known_genes = {"ATRX": {"inh": {"Hemizygous": \
+                set(["Loss of function"])}, "start": 1, "chrom": "1", \
+                "status": set(["Confirmed DD Gene"]), "end": 20000000}}
+            loader = LoadVCFs(1, known_genes, set([]), None, None, threads=threads)
+            loader.family = family
+            trio = loader.load_trio()
+            provenance = loader.get_trio_provenance()
+            keys = [[x.get_key() for x in member] for member in trio]
+            results.append((keys, provenance, loader.lines_scanned, loader.bytes_read))
+        
+        self.assertEqual(results[0], results[1])
+        
+        keys, provenance, lines_scanned, bytes_read = results[1]
+        self.assertEqual(keys, [[("1", 100), ("1", 200), ("1", 300)],
+            [("1", 100)], [("1", 200), ("1", 300)]])
+        self.assertEqual([x[1] for x in provenance], ["child.vcf", "mother.vcf.gz", "father.vcf"])
+        self.assertEqual(lines_scanned, 7)
+        
+        # the bytes are from the lines scanned, and the files hashed for the
+        # checksums
+        scanned = sum(len(x) for x in child + mother + father)
+        hashed = sum(os.path.getsize(x) for x in loader.get_trio_paths())
+        self.assertEqual(bytes_read, scanned + hashed)
+    
+    def test_trace_option(self):
+        """ test whether we can set up the class with the trace option
         """
         
         counter = 0
@@ -350,10 +429,27 @@ class TestLoadVCFsPy(unittest.TestCase):
         known_genes = {}
         excluded_genes = {}
         
-        self.vcf_loader = LoadVCFs(total_trios, known_genes, excluded_genes, "1", "10000")
-        
-        # check that the debug filter function got set correctly
-        self.assertEqual(SNV.passes_filters, SNV.passes_filters_with_debug)
+        tracer = Tracer([("1", 10000)])
+        self.vcf_loader = LoadVCFs(total_trios, known_genes, excluded_genes,
+            tracer)
+        line = ["1", "10000", ".", "A", "G", "50", "PASS",
+            "CQ=missense_variant", "GT", "0/1"]
+        var = self.vcf_loader.construct_variant(line, "F")
+        
+        # check that the trace filter function got set for the variant, along
+        # with the loader's settings, without changing the variant class
+        self.assertEqual(var.passes_filters, var.passes_filters_with_trace)
+        self.assertIs(var.tracer, tracer)
+        self.assertIs(var.known_genes, known_genes)
+        self.assertIs(var.excluded_genes, excluded_genes)
+        self.assertEqual(SNV.passes_filters, SNV.passes_filters_without_trace)
+        self.assertIsNone(SNV.tracer)
+        
+        # and that variants use the untraced filter function without tracing
+        self.vcf_loader = LoadVCFs(total_trios, known_genes, excluded_genes)
+        var = self.vcf_loader.construct_variant(line, "F")
+        self.assertEqual(var.passes_filters, var.passes_filters_without_trace)
+        self.assertIsNone(var.tracer)
         
         
         
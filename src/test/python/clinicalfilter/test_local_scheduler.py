@@ -0,0 +1,179 @@
+""" unit testing of the local scheduler
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.local_scheduler import LocalScheduler, get_options, \
+    split_ped_by_family, get_family_cost, has_option
+
+# a stand in for clinical_filter.py, which writes a header and a line for the
+# family, and fails the first attempt for families named "flaky", and every
+# attempt for families named "broken"
+FAKE_SCRIPT = """
+import os
+import sys
+
+ped = sys.argv[sys.argv.index("--ped") + 1]
+output = sys.argv[sys.argv.index("--output") + 1]
+family_id = os.path.basename(ped).split(".")[0]
+
+marker = ped + ".tried"
+if family_id.startswith("broken") or (family_id.startswith("flaky") and not os.path.exists(marker)):
+    open(marker, "w").close()
+    sys.exit(1)
+
+with open(output, "w") as handle:
+    handle.write("proband\\tresult\\n")
+    handle.write(family_id + "\\t" + " ".join(sys.argv[5:]) + "\\n\\n")
+
+with open(ped + ".log", "w") as handle:
+    handle.write("INFO:root:" + family_id + "\\n")
+"""
+
+
+class TestLocalSchedulerPy(unittest.TestCase):
+    """ test the LocalScheduler
+    """
+
+    def setUp(self):
+        """ make a temporary directory, with VCFs of different sizes
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.script = os.path.join(self.temp_dir, "fake_filter.py")
+        with open(self.script, "w") as handle:
+            handle.write(FAKE_SCRIPT)
+
+        self.output = os.path.join(self.temp_dir, "output.txt")
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write_ped(self, families):
+        """ write a PED file, and a VCF of a given size for each family
+
+        Args:
+            families: dictionary of VCF sizes, indexed by family ID
+        """
+
+        lines = []
+        for family_id in sorted(families):
+            vcf = os.path.join(self.temp_dir, family_id + ".vcf")
+            with open(vcf, "w") as handle:
+                handle.write("x" * families[family_id])
+            lines.append("\t".join([family_id, family_id + "_child", "0", "0",
+                "F", "2", vcf]) + "\n")
+
+        path = os.path.join(self.temp_dir, "cohort.ped")
+        with open(path, "w") as handle:
+            handle.writelines(lines)
+
+        return path
+
+    def test_get_options(self):
+        """ check that unknown options are passed on to each job
+        """
+
+        args, extra = get_options(["--ped", "cohort.ped", "--output", "out.txt",
+            "--workers", "4", "--known-genes", "genes.txt"])
+
+        self.assertEqual(args.workers, 4)
+        self.assertEqual(args.retries, 2)
+        self.assertEqual(extra, ["--known-genes", "genes.txt"])
+
+    def test_split_ped_by_family(self):
+        """ check that we group PED lines by family, and estimate costs
+        """
+
+        path = self.write_ped({"fam1": 10, "fam2": 30})
+        families = split_ped_by_family(path)
+
+        self.assertEqual(sorted(families), ["fam1", "fam2"])
+        self.assertEqual(get_family_cost(families["fam1"]), 10)
+        self.assertEqual(get_family_cost(families["fam2"]), 30)
+
+    def test_largest_first(self):
+        """ check that the families with the largest VCFs are queued first
+        """
+
+        path = self.write_ped({"fam1": 10, "fam2": 30, "fam3": 20})
+        scheduler = LocalScheduler(self.script, path, self.output, 2, 0)
+        scheduler.create_jobs()
+
+        self.assertEqual([x.family_id for x in scheduler.pending],
+            ["fam2", "fam3", "fam1"])
+
+        shutil.rmtree(scheduler.temp_dir)
+
+    def test_get_command(self):
+        """ check that jobs load trios in a single thread, unless told otherwise
+        """
+
+        path = self.write_ped({"fam1": 10})
+        scheduler = LocalScheduler(self.script, path, self.output, 2, 0,
+            extra_args=["--known-genes", "genes.txt"])
+        scheduler.create_jobs()
+        command = scheduler.get_command(scheduler.jobs[0])
+        self.assertEqual(command[-4:], ["--load-threads", "1", "--known-genes",
+            "genes.txt"])
+        shutil.rmtree(scheduler.temp_dir)
+
+        for extra in [["--load-threads", "3"], ["--load-threads=3"]]:
+            scheduler = LocalScheduler(self.script, path, self.output, 2, 0,
+                extra_args=extra)
+            scheduler.create_jobs()
+            command = scheduler.get_command(scheduler.jobs[0])
+            self.assertFalse(has_option(command[:-len(extra)], "--load-threads"))
+            self.assertEqual(command[-len(extra):], extra)
+            shutil.rmtree(scheduler.temp_dir)
+
+    def test_run(self):
+        """ check that we retry failed families, and merge in family order
+        """
+
+        path = self.write_ped({"fam1": 10, "fam2": 30, "flaky": 20})
+        scheduler = LocalScheduler(self.script, path, self.output, 2, 1,
+            extra_args=["--known-genes", "genes.txt"])
+        failed = scheduler.run()
+
+        self.assertEqual(failed, [])
+        self.assertFalse(os.path.exists(scheduler.temp_dir))
+
+        with open(self.output) as handle:
+            lines = handle.readlines()
+        self.assertEqual(lines, ["proband\tresult\n",
+            "fam1\t--load-threads 1 --known-genes genes.txt\n", "\n",
+            "fam2\t--load-threads 1 --known-genes genes.txt\n", "\n",
+            "flaky\t--load-threads 1 --known-genes genes.txt\n", "\n"])
+
+        # the logs for each family are added to the cohort log
+        with open(path + ".log") as handle:
+            self.assertEqual(handle.read(), "INFO:root:fam1\nINFO:root:fam2\nINFO:root:flaky\n")
+
+    def test_run_with_failures(self):
+        """ check that families failing every retry are reported
+        """
+
+        path = self.write_ped({"fam1": 10, "broken": 30})
+        scheduler = LocalScheduler(self.script, path, self.output, 2, 1)
+        failed = scheduler.run()
+
+        self.assertEqual(failed, ["broken"])
+        job = [x for x in scheduler.jobs if x.family_id == "broken"][0]
+        self.assertEqual(job.attempts, 2)
+
+        # the successful families are still merged, and the temporary files
+        # are kept for debugging
+        with open(self.output) as handle:
+            self.assertEqual(handle.readlines()[1], "fam1\t--load-threads 1\n")
+        self.assertTrue(os.path.exists(scheduler.temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+""" unit testing of the MatchCNVs class
+"""
+
+import unittest
+import random
+
+from clinicalfilter.match_cnvs import MatchCNVs, get_size_tolerance
+
+
+class Variant(object):
+    """ a minimal variant, with just a key
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def get_key(self):
+        return self.key
+
+
+def match_every_cnv(keys, var_key):
+    """ find the matching CNV by checking every CNV, as MatchCNVs did before
+    it used an interval index
+    """
+
+    min_size, max_size = get_size_tolerance(var_key[2] - var_key[1])
+
+    match = None
+    for key in keys:
+        if len(key) != 3 or key[0] != var_key[0]:
+            continue
+        if var_key[1] <= key[2] and var_key[2] >= key[1] and \
+                max_size > key[2] - key[1] > min_size:
+            match = key
+
+    return match
+
+
+class TestMatchCnvsPy(unittest.TestCase):
+    """ test matching CNVs between individuals
+    """
+
+    def test_has_match(self):
+        """ check that we match overlapping CNVs of similar sizes
+        """
+
+        matcher = MatchCNVs([Variant(("1", 1000000, 2000000)),
+            Variant(("1", 1500000)), Variant(("2", 1000000, 1010000))])
+
+        self.assertTrue(matcher.has_match(Variant(("1", 1010000, 2005000))))
+        self.assertEqual(matcher.get_overlap_key(("1", 1010000, 2005000)),
+            ("1", 1000000, 2000000))
+
+        # check CNVs which don't overlap, or have different sizes, or are on
+        # other chromosomes
+        self.assertFalse(matcher.has_match(Variant(("1", 3000000, 4000000))))
+        self.assertFalse(matcher.has_match(Variant(("1", 1500000, 1600000))))
+        self.assertFalse(matcher.has_match(Variant(("3", 1000000, 2000000))))
+        self.assertIsNone(matcher.get_overlap_key(("3", 1000000, 2000000)))
+
+        # CNVs which only share an end point overlap
+        self.assertTrue(matcher.has_match(Variant(("1", 2000000, 3000000))))
+
+    def test_last_match_wins(self):
+        """ check that we use the last matching CNV, when several CNVs match
+        """
+
+        keys = [("1", 1000000, 2000000), ("1", 1005000, 2003000),
+            ("1", 995000, 1990000)]
+        matcher = MatchCNVs([Variant(x) for x in keys])
+        self.assertEqual(matcher.get_overlap_key(("1", 1000000, 2000000)), keys[2])
+
+        matcher = MatchCNVs([Variant(x) for x in reversed(keys)])
+        self.assertEqual(matcher.get_overlap_key(("1", 1000000, 2000000)), keys[0])
+
+    def test_random_cnvs(self):
+        """ check that we match checking every CNV, for random CNVs
+        """
+
+        rng = random.Random(1)
+
+        def random_key():
+            start = rng.randint(1, 10000000)
+            return (rng.choice(["1", "2"]), start, start + rng.randint(1000, 3000000))
+
+        keys = [random_key() for i in range(300)]
+        matcher = MatchCNVs([Variant(x) for x in keys])
+        for i in range(500):
+            var_key = random_key()
+            self.assertEqual(matcher.get_overlap_key(var_key),
+                match_every_cnv(keys, var_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
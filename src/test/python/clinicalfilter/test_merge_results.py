@@ -0,0 +1,179 @@
+""" unit testing of merging shard outputs
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.merge_results import merge_shards, check_headers, \
+    get_finished_probands, collect_vcfs, index_blocks
+
+HEADER = "proband\tchrom\tposition\n"
+
+
+class TestMergeResultsPy(unittest.TestCase):
+    """ test merging shard outputs
+    """
+
+    def setUp(self):
+        """ make a temporary directory for the shard outputs
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.temp_dir, "merged.txt")
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write_shard(self, name, probands, header=HEADER):
+        """ write a shard output, with a block of lines for each proband
+
+        Args:
+            name: basename for the shard
+            probands: list of (proband ID, list of positions) tuples
+            header: header line for the shard
+        """
+
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w") as handle:
+            handle.write(header)
+            for proband, positions in probands:
+                for position in positions:
+                    handle.write(proband + "\t1\t" + str(position) + "\n")
+                handle.write("\n")
+
+        return path
+
+    def read_output(self):
+        """ read the merged output
+        """
+
+        with open(self.output) as handle:
+            return handle.read()
+
+    def test_merge_shards(self):
+        """ check that we merge the shards into proband order
+        """
+
+        first = self.write_shard("shard.1.txt", [("P1", [100, 200]), ("P4", [50])])
+        second = self.write_shard("shard.2.txt", [("P2", [300]), ("P3", [10, 20])])
+
+        probands, duplicates = merge_shards([first, second], self.output)
+
+        self.assertEqual(probands, ["P1", "P2", "P3", "P4"])
+        self.assertEqual(duplicates, {})
+        self.assertEqual(self.read_output(), HEADER +
+            "P1\t1\t100\nP1\t1\t200\n\n" + "P2\t1\t300\n\n" +
+            "P3\t1\t10\nP3\t1\t20\n\n" + "P4\t1\t50\n\n")
+
+    def test_merge_duplicates(self):
+        """ check that we keep the first copy of duplicated probands
+        """
+
+        first = self.write_shard("shard.1.txt", [("P1", [100]), ("P2", [200])])
+        second = self.write_shard("shard.2.txt", [("P2", [300])])
+
+        probands, duplicates = merge_shards([first, second], self.output)
+
+        self.assertEqual(probands, ["P1", "P2"])
+        self.assertEqual(duplicates, {"P2": [second]})
+        self.assertEqual(self.read_output(), HEADER + "P1\t1\t100\n\nP2\t1\t200\n\n")
+
+    def test_merge_unsorted(self):
+        """ check that we merge shards which aren't in proband order
+        """
+
+        # shards are written in family order, so siblings follow the PED file,
+        # and P10 can follow P9
+        first = self.write_shard("shard.1.txt", [("P9", [100]), ("P10", [200]),
+            ("P2", [50, 60]), ("P11", [10])])
+        second = self.write_shard("shard.2.txt", [("P3", [300]), ("P1", [400])])
+
+        probands, duplicates = merge_shards([first, second], self.output)
+
+        self.assertEqual(probands, ["P1", "P10", "P11", "P2", "P3", "P9"])
+        self.assertEqual(duplicates, {})
+        self.assertEqual(self.read_output(), HEADER + "P1\t1\t400\n\n" +
+            "P10\t1\t200\n\n" + "P11\t1\t10\n\n" + "P2\t1\t50\nP2\t1\t60\n\n" +
+            "P3\t1\t300\n\n" + "P9\t1\t100\n\n")
+
+    def test_index_blocks(self):
+        """ check that we find the byte offset of each proband block
+        """
+
+        path = self.write_shard("shard.1.txt", [("P9", [100]), ("P10", [200, 300])])
+        self.assertEqual(index_blocks(path), [("P10", len(HEADER) + 10),
+            ("P9", len(HEADER))])
+
+        # the final block can lack a trailing blank line and newline
+        with open(path, "a") as handle:
+            handle.write("P1\t1\t5")
+        self.assertEqual(index_blocks(path)[0], ("P1", len(HEADER) + 31))
+
+        merge_shards([path], self.output)
+        self.assertTrue(self.read_output().startswith(HEADER + "P1\t1\t5\n\n"))
+
+    def test_check_headers(self):
+        """ check that the shards need matching headers
+        """
+
+        first = self.write_shard("shard.1.txt", [])
+        second = self.write_shard("shard.2.txt", [], header="proband\tchrom\n")
+        empty = self.write_shard("shard.3.txt", [], header="")
+
+        self.assertEqual(check_headers([first, first]), HEADER)
+        with self.assertRaises(ValueError):
+            check_headers([first, second])
+        with self.assertRaises(ValueError):
+            check_headers([first, empty])
+
+    def test_get_finished_probands(self):
+        """ check that we read the finished probands from shard manifests
+        """
+
+        first = self.write_shard("shard.1.txt", [])
+        second = self.write_shard("shard.2.txt", [])
+        self.assertIsNone(get_finished_probands([first, second]))
+
+        for path, probands in [(first, ["P1", "P2"]), (second, ["P3"])]:
+            with open(path + ".manifest", "w") as handle:
+                handle.write(json.dumps({"config": "hash"}) + "\n")
+                for proband in probands:
+                    entry = {"proband": "fam_" + proband + "\t" + proband}
+                    handle.write(json.dumps(entry) + "\n")
+
+        self.assertEqual(get_finished_probands([first, second]),
+            set(["P1", "P2", "P3"]))
+
+    def test_collect_vcfs(self):
+        """ check that we collect VCFs from each shard, and find duplicates
+        """
+
+        folders = []
+        for name, probands in [("vcfs1", ["P1", "P2"]), ("vcfs2", ["P2", "P3"])]:
+            folder = os.path.join(self.temp_dir, name)
+            os.mkdir(folder)
+            for proband in probands:
+                with open(os.path.join(folder, proband + ".vcf.gz"), "w") as handle:
+                    handle.write(name)
+            folders.append(folder)
+
+        output = os.path.join(self.temp_dir, "merged_vcfs")
+        os.mkdir(output)
+        found, duplicates = collect_vcfs(folders, output)
+
+        self.assertEqual(found, set(["P1", "P2", "P3"]))
+        self.assertEqual(duplicates, {"P2": [folders[1]]})
+        self.assertEqual(sorted(os.listdir(output)),
+            ["P1.vcf.gz", "P2.vcf.gz", "P3.vcf.gz"])
+        with open(os.path.join(output, "P2.vcf.gz")) as handle:
+            self.assertEqual(handle.read(), "vcfs1")
+
+
+if __name__ == '__main__':
+    unittest.main()
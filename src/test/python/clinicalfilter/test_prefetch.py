@@ -0,0 +1,156 @@
+""" unit testing of the background trio prefetching
+"""
+
+import unittest
+
+from clinicalfilter.ped import Family
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trio_genotypes import TrioGenotypes
+from clinicalfilter.prefetch import TrioPrefetcher, get_probands, estimate_size
+
+
+class FakeLoader(object):
+    """ stand in for LoadVCFs, which records the trios it loads
+    """
+
+    def __init__(self, prefetcher_ref, missing=None):
+        self.prefetcher_ref = prefetcher_ref
+        self.missing = missing
+        self.lines_scanned = 0
+        self.bytes_read = 0
+        self.child_header = ["#CHROM\n"]
+        self.waiting = []
+        self.sites = None
+
+    def get_trio_variants(self, family, pp_filter):
+        # record how many trios were waiting for analysis when we started
+        # loading this trio
+        if len(self.prefetcher_ref) > 0:
+            self.waiting.append(len(self.prefetcher_ref[0].loaded))
+
+        if family.child.get_id() == self.missing:
+            raise OSError("VCF file not found at: " + family.child.get_path())
+
+        self.lines_scanned += 10
+        self.bytes_read += 100
+        self.family = family
+
+        var = SNV("1", "100", ".", "A", "G", "PASS")
+        return [TrioGenotypes(var)]
+
+    def get_trio_provenance(self):
+        return (self.family.child.get_id(), "NA", "NA")
+
+
+class TestPrefetchPy(unittest.TestCase):
+    """ test the TrioPrefetcher
+    """
+
+    def setUp(self):
+        """ make a few families, including one with an unaffected child
+        """
+
+        self.families = {}
+        for family_id in ["fam_b", "fam_a", "fam_c"]:
+            family = Family(family_id)
+            family.add_child(family_id + "_child", family_id + ".vcf", "2", "F")
+            family.set_child()
+            self.families[family_id] = family
+
+        self.families["fam_a"].add_child("fam_a_sibling", "sibling.vcf", "1", "M")
+        self.families["fam_c"].add_child("fam_c_sibling", "sibling.vcf", "2", "M")
+
+    def get_family(self, family_id, child_id):
+        """ get a family set to a given child, as the analysis would use
+        """
+
+        family = self.families[family_id]
+        for child in family.children:
+            if child.get_id() == child_id:
+                family.child = child
+
+        return family
+
+    def test_get_probands(self):
+        """ check that we get each affected proband, in the analysis order
+        """
+
+        probands = get_probands(self.families)
+
+        self.assertEqual([(x.family_id, x.child.get_id()) for x in probands],
+            [("fam_a", "fam_a_child"), ("fam_b", "fam_b_child"),
+            ("fam_c", "fam_c_child"), ("fam_c", "fam_c_sibling")])
+
+        # the original families are unchanged
+        self.assertEqual(self.families["fam_c"].child.get_id(), "fam_c_child")
+
+    def test_estimate_size(self):
+        """ check that larger lists of variants have larger estimates
+        """
+
+        var = SNV("1", "100", ".", "A", "G", "PASS")
+        var.add_info("HGNC=ATRX;CQ=missense_variant")
+        single = estimate_size([TrioGenotypes(var)])
+
+        self.assertTrue(single > 0)
+        self.assertTrue(estimate_size([TrioGenotypes(var)] * 10) > single)
+
+    def test_prefetcher(self):
+        """ check that trios are loaded in order, up to the depth
+        """
+
+        reference = []
+        loader = FakeLoader(reference)
+        probands = get_probands(self.families)
+        prefetcher = TrioPrefetcher(loader, probands, 0.9, 2, 1e9)
+        reference.append(prefetcher)
+
+        for proband in probands:
+            family = self.get_family(proband.family_id, proband.child.get_id())
+            trio = prefetcher.get(family)
+            self.assertEqual(trio.provenance[0], proband.child.get_id())
+            self.assertEqual(trio.child_header, ["#CHROM\n"])
+            self.assertEqual(trio.counts, {"lines_scanned": 10, "bytes_read": 100})
+            self.assertEqual(len(trio.variants), 1)
+
+        prefetcher.close()
+
+        self.assertTrue(max(loader.waiting + [0]) <= 2)
+
+    def test_prefetcher_memory_budget(self):
+        """ check that a small memory budget only loads one trio at a time
+        """
+
+        reference = []
+        loader = FakeLoader(reference)
+        probands = get_probands(self.families)
+        prefetcher = TrioPrefetcher(loader, probands, 0.9, 10, 1)
+        reference.append(prefetcher)
+
+        for proband in probands:
+            prefetcher.get(self.get_family(proband.family_id, proband.child.get_id()))
+        prefetcher.close()
+
+        self.assertTrue(max(loader.waiting + [0]) <= 1)
+
+    def test_prefetcher_errors(self):
+        """ check that loading errors are raised when we reach the trio
+        """
+
+        loader = FakeLoader([], missing="fam_b_child")
+        probands = get_probands(self.families)
+        prefetcher = TrioPrefetcher(loader, probands, 0.9, 2, 1e9)
+
+        prefetcher.get(self.get_family("fam_a", "fam_a_child"))
+        with self.assertRaises(OSError):
+            prefetcher.get(self.get_family("fam_b", "fam_b_child"))
+
+        # and we raise an error if the trios are out of order
+        with self.assertRaises(ValueError):
+            prefetcher.get(self.get_family("fam_c", "fam_c_sibling"))
+
+        prefetcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+""" unit testing of the profiling classes
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.ped import Family
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.profiling import Profiler, StageTimer, MemoryProfiler, \
+    ProfilerGroup, NULL_STAGE, count_live_objects
+
+
+class TestProfilingPy(unittest.TestCase):
+    """ test the Profiler and StageTimer classes
+    """
+
+    def setUp(self):
+        """ make a temporary directory, and a family to profile
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "timings.jsonl")
+
+        self.family = Family("fam_id")
+        self.family.add_child("child_id", "child_vcf_path", "2", "F")
+        self.family.set_child()
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def test_null_profiler(self):
+        """ check that the default profiler records nothing
+        """
+
+        profiler = Profiler()
+        profiler.start_proband(self.family)
+        with profiler.stage("load_trio") as stage:
+            stage.update(variants=10)
+        profiler.end_proband()
+        profiler.close()
+
+        self.assertIs(profiler.stage("load_trio"), NULL_STAGE)
+
+    def test_stage_timer(self):
+        """ check that the StageTimer writes a line per proband and a summary
+        """
+
+        timer = StageTimer(self.path)
+        timer.start_proband(self.family)
+        with timer.stage("load_trio") as stage:
+            stage.update(lines_scanned=100, bytes_read=2000, variants=5)
+        with timer.stage("export_data") as stage:
+            stage.update(variants=2)
+
+        # stages which repeat for a proband get summed together
+        with timer.stage("export_data") as stage:
+            stage.update(variants=1)
+        timer.end_proband()
+        timer.close()
+
+        with open(self.path) as handle:
+            lines = [json.loads(line) for line in handle]
+
+        self.assertEqual(len(lines), 2)
+        proband, summary = lines
+
+        self.assertEqual(proband["proband"], "child_id")
+        self.assertEqual(proband["family_id"], "fam_id")
+        self.assertEqual(sorted(proband["stages"]), ["export_data", "load_trio"])
+        self.assertEqual(proband["stages"]["load_trio"]["lines_scanned"], 100)
+        self.assertEqual(proband["stages"]["load_trio"]["bytes_read"], 2000)
+        self.assertEqual(proband["stages"]["export_data"]["variants"], 3)
+        self.assertTrue(proband["stages"]["load_trio"]["wall"] >= 0)
+        self.assertTrue(proband["stages"]["load_trio"]["cpu"] >= 0)
+
+        self.assertTrue(summary["summary"])
+        self.assertEqual(summary["probands"], 1)
+        self.assertEqual(summary["stages"]["load_trio"]["variants"], 5)
+        self.assertIn("max_wall", summary["stages"]["load_trio"])
+
+    def test_stage_timer_without_proband(self):
+        """ check that stages outside of a proband are not recorded
+        """
+
+        timer = StageTimer(self.path)
+        self.assertIs(timer.stage("load_trio"), NULL_STAGE)
+        timer.close()
+
+        with open(self.path) as handle:
+            lines = [json.loads(line) for line in handle]
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["probands"], 0)
+
+
+    def test_count_live_objects(self):
+        """ check that we count the live objects of the variant classes
+        """
+
+        initial = count_live_objects(set(["SNV"]))["SNV"]
+        variants = [SNV("1", "100", ".", "A", "G", "PASS") for x in range(5)]
+
+        self.assertEqual(count_live_objects(set(["SNV"]))["SNV"], initial + 5)
+
+    def test_memory_profiler(self):
+        """ check that the MemoryProfiler records allocations for each stage
+        """
+
+        profiler = MemoryProfiler(self.path, top_sites=3)
+        profiler.start_proband(self.family)
+        with profiler.stage("load_trio"):
+            variants = [SNV("1", str(x), ".", "A", "G", "PASS") for x in range(1, 1000)]
+        profiler.end_proband()
+        profiler.close()
+
+        with open(self.path) as handle:
+            lines = [json.loads(line) for line in handle]
+
+        proband, summary = lines
+        stage = proband["stages"]["load_trio"]
+
+        # the variants are still alive, so the stage has allocated memory
+        self.assertTrue(stage["allocated"] > 0)
+        self.assertTrue(stage["peak"] >= stage["allocated"])
+        self.assertTrue(0 < len(stage["top_sites"]) <= 3)
+        self.assertTrue(stage["live_objects"]["SNV"] >= len(variants))
+        self.assertEqual(proband["max_live_objects"]["SNV"], stage["live_objects"]["SNV"])
+
+        self.assertTrue(summary["summary"])
+        self.assertEqual(summary["stages"]["load_trio"]["max_allocated"], stage["allocated"])
+
+    def test_profiler_group(self):
+        """ check that a ProfilerGroup passes the stages to every profiler
+        """
+
+        timings_path = os.path.join(self.temp_dir, "timings.jsonl")
+        memory_path = os.path.join(self.temp_dir, "memory.jsonl")
+        profiler = ProfilerGroup([StageTimer(timings_path), MemoryProfiler(memory_path)])
+
+        profiler.start_proband(self.family)
+        with profiler.stage("load_trio") as stage:
+            stage.update(variants=5)
+        profiler.end_proband()
+        profiler.close()
+
+        with open(timings_path) as handle:
+            timings = json.loads(handle.readline())
+        with open(memory_path) as handle:
+            memory = json.loads(handle.readline())
+
+        self.assertEqual(timings["stages"]["load_trio"]["variants"], 5)
+        self.assertIn("load_trio", memory["stages"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+""" unit testing of counting recurrent de novos across a cohort
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trio_genotypes import TrioGenotypes
+from clinicalfilter.recurrence import DeNovoRecurrence, get_de_novos
+
+
+class TestRecurrencePy(unittest.TestCase):
+    """ test counting de novos per gene and per site
+    """
+
+    def setUp(self):
+        """ make a temporary directory
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def create_snv(self, genotype, pos="15000000", cq="missense_variant", gene="TEST"):
+        """ create a SNV for a female
+        """
+
+        var = SNV("1", pos, ".", "A", "G", "PASS")
+        var.add_info("HGNC=" + gene + ";CQ=" + cq + ";DENOVO-SNP")
+        var.add_format("GT:DP", genotype + ":50")
+        var.set_gender("F")
+        var.set_genotype()
+
+        return var
+
+    def create_trio(self, genotypes, **kwargs):
+        """ create a TrioGenotypes object from the child, mother and father genotypes
+        """
+
+        child, mother, father = genotypes
+        var = TrioGenotypes(self.create_snv(child, **kwargs))
+        var.add_mother_variant(self.create_snv(mother, **kwargs))
+        var.add_father_variant(self.create_snv(father, **kwargs))
+
+        return var
+
+    def de_novo(self, pos, gene, cq_class="missense", consequence="missense_variant"):
+        """ make a de novo dictionary
+        """
+
+        return {"chrom": "1", "pos": pos, "ref": "A", "alt": "G", "gene": gene,
+            "consequence": consequence, "class": cq_class}
+
+    def test_get_de_novos(self):
+        """ check that we only get de novos, with their consequence class
+        """
+
+        variants = [self.create_trio(["0/1", "0/0", "0/0"]),
+            self.create_trio(["0/1", "0/1", "0/0"], pos="16000000"),
+            self.create_trio(["0/1", "0/0", "0/0"], pos="17000000", cq="stop_gained"),
+            self.create_trio(["0/1", "0/0", "0/0"], pos="18000000", cq="synonymous_variant")]
+
+        self.assertEqual(get_de_novos(variants), [
+            self.de_novo(15000000, "TEST"),
+            self.de_novo(17000000, "TEST", "lof", "stop_gained"),
+            self.de_novo(18000000, "TEST", "other", "synonymous_variant")])
+
+    def test_add_proband(self):
+        """ check that we count de novos per gene and per site
+        """
+
+        path = os.path.join(self.temp_dir, "counts.txt")
+        recurrence = DeNovoRecurrence(path)
+        recurrence.add_proband("fam1", "child1", [self.de_novo(100, "GENE1"),
+            self.de_novo(200, "GENE1,GENE2", "lof")])
+        recurrence.add_proband("fam2", "child2", [self.de_novo(100, "GENE1")])
+        recurrence.add_proband("fam3", "child3", [])
+
+        counts = recurrence.genes["GENE1"]
+        self.assertEqual(counts["probands"], set(["child1", "child2"]))
+        self.assertEqual((counts["de_novos"], counts["lof"], counts["missense"]), (3, 1, 2))
+        self.assertEqual(recurrence.get_recurrent_sites("GENE1"), 1)
+        self.assertEqual(recurrence.genes["GENE2"]["de_novos"], 1)
+        self.assertEqual(recurrence.sites[("1", 100, "A", "G")]["probands"],
+            ["child1", "child2"])
+
+        # each proband is appended to the counts file
+        with open(path) as handle:
+            entries = [json.loads(line) for line in handle]
+        self.assertEqual([x["proband"] for x in entries], ["child1", "child2", "child3"])
+
+        # probands are only counted once
+        recurrence.add_proband("fam2", "child2", [self.de_novo(100, "GENE1")])
+        self.assertEqual(recurrence.genes["GENE1"]["de_novos"], 3)
+        self.assertEqual(len(recurrence.entries), 3)
+
+    def test_write_summary(self):
+        """ check the per-gene and per-site tables
+        """
+
+        recurrence = DeNovoRecurrence()
+        recurrence.add_proband("fam1", "child1", [self.de_novo(100, "GENE1"),
+            self.de_novo(300, "GENE2", "lof")])
+        recurrence.add_proband("fam2", "child2", [self.de_novo(300, "GENE2", "lof")])
+
+        path = os.path.join(self.temp_dir, "summary.txt")
+        recurrence.write_summary(path)
+
+        with open(path) as handle:
+            self.assertEqual(handle.read(),
+                "gene\tprobands\tde_novos\tsites\trecurrent_sites\tlof\tmissense\tother\n"
+                "GENE2\t2\t2\t1\t1\t2\t0\t0\n"
+                "GENE1\t1\t1\t1\t0\t0\t1\t0\n")
+
+        with open(path + ".sites") as handle:
+            self.assertEqual(handle.read(),
+                "chrom\tpos\tref\talt\tgene\tconsequence\tclass\tprobands\tproband_ids\n"
+                "1\t300\tA\tG\tGENE2\tmissense_variant\tlof\t2\tchild1,child2\n"
+                "1\t100\tA\tG\tGENE1\tmissense_variant\tmissense\t1\tchild1\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
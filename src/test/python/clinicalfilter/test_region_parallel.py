@@ -0,0 +1,186 @@
+""" unit testing of the region-parallel analysis
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.ped import Family
+from clinicalfilter.vcf_index import PlainVCFIndex, TabixIndex
+from clinicalfilter.region_parallel import plan_regions, coalesce_regions, \
+    get_gene_intervals, RegionLoadVCFs, RegionResult, RegionParallelAnalysis
+
+from test_vcf_index import write_bgzf_vcf
+
+
+class TestRegionParallelPy(unittest.TestCase):
+    """ test the region planning and region loading
+    """
+
+    def setUp(self):
+        """ make a temporary directory, and a set of known genes
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.known_genes = {
+            "GENE1": {"chrom": "1", "start": 1000, "end": 5000},
+            "GENE2": {"chrom": "1", "start": 4000, "end": 9000},
+            "GENE3": {"chrom": "1", "start": 20000, "end": 30000},
+            "GENE4": {"chrom": "1", "start": 50000, "end": 60000},
+            "GENE5": {"chrom": "2", "start": 1000, "end": 2000}}
+
+        self.header = ["##fileformat=VCFv4.1\n",
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"]
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_gene_intervals(self):
+        """ check that overlapping genes are merged into single intervals
+        """
+
+        self.assertEqual(get_gene_intervals(self.known_genes, "1"),
+            [[1000, 9000], [20000, 30000], [50000, 60000]])
+        self.assertEqual(get_gene_intervals(self.known_genes, "X"), [])
+
+    def test_plan_regions(self):
+        """ check that regions are only cut in the gaps between genes
+        """
+
+        regions = plan_regions(["1", "2", "X"], self.known_genes, region_size=5000)
+        self.assertEqual(regions, [("1", 1, 14500), ("1", 14501, 40000),
+            ("1", 40001, None), ("2", 1, None), ("X", 1, None)])
+
+        # large regions don't split chromosomes
+        regions = plan_regions(["1", "2"], self.known_genes, region_size=1000000)
+        self.assertEqual(regions, [("1", 1, None), ("2", 1, None)])
+
+        # without known genes, we use whole chromosomes
+        regions = plan_regions(["1", "2"], None, region_size=10000)
+        self.assertEqual(regions, [("1", 1, None), ("2", 1, None)])
+
+    def test_coalesce_regions(self):
+        """ check that we combine regions when a CNV extends past a region
+        """
+
+        regions = [("1", 1, 100), ("1", 101, 200), ("1", 201, None), ("2", 1, None)]
+        results = [RegionResult([], None, 10), RegionResult([], 250, 10),
+            RegionResult([], 250, 10), RegionResult([], 300, 10)]
+
+        new_regions, new_results = coalesce_regions(regions, results)
+        self.assertEqual(new_regions, [("1", 1, 100), ("1", 101, None), ("2", 1, None)])
+        self.assertEqual(new_results, [results[0], None, results[3]])
+
+        # a CNV within the region doesn't combine regions
+        results[1] = RegionResult([], 200, 10)
+        new_regions, new_results = coalesce_regions(regions, results)
+        self.assertEqual(new_regions, regions)
+
+    def test_merge_results(self):
+        """ check that genes found in several regions are checked again
+        """
+
+        class Finder(object):
+            known_genes = None
+            def find_variants(self, variants, gene):
+                return [(tuple(variants), "combined", gene)]
+
+        analysis = RegionParallelAnalysis(Finder(), 2)
+        results = [RegionResult([("GENE1", ["a"], [("a", "single", "GENE1")]),
+                ("GENE2", ["b"], [("b", "single", "GENE2")])], None, 10),
+            RegionResult([("GENE3", ["c"], []),
+                ("GENE1", ["d"], [("d", "single", "GENE1")])], None, 10)]
+
+        self.assertEqual(analysis.merge_results(results),
+            [(("a", "d"), "combined", "GENE1"), ("b", "single", "GENE2")])
+
+    def write_trio(self, compress):
+        """ write VCFs for a trio, and get a dictionary of indexes
+
+        Args:
+            compress: whether to write bgzipped VCFs with tabix indexes
+        """
+
+        info = "CQ=missense_variant;HGNC=GENE3;MAX_AF=0.0001"
+        cnv_info = "SVLEN=10000;CNSOLIDATE;MEANLR2=-1.5;MADL2R=0.05;WSCORE=0.9;" \
+            "CALLP=0.001;COMMONFORWARDS=0.1;NUMBEREXONS=5;CNS=1;HGNC=GENE3;" \
+            "CQ=transcript_ablation"
+        child = ["1\t15000\t.\tA\t<DEL>\t50\tPASS\tEND=25000;" + cnv_info + "\tCN\t1\n",
+            "1\t21000\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n",
+            "1\t22000\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n"]
+        mother = ["1\t14000\t.\tA\t<DEL>\t50\tPASS\tEND=24000;" + cnv_info + "\tCN\t1\n",
+            "1\t21000\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n"]
+        father = ["1\t22000\t.\tA\tG\t50\tPASS\t" + info + "\tGT\t0/1\n"]
+
+        family = Family("fam_id")
+        indexes = {}
+        for name, lines in [("child", child), ("mother", mother), ("father", father)]:
+            path = os.path.join(self.temp_dir, name + ".vcf")
+            if compress:
+                path += ".gz"
+                write_bgzf_vcf(path, self.header, lines)
+                indexes[path] = TabixIndex(path)
+            else:
+                with open(path, "w") as handle:
+                    handle.writelines(self.header + lines)
+                indexes[path] = PlainVCFIndex(path)
+
+            if name == "child":
+                family.add_child(name, path, "2", "F")
+            elif name == "mother":
+                family.add_mother(name, path, "1", "F")
+            else:
+                family.add_father(name, path, "1", "M")
+
+        family.set_child()
+
+        return family, indexes
+
+    def check_region_loading(self, compress):
+        """ check the variants loaded for regions of a trio
+        """
+
+        family, indexes = self.write_trio(compress)
+
+        # the child's variants within the region are loaded, along with the
+        # parents variants matching the child's variants
+        loader = RegionLoadVCFs(("1", 20001, None), indexes, None, None, None, None)
+        loader.family = family
+        child_vars, mother_vars, father_vars = loader.load_trio()
+
+        self.assertEqual([x.get_key() for x in child_vars], [("1", 21000), ("1", 22000)])
+        self.assertEqual([x.get_key() for x in mother_vars], [("1", 21000)])
+        self.assertEqual([x.get_key() for x in father_vars], [("1", 22000)])
+        self.assertIsNone(loader.cnv_end)
+
+        # the child's CNV starts in the first region, and the mother's
+        # matching CNV is loaded, even though it starts before the region
+        loader = RegionLoadVCFs(("1", 14500, 20000), indexes, None, None, None, None)
+        loader.family = family
+        child_vars, mother_vars, father_vars = loader.load_trio()
+
+        self.assertEqual([x.get_key() for x in child_vars], [("1", 15000, 25000)])
+        self.assertEqual([x.get_key() for x in mother_vars], [("1", 14000, 24000)])
+        self.assertEqual(father_vars, [])
+        self.assertEqual(loader.cnv_end, 25000)
+
+    def test_region_loading_plain(self):
+        """ check loading regions from uncompressed VCFs
+        """
+
+        self.check_region_loading(compress=False)
+
+    def test_region_loading_bgzf(self):
+        """ check loading regions from bgzipped VCFs
+        """
+
+        self.check_region_loading(compress=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+""" unit testing of the checkpointing for resuming runs
+"""
+
+import unittest
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+from clinicalfilter.ped import Family
+from clinicalfilter.resume import RunManifest, get_config_hash, \
+    get_file_checksum, inputs_unchanged
+from clinicalfilter.prefetch import get_probands
+
+
+class TestResumePy(unittest.TestCase):
+    """ test the RunManifest
+    """
+
+    def setUp(self):
+        """ make a temporary directory, with a few families
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.temp_dir, "output.txt")
+
+        self.families = {}
+        for family_id in ["fam1", "fam2", "fam3"]:
+            vcf = os.path.join(self.temp_dir, family_id + ".vcf")
+            self.write(vcf, family_id + " vcf\n")
+            family = Family(family_id)
+            family.add_child(family_id + "_child", vcf, "2", "F")
+            self.families[family_id] = family
+
+        self.probands = get_probands(self.families)
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, path, text, mode="w"):
+        """ write text to a file
+        """
+
+        with open(path, mode) as handle:
+            handle.write(text)
+
+    def run_probands(self, manifest, probands):
+        """ write output lines for each proband, and record them as done
+        """
+
+        for family in probands:
+            if manifest.is_complete(family):
+                continue
+            self.write(self.output, family.child.get_id() + "\n", "a")
+            checksum = get_file_checksum(family.child.get_path())
+            manifest.add_proband(family, [(checksum, "NA", "NA")] * 3)
+
+    def start_run(self):
+        """ start a run, as if with a clean output
+        """
+
+        manifest = RunManifest(self.output, "hash")
+        if not manifest.resume(self.probands):
+            self.write(self.output, "header\n")
+
+        return manifest
+
+    def test_get_config_hash(self):
+        """ check that the hash changes with the options, and the files they name
+        """
+
+        genes = os.path.join(self.temp_dir, "genes.txt")
+        self.write(genes, "gene list")
+        options = argparse.Namespace(genes=genes, regions=None, pp_filter=0.9,
+            timings="timings.json")
+        initial = get_config_hash(options)
+
+        # options that don't affect the output don't change the hash
+        options.timings = "other.json"
+        self.assertEqual(get_config_hash(options), initial)
+
+        options.pp_filter = 0.5
+        self.assertNotEqual(get_config_hash(options), initial)
+
+        options.pp_filter = 0.9
+        self.write(genes, "updated gene list")
+        self.assertNotEqual(get_config_hash(options), initial)
+
+    def test_inputs_unchanged(self):
+        """ check that we only accept unchanged VCFs
+        """
+
+        path = self.families["fam1"].children[0].get_path()
+        stat = os.stat(path)
+        inputs = [[path, stat.st_size, stat.st_mtime_ns, get_file_checksum(path)]]
+        self.assertTrue(inputs_unchanged(inputs))
+
+        # a touched file is accepted if the contents are the same
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(inputs_unchanged(inputs))
+
+        self.write(path, "fam1 VCF\n")
+        self.assertFalse(inputs_unchanged(inputs))
+
+        os.remove(path)
+        self.assertFalse(inputs_unchanged(inputs))
+
+    def test_resume(self):
+        """ check that we resume after the finished probands
+        """
+
+        manifest = self.start_run()
+        self.run_probands(manifest, self.probands)
+        with open(self.output) as handle:
+            complete = handle.read()
+
+        # make the run die after the first proband, partway through writing
+        # the second proband's results
+        with open(manifest.path) as handle:
+            lines = handle.readlines()
+        self.write(manifest.path, "".join(lines[:2]) + lines[2][:10])
+        offset = json.loads(lines[1])["offset"]
+        self.write(self.output, complete[:offset + 3])
+
+        manifest = self.start_run()
+        self.assertTrue(manifest.is_complete(self.probands[0]))
+        self.assertFalse(manifest.is_complete(self.probands[1]))
+
+        self.run_probands(manifest, self.probands)
+        with open(self.output) as handle:
+            self.assertEqual(handle.read(), complete)
+
+    def test_resume_changed_inputs(self):
+        """ check that we rerun from the first proband with a changed VCF
+        """
+
+        manifest = self.start_run()
+        self.run_probands(manifest, self.probands)
+
+        self.write(self.families["fam2"].children[0].get_path(), "changed\n")
+
+        manifest = self.start_run()
+        self.assertTrue(manifest.is_complete(self.probands[0]))
+        self.assertFalse(manifest.is_complete(self.probands[1]))
+        self.assertFalse(manifest.is_complete(self.probands[2]))
+
+        with open(self.output) as handle:
+            self.assertEqual(handle.read(), "header\nfam1_child\n")
+
+    def test_resume_changed_config(self):
+        """ check that we start from scratch if the options have changed
+        """
+
+        manifest = self.start_run()
+        self.run_probands(manifest, self.probands)
+
+        manifest = RunManifest(self.output, "other")
+        self.assertFalse(manifest.resume(self.probands))
+        self.assertFalse(manifest.is_complete(self.probands[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+""" unit testing of the cache of parsed site annotations
+"""
+
+import unittest
+
+from clinicalfilter.site_cache import SiteCache
+from clinicalfilter.variant.snv import SNV
+
+
+class TestSiteCachePy(unittest.TestCase):
+    """ test the site annotation cache
+    """
+    
+    def setUp(self):
+        """ define a default cache, and clear the known genes
+        """
+        
+        self.cache = SiteCache(2)
+        SNV.known_genes = None
+        SNV.excluded_genes = None
+    
+    def make_line(self, pos="100", alt="G", info="CQ=missense_variant;HGNC=ATRX"):
+        """ make a VCF line for a SNV
+        """
+        
+        return ["1", pos, ".", "T", alt, "1000", "PASS", info, "GT", "0/1"]
+    
+    def make_var(self, line):
+        """ make a SNV for a VCF line, before adding the INFO
+        """
+        
+        return SNV(line[0], line[1], line[2], line[3], line[4], line[6])
+    
+    def test_add_info(self):
+        """ check that cached annotations match parsing the INFO
+        """
+        
+        line = self.make_line(alt="G,C",
+            info="CQ=missense_variant,stop_gained;HGNC=ATRX,ATRX;ENST=ENST1,ENST1")
+        
+        expected = self.make_var(line)
+        expected.add_info(line[7])
+        
+        first = self.make_var(line)
+        self.cache.add_info(first, line)
+        second = self.make_var(line)
+        self.cache.add_info(second, line)
+        
+        for var in [first, second]:
+            self.assertEqual(var.info, expected.info)
+            self.assertEqual(var.consequence, expected.consequence)
+            self.assertEqual(var.gene, expected.gene)
+        
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+        self.assertEqual(self.cache.get_stats()["misses"], 1)
+        
+        # each variant has its own copy of the INFO dictionary
+        first.info["CNS"] = "3"
+        self.assertNotIn("CNS", second.info)
+        self.assertNotIn("CNS", self.cache.peek(line).info)
+    
+    def test_key_includes_info(self):
+        """ check that sites with different INFO or FILTER are cached separately
+        """
+        
+        line = self.make_line()
+        other = self.make_line(info="CQ=stop_gained;HGNC=ATRX")
+        
+        self.cache.add_info(self.make_var(line), line)
+        var = self.make_var(other)
+        self.cache.add_info(var, other)
+        self.assertEqual(var.consequence, "stop_gained")
+        
+        failed = self.make_line()
+        failed[6] = "FAIL"
+        self.assertIsNone(self.cache.peek(failed))
+        self.assertEqual(self.cache.get_stats()["misses"], 2)
+    
+    def test_eviction(self):
+        """ check that we evict the least recently used sites
+        """
+        
+        lines = [self.make_line(pos=x) for x in ["100", "200", "300"]]
+        
+        self.cache.add_info(self.make_var(lines[0]), lines[0])
+        self.cache.add_info(self.make_var(lines[1]), lines[1])
+        
+        # use the first site again, so the second site is the oldest
+        self.cache.add_info(self.make_var(lines[0]), lines[0])
+        self.cache.add_info(self.make_var(lines[2]), lines[2])
+        
+        self.assertIsNotNone(self.cache.peek(lines[0]))
+        self.assertIsNone(self.cache.peek(lines[1]))
+        self.assertIsNotNone(self.cache.peek(lines[2]))
+        
+        self.assertEqual(self.cache.get_stats(), {"hits": 1, "misses": 3,
+            "evictions": 1, "sites": 2, "hit_rate": 0.25})
+    
+    def test_get_stats_without_lookups(self):
+        """ check that the hit rate is None before any lookups
+        """
+        
+        self.assertIsNone(self.cache.get_stats()["hit_rate"])
+    
+    def test_passes_filters(self):
+        """ check that we cache whether sites pass the filters
+        """
+        
+        line = self.make_line()
+        var = self.make_var(line)
+        
+        # sites which aren't in the cache are checked directly
+        var.add_info(line[7])
+        self.assertTrue(self.cache.passes_filters(var, line))
+        
+        self.cache.add_info(var, line)
+        self.assertTrue(self.cache.passes_filters(var, line))
+        self.assertTrue(self.cache.peek(line).passes)
+        
+        # later variants at the site use the cached verdict
+        other = self.make_var(line)
+        self.cache.add_info(other, line)
+        other.passes_filters = lambda: False
+        self.assertTrue(self.cache.passes_filters(other, line))
+    
+    def test_set_gene_from_known_gene_overlap(self):
+        """ check that we cache the known genes which overlap sites
+        """
+        
+        SNV.known_genes = {"TTN": {"start": 50, "end": 150, "chrom": "1"}}
+        
+        try:
+            line = self.make_line(info="CQ=missense_variant")
+            var = self.make_var(line)
+            self.cache.add_info(var, line)
+            
+            expected = self.make_var(line)
+            expected.add_info(line[7])
+            expected.set_gene_from_known_gene_overlap()
+            
+            self.cache.set_gene_from_known_gene_overlap(var, line)
+            self.assertEqual(var.gene, expected.gene)
+            self.assertEqual(self.cache.peek(line).known_gene, expected.gene)
+            
+            other = self.make_var(line)
+            self.cache.add_info(other, line)
+            self.cache.set_gene_from_known_gene_overlap(other, line)
+            self.assertEqual(other.gene, expected.gene)
+        finally:
+            SNV.known_genes = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+""" unit testing of finding the syndrome regions overlapping CNVs
+"""
+
+import unittest
+import random
+
+from clinicalfilter.syndrome_regions import index_cnv_regions, \
+    find_syndrome_regions, has_enough_overlap
+
+
+class TestSyndromeRegionsPy(unittest.TestCase):
+    """ test finding syndrome regions for CNVs
+    """
+
+    def test_index_cnv_regions(self):
+        """ check that we index the regions with integer values
+        """
+
+        index = index_cnv_regions({("1", "1000", "2000"): "1",
+            ("2", "5000", "6000"): 3})
+        self.assertEqual(index.get_intervals("1"), [(1000, 2000, 1)])
+        self.assertEqual(index.get_intervals("2"), [(5000, 6000, 3)])
+
+        # an index is used as it is
+        self.assertIs(index_cnv_regions(index), index)
+
+    def test_find_syndrome_regions(self):
+        """ check that we only find regions with enough overlap and the same
+        copy number
+        """
+
+        index = index_cnv_regions({("1", "1000", "2000"): "1",
+            ("1", "1500", "3000"): "3", ("1", "1995", "100000"): "1",
+            ("2", "1000", "2000"): "1"})
+
+        self.assertEqual(find_syndrome_regions(index, "1", 1000, 2000, 1),
+            [(1000, 2000, 1)])
+        self.assertEqual(find_syndrome_regions(index, "1", 1000, 2000),
+            [(1000, 2000, 1), (1500, 3000, 3)])
+        self.assertEqual(find_syndrome_regions(index, "3", 1000, 2000), [])
+
+    def test_find_syndrome_regions_random(self):
+        """ check that we match comparing every region, for random regions
+        """
+
+        rng = random.Random(1)
+
+        def random_region():
+            start = rng.randint(1, 1000000)
+            return (rng.choice(["1", "2"]), start, start + rng.randint(0, 200000))
+
+        regions = {}
+        for i in range(200):
+            regions[random_region()] = rng.choice([0, 1, 3])
+        index = index_cnv_regions(regions)
+
+        for i in range(300):
+            chrom, start, end = random_region()
+            copy_number = rng.choice([0, 1, 3])
+
+            expected = []
+            for key, value in regions.items():
+                if key[0] == chrom and value == copy_number and \
+                        start <= key[2] and end >= key[1] and \
+                        has_enough_overlap(start, end, key[1], key[2]):
+                    expected.append((key[1], key[2], value))
+
+            self.assertEqual(find_syndrome_regions(index, chrom, start, end,
+                copy_number), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
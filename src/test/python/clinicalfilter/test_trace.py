@@ -0,0 +1,121 @@
+""" unit testing of tracing the filtering of variants
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+from clinicalfilter.trace import Tracer, open_trace_positions
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trio_genotypes import TrioGenotypes
+from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
+
+
+class TestTracePy(unittest.TestCase):
+    """ test the tracer
+    """
+
+    def setUp(self):
+        """ make a temporary directory
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "trace.txt")
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        SNV.tracer = None
+        shutil.rmtree(self.temp_dir)
+
+    def read_records(self):
+        """ get the records from the trace file
+        """
+
+        with open(self.path) as handle:
+            return [json.loads(line) for line in handle]
+
+    def create_parent(self):
+        """ create a reference genotype SNV for a parent
+        """
+
+        var = SNV("1", "15000000", ".", "A", "G", "PASS")
+        var.add_info("HGNC=TEST;CQ=missense_variant")
+        var.add_format("GT:DP", "0/0:50")
+        var.set_gender("F")
+        var.set_genotype()
+
+        return var
+
+    def test_open_trace_positions(self):
+        """ check that we load the positions to trace
+        """
+
+        path = os.path.join(self.temp_dir, "positions.txt")
+        with open(path, "w") as handle:
+            handle.write("# chrom\tpos\n1\t1000\n\nX 2000\n2:3000\n")
+
+        self.assertEqual(open_trace_positions(path),
+            set([("1", 1000), ("X", 2000), ("2", 3000)]))
+
+        with open(path, "w") as handle:
+            handle.write("1\n")
+
+        with self.assertRaises(ValueError):
+            open_trace_positions(path)
+
+    def test_log(self):
+        """ check that we only record the traced positions
+        """
+
+        tracer = Tracer([("1", 1000), ("X", "2000")], self.path)
+        self.assertTrue(tracer.is_traced("X", 2000))
+        self.assertFalse(tracer.is_traced("1", 2000))
+
+        tracer.set_proband("child1")
+        tracer.log("1", 1000, "filters", "fail", "MAF", {"value": 0.05})
+        tracer.log("1", 2000, "filters", "fail", "MAF", {"value": 0.05})
+        tracer.log("X", 2000, "de_novo", "pass")
+
+        self.assertEqual(self.read_records(), [
+            {"proband": "child1", "chrom": "1", "pos": 1000, "stage": "filters",
+                "decision": "fail", "reason": "MAF", "value": 0.05},
+            {"proband": "child1", "chrom": "X", "pos": 2000, "stage": "de_novo",
+                "decision": "pass"}])
+
+    def test_trace_variants(self):
+        """ check the records for a variant passing through the analysis stages
+        """
+
+        SNV.tracer = Tracer([("1", 15000000)], self.path)
+        SNV.tracer.set_proband("child1")
+
+        var = SNV("1", "15000000", ".", "A", "G", "PASS")
+        var.add_info("HGNC=TEST;CQ=missense_variant;DENOVO-SNP;MAX_AF=0.005")
+        var.add_format("GT:DP:PP_DNM", "0/1:50:0.5")
+        var.set_gender("F")
+        var.set_genotype()
+
+        trio = TrioGenotypes(var)
+        trio.add_mother_variant(self.create_parent())
+        trio.add_father_variant(self.create_parent())
+
+        self.assertFalse(trio.passes_de_novo_checks(0.9))
+        self.assertTrue(trio.passes_de_novo_checks(0.1))
+
+        post_filter = PostInheritanceFilter([(trio, "single_variant", "Monoallelic")],
+            SNV.tracer)
+        self.assertEqual(post_filter.filter_variants(), [])
+
+        records = self.read_records()
+        self.assertEqual([(x["stage"], x["decision"], x.get("reason")) for x in records],
+            [("de_novo", "fail", "PP_DNM"), ("de_novo", "pass", None),
+            ("post_inheritance", "fail", "low MAF in non-biallelic variant")])
+        self.assertEqual(records[0]["value"], "0.5")
+
+
+if __name__ == '__main__':
+    unittest.main()
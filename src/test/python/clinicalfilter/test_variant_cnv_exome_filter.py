@@ -57,6 +57,11 @@ class TestExomeCnvPy(unittest.TestCase):
         self.var.cnv.info["MEANLR2"] = "-2.1"
         self.var.add_cns_state()
         self.assertEqual(self.var.cnv.info["CNS"], "0")
+        
+        # changing the CNS state clears the values derived from the INFO
+        self.var.cnv.finalise_info()
+        self.var.add_cns_state()
+        self.assertIsNone(self.var.cnv.derived)
     
     def test_fails_mad_ratio(self):
         """ test that fails_mad_ratio() works correctly
@@ -119,6 +119,33 @@ class TestVariantInfoPy(unittest.TestCase):
             self.var.info[pop] = "0.05"
             self.assertEqual(self.var.find_max_allele_frequency(), 0.05)
     
+    def test_finalise_info(self):
+        """ test that finalise_info() stores the derived values, until cleared
+        """
+        
+        self.var.info["MAX_AF"] = "0.005"
+        self.var.finalise_info()
+        
+        self.assertEqual(self.var.derived, {"max_af": 0.005,
+            "range": (15000000, 15000000), "lof": False, "missense": True})
+        
+        # changes to the INFO aren't seen until the stored values are cleared
+        self.var.info["MAX_AF"] = "0.05"
+        self.var.consequence = "stop_gained"
+        self.assertEqual(self.var.find_max_allele_frequency(), 0.005)
+        self.assertTrue(self.var.is_missense())
+        
+        self.var.clear_derived_values()
+        self.assertEqual(self.var.find_max_allele_frequency(), 0.05)
+        self.assertTrue(self.var.is_lof())
+        self.assertFalse(self.var.is_missense())
+        
+        # adding the INFO again also clears the stored values
+        self.var.finalise_info()
+        self.var.add_info("HGNC=ATRX;CQ=synonymous_variant;MAX_AF=0.2")
+        self.assertIsNone(self.var.derived)
+        self.assertEqual(self.var.find_max_allele_frequency(), 0.2)
+    
     
 
 
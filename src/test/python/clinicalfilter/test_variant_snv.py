@@ -4,8 +4,10 @@
 import unittest
 from io import StringIO
 import sys
+import json
 
 from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trace import Tracer
 
 class TestVariantSnvPy(unittest.TestCase):
     """
@@ -332,25 +334,38 @@ class TestVariantSnvPy(unittest.TestCase):
             self.var.consequence = cq
             self.assertFalse(self.var.passes_filters())
     
-    def test_passes_filters_with_debug(self):
-        """ check that passes_filters_with_debug() generates a failure message
+    def test_passes_filters_with_trace(self):
+        """ check that passes_filters_with_trace() records the failure
         """
         
         # make a variant that will fail the filtering, and set the site for
-        # debugging
+        # tracing
         self.var.info["AFR_AF"] = "0.05"
-        self.var.debug_pos = self.var.get_position()
+        self.var.tracer = Tracer([("1", self.var.get_position())])
         
-        # get ready to capture the output from a print function
+        # get ready to capture the output from the tracer
         out = StringIO()
         sys.stdout = out
-        
-        # check that the variant fails (and secondarily prints the failure mode)
-        self.assertFalse(self.var.passes_filters_with_debug())
-        output = out.getvalue().strip()
-        
-        # check that the message about why the variant failed filtering is correct
-        self.assertEqual(output, "failed MAF: 0.05")
+        try:
+            # check that the variant fails (and secondarily records the failure)
+            self.assertFalse(self.var.passes_filters_with_trace())
+        finally:
+            sys.stdout = sys.__stdout__
+        
+        # check that the record of why the variant failed filtering is correct
+        self.assertEqual(json.loads(out.getvalue()), {"proband": None,
+            "chrom": "1", "pos": 15000000, "stage": "filters",
+            "decision": "fail", "reason": "MAF", "value": 0.05})
+        
+        # variants at other positions aren't recorded
+        out = StringIO()
+        sys.stdout = out
+        self.var.tracer = Tracer([("1", 100)])
+        try:
+            self.assertFalse(self.var.passes_filters_with_trace())
+        finally:
+            sys.stdout = sys.__stdout__
+        self.assertEqual(out.getvalue(), "")
     
 
 if __name__ == '__main__':
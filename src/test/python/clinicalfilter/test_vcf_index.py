@@ -0,0 +1,338 @@
+""" unit testing of the VCF indexes
+"""
+
+import unittest
+import os
+import gzip
+import shutil
+import struct
+import tempfile
+import zlib
+
+from clinicalfilter.vcf_index import BgzfReader, TabixIndex, PlainVCFIndex, \
+    open_vcf_index, get_record_end, reg2bins, is_bgzf
+
+# the empty block which marks the end of a BGZF file
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00" \
+    b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+
+def make_bgzf_block(data):
+    """ compress bytes into a single BGZF block
+    """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    block_size = 18 + len(compressed) + 8
+    header = struct.pack("<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67,
+        2, block_size - 1)
+    trailer = struct.pack("<II", zlib.crc32(data) & 0xFFFFFFFF, len(data))
+
+    return header + compressed + trailer
+
+def reg2bin(start, end):
+    """ find the smallest tabix bin which contains a zero-based region
+    """
+
+    end -= 1
+    for shift, offset in [(14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)]:
+        if start >> shift == end >> shift:
+            return offset + (start >> shift)
+
+    return 0
+
+def write_bgzf_vcf(path, header, lines, lines_per_block=2):
+    """ write a bgzipped VCF, with a tabix index
+
+    We lack bgzip and tabix in the test environment, so this writes the
+    blocks and the index directly.
+
+    Args:
+        path: path to write the VCF to, the index is written to path + ".tbi"
+        header: list of header lines
+        lines: list of VCF lines, sorted by chromosome and position
+        lines_per_block: number of VCF lines to put in each BGZF block
+    """
+
+    blocks = [make_bgzf_block("".join(header).encode("utf-8"))]
+    offset = len(blocks[0])
+
+    chroms = []
+    bins = {}
+    linear = {}
+    for i in range(0, len(lines), lines_per_block):
+        within = 0
+        for line in lines[i:i + lines_per_block]:
+            fields = line.split("\t")
+            chrom = fields[0]
+            if chrom not in bins:
+                chroms.append(chrom)
+                bins[chrom] = {}
+                linear[chrom] = {}
+
+            start = int(fields[1]) - 1
+            end = get_record_end(fields)
+            virtual_start = (offset << 16) | within
+            within += len(line.encode("utf-8"))
+            virtual_end = (offset << 16) | within
+
+            # add the record to the chunks for its bin, merging with the
+            # previous chunk if they are adjacent
+            chunks = bins[chrom].setdefault(reg2bin(start, end), [])
+            if len(chunks) > 0 and chunks[-1][1] == virtual_start:
+                chunks[-1][1] = virtual_end
+            else:
+                chunks.append([virtual_start, virtual_end])
+
+            for window in range(start >> 14, ((end - 1) >> 14) + 1):
+                if window not in linear[chrom]:
+                    linear[chrom][window] = virtual_start
+
+        block = make_bgzf_block("".join(lines[i:i + lines_per_block]).encode("utf-8"))
+        blocks.append(block)
+        offset += len(block)
+
+    with open(path, "wb") as handle:
+        handle.write(b"".join(blocks) + BGZF_EOF)
+
+    names = b"".join([x.encode("utf-8") + b"\x00" for x in chroms])
+    index = [b"TBI\x01", struct.pack("<iiiiiiii", len(chroms), 2, 1, 2, 0,
+        ord("#"), 0, len(names)), names]
+    for chrom in chroms:
+        index.append(struct.pack("<i", len(bins[chrom])))
+        for bin_number in sorted(bins[chrom]):
+            chunks = bins[chrom][bin_number]
+            index.append(struct.pack("<Ii", bin_number, len(chunks)))
+            for chunk in chunks:
+                index.append(struct.pack("<QQ", chunk[0], chunk[1]))
+
+        # fill in the windows lacking records with the following offset
+        windows = linear[chrom]
+        size = max(windows) + 1
+        offsets = [0] * size
+        for window in range(size - 1, -1, -1):
+            offsets[window] = windows.get(window, offsets[window + 1] if window + 1 < size else 0)
+        index.append(struct.pack("<i", size))
+        index.append(struct.pack("<" + "Q" * size, *offsets))
+
+    with open(path + ".tbi", "wb") as handle:
+        handle.write(make_bgzf_block(b"".join(index)) + BGZF_EOF)
+
+
+class TestVcfIndexPy(unittest.TestCase):
+    """ test the VCF indexes
+    """
+
+    def setUp(self):
+        """ make a temporary directory, and some VCF lines
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.header = ["##fileformat=VCFv4.1\n",
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"]
+
+        self.lines = []
+        for position in range(100, 1000000, 25000):
+            self.lines.append("1\t{0}\t.\tA\tG\t50\tPASS\tHGNC=GENE\tGT\t0/1\n".format(position))
+        self.lines.insert(3, "1\t50100\t.\tA\t<DEL>\t50\tPASS\tEND=600000\tGT\t0/1\n")
+        for position in range(100, 200000, 25000):
+            self.lines.append("2\t{0}\t.\tA\tG\t50\tPASS\tHGNC=GENE\tGT\t0/1\n".format(position))
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def write_plain_vcf(self, lines):
+        """ write an uncompressed VCF, and return the path
+        """
+
+        path = os.path.join(self.temp_dir, "sample.vcf")
+        with open(path, "w") as handle:
+            handle.writelines(self.header + lines)
+
+        return path
+
+    def write_bgzf(self):
+        """ write a bgzipped VCF with a tabix index, and return the path
+        """
+
+        path = os.path.join(self.temp_dir, "sample.vcf.gz")
+        write_bgzf_vcf(path, self.header, self.lines)
+
+        return path
+
+    def get_overlapping(self, chrom, start, end):
+        """ find the lines overlapping a region by checking every line
+        """
+
+        overlapping = []
+        for line in self.lines:
+            fields = line.split("\t")
+            if fields[0] != chrom:
+                continue
+            if end is not None and int(fields[1]) > end:
+                continue
+            if get_record_end(fields) < start:
+                continue
+            overlapping.append(line)
+
+        return overlapping
+
+    def test_get_record_end(self):
+        """ check that we find the end of VCF records
+        """
+
+        fields = "1\t100\t.\tA\tG\t50\tPASS\tHGNC=GENE\tGT\t0/1".split("\t")
+        self.assertEqual(get_record_end(fields), 100)
+
+        fields = "1\t100\t.\tAAA\tG\t50\tPASS\tHGNC=GENE\tGT\t0/1".split("\t")
+        self.assertEqual(get_record_end(fields), 102)
+
+        fields = "1\t100\t.\tA\t<DEL>\t50\tPASS\tEND=2000;SVLEN=1900\tGT\t0/1".split("\t")
+        self.assertEqual(get_record_end(fields), 2000)
+
+        # make sure we don't mistake other fields for the END field
+        fields = "1\t100\t.\tA\t<DEL>\t50\tPASS\tCIEND=2000\tGT\t0/1".split("\t")
+        self.assertEqual(get_record_end(fields), 100)
+
+    def test_reg2bins(self):
+        """ check that the bins for a region include the smallest bins
+        """
+
+        bins = reg2bins(0, 1)
+        self.assertEqual(bins, [0, 1, 9, 73, 585, 4681])
+
+        bins = reg2bins(0, 20000)
+        self.assertIn(4682, bins)
+
+    def test_plain_index(self):
+        """ check that we fetch regions from an uncompressed VCF
+        """
+
+        index = PlainVCFIndex(self.write_plain_vcf(self.lines), spacing=3)
+
+        self.assertTrue(index.is_valid())
+        self.assertEqual(index.chroms, ["1", "2"])
+
+        for chrom, start, end in [("1", 1, None), ("1", 200000, 300000),
+                ("1", 700000, None), ("1", 600001, 625000), ("2", 30000, 80000),
+                ("3", 1, None)]:
+            self.assertEqual(list(index.fetch(chrom, start, end)),
+                self.get_overlapping(chrom, start, end))
+
+    def test_plain_index_unsorted(self):
+        """ check that unsorted VCFs are not indexed
+        """
+
+        lines = [self.lines[1], self.lines[0]] + self.lines[2:]
+        index = PlainVCFIndex(self.write_plain_vcf(lines))
+        self.assertFalse(index.is_valid())
+
+        # and VCFs where a chromosome reappears
+        lines = self.lines + [self.lines[0]]
+        index = PlainVCFIndex(self.write_plain_vcf(lines))
+        self.assertFalse(index.is_valid())
+
+    def test_plain_index_cache(self):
+        """ check that the index for an uncompressed VCF is cached next to it
+        """
+
+        path = self.write_plain_vcf(self.lines)
+        index = open_vcf_index(path, cache=True)
+        self.assertTrue(os.path.exists(path + ".cfidx"))
+
+        # the cached index fetches the same lines as a fresh scan
+        cached = open_vcf_index(path, cache=True)
+        self.assertEqual(cached.chroms, index.chroms)
+        self.assertEqual(cached.cnvs, index.cnvs)
+        for chrom, start, end in [("1", 1, None), ("1", 200000, 300000),
+                ("2", 30000, 80000)]:
+            self.assertEqual(list(cached.fetch(chrom, start, end)),
+                self.get_overlapping(chrom, start, end))
+
+        # the cache isn't used once the VCF changes
+        self.lines = self.lines[:2]
+        self.write_plain_vcf(self.lines)
+        index = open_vcf_index(path, cache=True)
+        self.assertEqual(index.chroms, ["1"])
+        self.assertEqual(list(index.fetch("1", 1, None)), self.lines)
+
+        # and the cache is only used when asked for
+        os.remove(path + ".cfidx")
+        open_vcf_index(path)
+        self.assertFalse(os.path.exists(path + ".cfidx"))
+
+    def test_bgzf_reader(self):
+        """ check that we read lines across BGZF blocks
+        """
+
+        path = self.write_bgzf()
+        reader = BgzfReader(path)
+        reader.seek(0)
+
+        lines = []
+        line = reader.readline()
+        while len(line) > 0:
+            lines.append(line.decode("utf-8"))
+            line = reader.readline()
+        reader.close()
+
+        self.assertEqual(lines, self.header + self.lines)
+
+    def test_is_bgzf(self):
+        """ check that we tell BGZF files from other gzip files
+        """
+
+        self.assertTrue(is_bgzf(self.write_bgzf()))
+
+        path = os.path.join(self.temp_dir, "other.vcf.gz")
+        with gzip.open(path, "wt") as handle:
+            handle.writelines(self.header + self.lines)
+        self.assertFalse(is_bgzf(path))
+
+        self.assertFalse(is_bgzf(self.write_plain_vcf(self.lines)))
+
+    def test_tabix_index(self):
+        """ check that we fetch regions from a bgzipped VCF
+        """
+
+        index = TabixIndex(self.write_bgzf())
+
+        self.assertTrue(index.is_valid())
+        self.assertEqual(index.chroms, ["1", "2"])
+
+        for chrom, start, end in [("1", 1, None), ("1", 200000, 300000),
+                ("1", 700000, None), ("1", 600001, 625000), ("2", 30000, 80000),
+                ("3", 1, None)]:
+            self.assertEqual(list(index.fetch(chrom, start, end)),
+                self.get_overlapping(chrom, start, end))
+
+    def test_index_decoding(self):
+        """ check that both index types decode lines the same way
+        """
+
+        self.lines[0] = self.lines[0].replace("HGNC=GENE", "HGNC=GEN\u00c9")
+        tabix = TabixIndex(self.write_bgzf())
+        plain = PlainVCFIndex(self.write_plain_vcf(self.lines))
+
+        self.assertEqual(list(tabix.fetch("1", 1, 200)),
+            list(plain.fetch("1", 1, 200)))
+
+    def test_open_vcf_index(self):
+        """ check that we only get indexes for VCFs we can fetch regions from
+        """
+
+        self.assertIsInstance(open_vcf_index(self.write_plain_vcf(self.lines)), PlainVCFIndex)
+        self.assertIsInstance(open_vcf_index(self.write_bgzf()), TabixIndex)
+
+        # gzipped VCFs without an index can't be fetched by region
+        os.remove(os.path.join(self.temp_dir, "sample.vcf.gz.tbi"))
+        self.assertIsNone(open_vcf_index(os.path.join(self.temp_dir, "sample.vcf.gz")))
+
+
+if __name__ == '__main__':
+    unittest.main()
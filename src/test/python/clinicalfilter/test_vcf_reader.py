@@ -0,0 +1,213 @@
+""" unit testing of the readers which give VCF lines as bytes
+"""
+
+import unittest
+import os
+import gzip
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from clinicalfilter import vcf_reader
+from clinicalfilter.vcf_reader import MappedVCF, GzipVCF, split_lines
+
+from test_vcf_index import make_bgzf_block, BGZF_EOF
+
+HEADER = "##fileformat=VCFv4.1\n" \
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n"
+
+
+class TestVcfReaderPy(unittest.TestCase):
+    """ test reading VCF lines as bytes
+    """
+
+    def setUp(self):
+        """ make a temporary directory
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.chunk_size = vcf_reader.CHUNK_SIZE
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        vcf_reader.CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, text):
+        """ write text to a VCF in the temporary directory
+        """
+
+        path = os.path.join(self.temp_dir, "temp.vcf")
+        with open(path, "w") as handle:
+            handle.write(text)
+
+        return path
+
+    def read(self, path):
+        """ get the lines from a VCF, along with the end of the header
+        """
+
+        vcf = MappedVCF(path)
+        try:
+            return vcf.header_end, list(vcf)
+        finally:
+            vcf.close()
+
+    def test_mapped_vcf(self):
+        """ check that we get the variant lines, after the header
+        """
+
+        lines = ["1\t100\t.\tA\tG\t50\tPASS\t.\tGT\t0/1",
+            "1\t200\t.\tC\tT\t50\tPASS\t.\tGT\t1/1"]
+        path = self.write(HEADER + "\n".join(lines) + "\n")
+
+        header_end, found = self.read(path)
+        self.assertEqual(header_end, len(HEADER))
+        self.assertEqual(found, [x.encode("latin_1") for x in lines])
+
+        # the last line can lack a newline
+        path = self.write(HEADER + "\n".join(lines))
+        self.assertEqual(self.read(path)[1], [x.encode("latin_1") for x in lines])
+
+    def test_mapped_vcf_chunks(self):
+        """ check that lines aren't split across chunks
+        """
+
+        lines = ["1\t{0}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1".format(x) for x in range(100)]
+        path = self.write(HEADER + "\n".join(lines) + "\n")
+
+        for size in [5, 40, 41, 1000]:
+            vcf_reader.CHUNK_SIZE = size
+            found = self.read(path)[1]
+            self.assertEqual(found, [x.encode("latin_1") for x in lines])
+
+    def test_mapped_vcf_without_variants(self):
+        """ check that we can read VCFs with only a header, or empty files
+        """
+
+        path = self.write(HEADER)
+        self.assertEqual(self.read(path), (len(HEADER), []))
+
+        path = self.write(HEADER.rstrip("\n"))
+        self.assertEqual(self.read(path), (len(HEADER) - 1, []))
+
+        path = self.write("")
+        self.assertEqual(self.read(path), (0, []))
+
+    def write_gzip(self, members):
+        """ write a gzipped VCF, with a gzip member for each chunk of text
+        """
+
+        path = os.path.join(self.temp_dir, "temp.vcf.gz")
+        with open(path, "wb") as handle:
+            for text in members:
+                handle.write(gzip.compress(text.encode("latin_1")))
+
+        return path
+
+    def read_gzip(self, path, chunk_size=vcf_reader.GZIP_CHUNK_SIZE):
+        """ get the lines from a gzipped VCF
+        """
+
+        vcf = GzipVCF(path, chunk_size)
+        try:
+            return list(vcf)
+        finally:
+            vcf.close()
+
+    def test_gzip_vcf(self):
+        """ check that we get the variant lines from gzipped VCFs
+        """
+
+        lines = ["1\t{0}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1".format(x) for x in range(1000)]
+        expected = [x.encode("latin_1") for x in lines]
+        text = HEADER + "\n".join(lines) + "\n"
+
+        # check a single member, read in small and large chunks
+        path = self.write_gzip([text])
+        for size in [1, 7, 100, 1 << 20]:
+            self.assertEqual(self.read_gzip(path, size), expected)
+
+        # check files with several members, split within lines and the header,
+        # and with null padding at the end
+        path = self.write_gzip([text[:30], text[30:1000], text[1000:]])
+        with open(path, "ab") as handle:
+            handle.write(b"\x00" * 10)
+        for size in [1, 7, 100, 1 << 20]:
+            self.assertEqual(self.read_gzip(path, size), expected)
+
+    def test_gzip_vcf_bgzf(self):
+        """ check that we get the variant lines from BGZF files
+        """
+
+        lines = ["1\t{0}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1".format(x) for x in range(1000)]
+        data = (HEADER + "\n".join(lines) + "\n").encode("latin_1")
+
+        path = os.path.join(self.temp_dir, "temp.vcf.gz")
+        with open(path, "wb") as handle:
+            for i in range(0, len(data), 5000):
+                handle.write(make_bgzf_block(data[i:i + 5000]))
+            handle.write(BGZF_EOF)
+
+        self.assertEqual(self.read_gzip(path, 1000), [x.encode("latin_1") for x in lines])
+
+    def test_gzip_vcf_threads(self):
+        """ check that decompressing BGZF blocks in threads keeps the line order
+        """
+
+        lines = ["1\t{0}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1".format(x) for x in range(1000)]
+        expected = [x.encode("latin_1") for x in lines]
+        data = (HEADER + "\n".join(lines) + "\n").encode("latin_1")
+
+        path = os.path.join(self.temp_dir, "temp.vcf.gz")
+        with open(path, "wb") as handle:
+            for i in range(0, len(data), 700):
+                handle.write(make_bgzf_block(data[i:i + 700]))
+            handle.write(BGZF_EOF)
+
+        pool = ThreadPool(3)
+        try:
+            vcf = GzipVCF(path, pool=pool, threads=3)
+            self.assertIsNotNone(vcf.pool)
+            self.assertEqual(list(vcf), expected)
+            vcf.close()
+
+            # other gzip files are decompressed serially
+            path = self.write_gzip([HEADER + "\n".join(lines) + "\n"])
+            vcf = GzipVCF(path, pool=pool, threads=3)
+            self.assertIsNone(vcf.pool)
+            self.assertEqual(list(vcf), expected)
+            vcf.close()
+        finally:
+            pool.close()
+
+    def test_gzip_vcf_truncated(self):
+        """ check that we raise an error for truncated gzip files
+        """
+
+        path = self.write_gzip([HEADER + "1\t100\t.\tA\tG\t50\tPASS\t.\tGT\t0/1\n"])
+        with open(path, "rb") as handle:
+            data = handle.read()
+        with open(path, "wb") as handle:
+            handle.write(data[:-10])
+
+        with self.assertRaises(EOFError):
+            self.read_gzip(path)
+
+    def test_split_lines(self):
+        """ check that we split chunks into batches of lines after the header
+        """
+
+        chunks = [b"##a\n#b", b"\n1\t100\n1\t2", b"00\n", b"1\t300"]
+        self.assertEqual(list(split_lines(chunks)), [[b"1\t100"],
+            [b"1\t200"], [b"1\t300"]])
+
+        # check header-only data
+        self.assertEqual(list(split_lines([b"##a\n#b\n"])), [])
+        self.assertEqual(list(split_lines([b"##a\n#b"])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+""" unit testing of the shared work queue
+"""
+
+import unittest
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from clinicalfilter.ped import Family
+from clinicalfilter.work_queue import WorkQueue, LeaseHeartbeat, estimate_cost
+
+def claim_families(path, worker, results):
+    """ claim and complete families until the queue is empty, in a separate
+    process, recording the families the worker claimed
+    """
+
+    queue = WorkQueue(path)
+    while True:
+        family_id = queue.claim(worker)
+        if family_id is None:
+            break
+        queue.complete(family_id, worker, family_id + ".txt")
+        results.put((worker, family_id))
+    queue.close()
+
+
+class TestWorkQueuePy(unittest.TestCase):
+    """ test the WorkQueue
+    """
+
+    def setUp(self):
+        """ make a temporary directory, with families with VCFs of different sizes
+        """
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "queue.db")
+
+        self.families = {}
+        for family_id, size in [("fam1", 10), ("fam2", 30), ("fam3", 20)]:
+            vcf = os.path.join(self.temp_dir, family_id + ".vcf")
+            with open(vcf, "w") as handle:
+                handle.write("x" * size)
+            family = Family(family_id)
+            family.add_child(family_id + "_child", vcf, "2", "F")
+            family.add_mother(family_id + "_mom", vcf, "1", "F")
+            self.families[family_id] = family
+
+    def tearDown(self):
+        """ remove the temporary directory
+        """
+
+        shutil.rmtree(self.temp_dir)
+
+    def test_estimate_cost(self):
+        """ check that we sum the VCF sizes for the family members
+        """
+
+        self.assertEqual(estimate_cost(self.families["fam1"]), 20)
+
+        # missing VCFs don't add to the cost
+        self.families["fam1"].add_father("fam1_dad", "missing.vcf", "1", "M")
+        self.assertEqual(estimate_cost(self.families["fam1"]), 20)
+
+    def test_claim(self):
+        """ check that we claim the largest families first, and only once
+        """
+
+        queue = WorkQueue(self.path)
+        queue.add_families(self.families)
+
+        # adding the families again, as each worker does, doesn't requeue them
+        self.assertEqual(queue.claim("worker1"), "fam2")
+        queue.add_families(self.families)
+
+        self.assertEqual(queue.claim("worker2"), "fam3")
+        self.assertEqual(queue.claim("worker1"), "fam1")
+        self.assertIsNone(queue.claim("worker1"))
+        self.assertFalse(queue.is_finished())
+
+        # only the worker holding a family can complete it
+        self.assertFalse(queue.complete("fam2", "worker2", "fam2.txt"))
+        self.assertTrue(queue.complete("fam2", "worker1", "fam2.txt"))
+        self.assertTrue(queue.complete("fam3", "worker2", "fam3.txt"))
+        self.assertTrue(queue.complete("fam1", "worker1", "fam1.txt"))
+
+        self.assertTrue(queue.is_finished())
+        self.assertEqual(queue.get_results(), ["fam1.txt", "fam2.txt", "fam3.txt"])
+        self.assertEqual(queue.get_failed(), [])
+        queue.close()
+
+    def test_expired_lease(self):
+        """ check that families from dead workers are claimed by other workers
+        """
+
+        queue = WorkQueue(self.path, lease=0.2)
+        queue.add_families({"fam1": self.families["fam1"]})
+
+        self.assertEqual(queue.claim("worker1"), "fam1")
+        self.assertIsNone(queue.claim("worker2"))
+
+        time.sleep(0.3)
+        self.assertEqual(queue.claim("worker2"), "fam1")
+
+        # the first worker can't renew or complete the family once it has
+        # lost the lease
+        self.assertFalse(queue.renew("fam1", "worker1"))
+        self.assertFalse(queue.complete("fam1", "worker1", "fam1.txt"))
+        self.assertTrue(queue.complete("fam1", "worker2", "fam1.txt"))
+        queue.close()
+
+    def test_heartbeat(self):
+        """ check that the heartbeat keeps the lease from expiring
+        """
+
+        queue = WorkQueue(self.path, lease=0.3)
+        queue.add_families({"fam1": self.families["fam1"]})
+
+        self.assertEqual(queue.claim("worker1"), "fam1")
+        heartbeat = LeaseHeartbeat(self.path, "fam1", "worker1", 0.3)
+        time.sleep(0.6)
+        self.assertIsNone(queue.claim("worker2"))
+        heartbeat.stop()
+        queue.close()
+
+    def test_max_attempts(self):
+        """ check that families are marked as failed after too many attempts
+        """
+
+        queue = WorkQueue(self.path, lease=0.1, max_attempts=2)
+        queue.add_families({"fam1": self.families["fam1"],
+            "fam2": self.families["fam2"]})
+
+        # a family that raises an error is released for another attempt
+        self.assertEqual(queue.claim("worker1"), "fam2")
+        queue.release("fam2", "worker1")
+        self.assertEqual(queue.claim("worker1"), "fam2")
+        queue.release("fam2", "worker1")
+
+        # a family whose workers keep dying fails once the leases expire
+        self.assertEqual(queue.claim("worker1"), "fam1")
+        time.sleep(0.2)
+        self.assertEqual(queue.claim("worker2"), "fam1")
+        time.sleep(0.2)
+        self.assertIsNone(queue.claim("worker3"))
+
+        self.assertTrue(queue.is_finished())
+        self.assertEqual(queue.get_failed(), ["fam1", "fam2"])
+        queue.close()
+
+    def test_claim_merge(self):
+        """ check that only one worker merges the outputs
+        """
+
+        queue = WorkQueue(self.path)
+        self.assertTrue(queue.claim_merge("worker1"))
+        self.assertFalse(queue.claim_merge("worker2"))
+        self.assertFalse(queue.claim_merge("worker1"))
+
+        # new families need the outputs merged again
+        queue.add_families({"fam1": self.families["fam1"]})
+        self.assertTrue(queue.claim_merge("worker2"))
+
+        # but adding families the queue already holds keeps the claim
+        queue.add_families({"fam1": self.families["fam1"]})
+        self.assertFalse(queue.claim_merge("worker1"))
+        queue.close()
+
+    def test_multiple_processes(self):
+        """ check that workers in separate processes claim each family once
+        """
+
+        families = {}
+        for i in range(50):
+            family = Family("fam{0:02d}".format(i))
+            family.add_child("child", "missing.vcf", "2", "F")
+            families[family.family_id] = family
+
+        queue = WorkQueue(self.path)
+        queue.add_families(families)
+
+        results = multiprocessing.Queue()
+        workers = []
+        for i in range(4):
+            worker = multiprocessing.Process(target=claim_families,
+                args=(self.path, "worker" + str(i), results))
+            worker.start()
+            workers.append(worker)
+
+        claimed = [results.get(timeout=60) for _ in range(len(families))]
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(x[1] for x in claimed), sorted(families))
+        self.assertTrue(queue.is_finished())
+        self.assertEqual(len(queue.get_results()), len(families))
+        queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()